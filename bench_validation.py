@@ -0,0 +1,125 @@
+"""Сравнивает построчную и пакетную проверку строк импорта.
+
+Запуск: python bench_validation.py [--rows 50000] [--table students] [--runs 3]
+
+Строки генерируются со случайной долей ошибок и повторяющимися датами
+рождения и классами, как в реальных выгрузках. Для каждой таблицы
+замеряется цикл validate_import_row и один вызов validate_many_import_rows
+на тех же строках. Скрипт завершается с кодом 1, если результаты проверок
+расходятся.
+"""
+
+import argparse
+import datetime
+import random
+import sys
+import time
+
+from validation import SchoolValidator
+
+LAST_NAMES = ["Иванов", "Петров", "Сидоров", "Кузнецов", "Смирнов", "Попов", "Соколов", "Лебедев-Кумач"]
+FIRST_NAMES = ["Иван", "Пётр", "Анна", "Мария", "Олег", "Елена", "Анна Мария"]
+MIDDLE_NAMES = ["Иванович", "Петровна", "Олегович", ""]
+# Строки с ошибками разного вида.
+BAD_FIO = ["", "Иванов", "Ivanov Ivan", "Иванов 1ван"]
+BAD_DATES = ["", "31.02.2010", "2010-01-01", "01.01.2999"]
+BAD_CLASSES = ["", "12А", "5Я", "А"]
+
+
+def random_fio(rng):
+    if rng.random() < 0.05:
+        return rng.choice(BAD_FIO)
+    return " ".join(part for part in (rng.choice(LAST_NAMES), rng.choice(FIRST_NAMES), rng.choice(MIDDLE_NAMES))
+                    if part)
+
+
+def random_date(rng, first_year, last_year):
+    if rng.random() < 0.03:
+        return rng.choice(BAD_DATES)
+    return f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(first_year, last_year)}"
+
+
+def random_class(rng):
+    if rng.random() < 0.03:
+        return rng.choice(BAD_CLASSES)
+    return f"{rng.randint(1, 11)}{rng.choice('АБВ')}"
+
+
+def make_rows(table, count, seed=1):
+    """Синтетические строки файла импорта для таблицы."""
+    rng = random.Random(seed)
+    subjects = SchoolValidator.ALLOWED_SUBJECTS + ["Астрология"]
+    today = datetime.date.today()
+    rows = []
+    for _ in range(count):
+        if table == "teachers":
+            classes = ", ".join(random_class(rng) for _ in range(rng.randint(1, 3)))
+            rows.append((random_fio(rng), random_date(rng, 1950, 2000), rng.choice(subjects), classes))
+        elif table == "students":
+            class_name = random_class(rng)
+            # Год рождения примерно по возрасту для класса, чтобы большинство строк было верным.
+            grade = int(class_name[:-1]) if class_name[:-1].isdigit() else 5
+            birth_year = today.year - grade - 7
+            rows.append((random_fio(rng), random_date(rng, birth_year, birth_year), class_name))
+        else:
+            rows.append((random_fio(rng), rng.choice(subjects), rng.choice("123456x"), ""))
+    return rows
+
+
+def make_student_index(count=2000, seed=2):
+    rng = random.Random(seed)
+    return {random_fio(rng): n for n in range(1, count + 1)}
+
+
+def validate_per_row(validator, table, rows, student_index):
+    mask, errors, values = [], [], []
+    for row in rows:
+        try:
+            values.append(validator.validate_import_row(table, row, student_index))
+            errors.append(None)
+            mask.append(True)
+        except ValueError as exc:
+            values.append(None)
+            errors.append(str(exc))
+            mask.append(False)
+    return mask, errors, values
+
+
+def best_time(func, runs):
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение построчной и пакетной проверки импорта")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--table", choices=("teachers", "students", "grades"), action="append")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    validator = SchoolValidator()
+    student_index = make_student_index()
+    failed = False
+    for table in args.table or ("teachers", "students", "grades"):
+        rows = make_rows(table, args.rows)
+        per_row_s, expected = best_time(lambda: validate_per_row(validator, table, rows, student_index), args.runs)
+        batch_s, actual = best_time(
+            lambda: validator.validate_many_import_rows(table, rows, student_index), args.runs
+        )
+        print(f"{table}: {args.rows} строк, построчно {per_row_s * 1000:.1f} мс, "
+              f"пакетом {batch_s * 1000:.1f} мс, ускорение {per_row_s / batch_s:.1f}x "
+              f"(ошибок {actual[0].count(False)})")
+        if actual != expected:
+            print(f"{table}: результаты пакетной проверки расходятся с построчной")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
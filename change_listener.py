@@ -0,0 +1,113 @@
+"""Получение изменений таблиц от других клиентов через LISTEN/NOTIFY."""
+
+import json
+import logging
+import queue
+import select
+import threading
+
+logger = logging.getLogger("school_app")
+
+
+class ChangeListener:
+    """Слушает уведомления об изменении строк в отдельном потоке.
+
+    connect() должна вернуть соединение psycopg2 с уже выполненным LISTEN
+    (см. SchoolDatabase.listen_connection). Уведомления копятся в очереди;
+    главный поток раз в poll_ms забирает их через root.after, объединяет по
+    таблицам и вызывает on_changes(changes), где changes - словарь
+    {таблица: множество id или None, если таблицу нужно перечитать целиком}.
+
+    Уведомления, для которых is_own(pid) истинно (изменения этого же
+    приложения), пропускаются. При обрыве соединения поток переподключается
+    через retry_s секунд; так как уведомления за это время потеряны, после
+    переподключения все таблицы помечаются для перечитывания.
+    """
+
+    TABLES = ("teachers", "students", "grades")
+
+    def __init__(self, root, connect, on_changes, is_own=None, poll_ms=500, retry_s=5):
+        self.root = root
+        self.connect = connect
+        self.on_changes = on_changes
+        self.is_own = is_own
+        self.poll_ms = poll_ms
+        self.retry_s = retry_s
+        self._changes = queue.Queue()
+        self._stopped = threading.Event()
+        self._poll_id = None
+        self._worker = threading.Thread(target=self._run, name="school-listen", daemon=True)
+
+    def start(self):
+        self._worker.start()
+        self._poll_id = self.root.after(self.poll_ms, self._poll)
+
+    def stop(self):
+        """Останавливает опрос; поток завершится при следующей проверке (не позже секунды)."""
+        self._stopped.set()
+        if self._poll_id is not None:
+            self.root.after_cancel(self._poll_id)
+            self._poll_id = None
+
+    def _run(self):
+        reconnected = False
+        while not self._stopped.is_set():
+            try:
+                conn = self.connect()
+            except Exception as e:
+                logger.warning(f"Нет соединения для уведомлений об изменениях: {e}")
+                self._stopped.wait(self.retry_s)
+                reconnected = True
+                continue
+
+            if reconnected:
+                for table in self.TABLES:
+                    self._changes.put((table, None))
+            try:
+                self._listen(conn)
+            except Exception as e:
+                logger.warning(f"Соединение для уведомлений об изменениях прервано: {e}")
+                reconnected = True
+                self._stopped.wait(self.retry_s)
+            finally:
+                conn.close()
+
+    def _listen(self, conn):
+        while not self._stopped.is_set():
+            # Таймаут нужен, чтобы поток замечал stop без уведомлений.
+            if select.select([conn], [], [], 1.0) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                if self.is_own is not None and self.is_own(notify.pid):
+                    continue
+                try:
+                    payload = json.loads(notify.payload)
+                    table, ids = payload["table"], payload["ids"]
+                except (ValueError, KeyError, TypeError):
+                    logger.warning(f"Непонятное уведомление об изменении: {notify.payload!r}")
+                    continue
+                self._changes.put((table, None if ids is None else set(ids)))
+
+    def _poll(self):
+        self._poll_id = None
+        changes = {}
+        while True:
+            try:
+                table, ids = self._changes.get_nowait()
+            except queue.Empty:
+                break
+            if ids is None:
+                changes[table] = None
+            elif table not in changes:
+                changes[table] = ids
+            elif changes[table] is not None:
+                changes[table] |= ids
+
+        try:
+            if changes:
+                self.on_changes(changes)
+        finally:
+            if not self._stopped.is_set():
+                self._poll_id = self.root.after(self.poll_ms, self._poll)
@@ -0,0 +1,72 @@
+"""Проверяет время импорта main.py через python -X importtime.
+
+Запуск: python check_import_time.py [--budget-ms 250]
+
+Импорт выполняется в отдельном процессе, время берётся из строки
+модуля main (cumulative). Скрипт завершается с кодом 1, если импорт
+дольше бюджета или если при запуске подгрузились библиотеки отчётов,
+которые должны импортироваться только при первом PDF.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+DEFAULT_BUDGET_MS = int(os.getenv("SCHOOL_IMPORT_BUDGET_MS", 250))
+
+# Модули, которых не должно быть среди импортов при запуске.
+DEFERRED_MODULES = ("xhtml2pdf", "reportlab", "jinja2", "xml.dom.minidom")
+
+
+def measure_imports(module="main", runs=3):
+    """Возвращает (лучшее время импорта модуля в мс, множество импортированных модулей)."""
+    best_us = None
+    imported = set()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=here, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Не удалось импортировать {module}:\n{result.stderr}")
+
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            name = name.strip()
+            if not cumulative.strip().isdigit():
+                continue
+            imported.add(name)
+            if name == module:
+                cumulative_us = int(cumulative)
+                if best_us is None or cumulative_us < best_us:
+                    best_us = cumulative_us
+    return best_us / 1000, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка времени импорта main.py")
+    parser.add_argument("--budget-ms", type=int, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    elapsed_ms, imported = measure_imports(runs=args.runs)
+    print(f"Импорт main: {elapsed_ms:.1f} мс (бюджет {args.budget_ms} мс)")
+
+    failed = False
+    early = sorted(name for name in imported
+                   if any(name == prefix or name.startswith(prefix + ".") for prefix in DEFERRED_MODULES))
+    if early:
+        print("При запуске импортированы модули отчётов: " + ", ".join(early))
+        failed = True
+    if elapsed_ms > args.budget_ms:
+        print("Время импорта превышает бюджет")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
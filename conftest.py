@@ -0,0 +1,34 @@
+"""Общие фикстуры тестов.
+
+Тесты с базой данных работают с отдельной базой SCHOOL_TEST_DB_NAME
+(по умолчанию school_test_db; остальные параметры - как у приложения,
+SCHOOL_DB_*) и пропускаются, если к ней не удаётся подключиться.
+"""
+
+import os
+
+import psycopg2
+import pytest
+
+
+@pytest.fixture(scope="session")
+def db():
+    os.environ["SCHOOL_DB_NAME"] = os.getenv("SCHOOL_TEST_DB_NAME", "school_test_db")
+    from database import SchoolDatabase
+
+    try:
+        database = SchoolDatabase()
+    except psycopg2.OperationalError as exc:
+        pytest.skip(f"Нет тестовой базы данных: {exc}")
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def data_manager(db):
+    """SchoolDataManager со своим пулом соединений к той же тестовой базе."""
+    from main import SchoolDataManager
+
+    manager = SchoolDataManager()
+    yield manager
+    manager.db.close()
@@ -1,11 +1,597 @@
 """Работа с PostgreSQL: создание таблиц и простые CRUD операции."""
 
+import csv
+import datetime
+import io
+import itertools
 import os
+import threading
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2 import errors
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+# Ключ advisory-блокировки, под которой выполняются миграции.
+SCHEMA_LOCK_ID = 7_200_001
+
+# Канал NOTIFY, в который триггеры сообщают об изменении строк таблиц.
+CHANGE_CHANNEL = "school_changes"
+
+
+def _notify_trigger_statements(table_name):
+    """Триггеры уровня оператора, сообщающие id изменённых строк таблицы."""
+    return _statement_trigger_statements(table_name, "notify", "school_notify_change")
+
+
+def _stats_trigger_statements(table_name, function_name):
+    """Триггеры уровня оператора, пересчитывающие агрегаты по изменённым строкам."""
+    return _statement_trigger_statements(table_name, "stats", function_name)
+
+
+def _statement_trigger_statements(table_name, purpose, function_name):
+    """Триггеры AFTER ... FOR EACH STATEMENT с таблицами переходов old_rows/new_rows.
+
+    Таблицы переходов (REFERENCING) нельзя объявить у триггера на несколько
+    событий, поэтому на INSERT, UPDATE и DELETE заведено по триггеру.
+    """
+    statements = []
+    for event, referencing in (("insert", "NEW TABLE AS new_rows"),
+                               ("update", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+                               ("delete", "OLD TABLE AS old_rows")):
+        trigger_name = f"{table_name}_{purpose}_{event}"
+        statements.append(f"DROP TRIGGER IF EXISTS {trigger_name} ON {table_name}")
+        statements.append(f"""
+        CREATE TRIGGER {trigger_name}
+        AFTER {event.upper()} ON {table_name}
+        REFERENCING {referencing}
+        FOR EACH STATEMENT EXECUTE FUNCTION {function_name}()
+        """)
+    return statements
+
+
+# Пересчёт средних оценок с нуля; используется при миграции и в rebuild_grade_stats.
+GRADE_STATS_REBUILD = [
+    "DELETE FROM student_subject_grade_stats",
+    "DELETE FROM student_grade_stats",
+    """
+    INSERT INTO student_subject_grade_stats (student_id, subject_name, grade_sum, grade_count, avg_grade)
+    SELECT student_id, COALESCE(subject_name, ''), SUM(grade), COUNT(*), AVG(grade)
+    FROM grades
+    WHERE student_id IS NOT NULL AND grade IS NOT NULL
+    GROUP BY 1, 2
+    """,
+    """
+    INSERT INTO student_grade_stats (student_id, grade_sum, grade_count, avg_grade)
+    SELECT student_id, SUM(grade), COUNT(*), AVG(grade)
+    FROM grades
+    WHERE student_id IS NOT NULL AND grade IS NOT NULL
+    GROUP BY 1
+    """,
+]
+
+
+# Версии схемы: (номер, описание, список SQL-команд). Новые шаги добавляются только в конец.
+MIGRATIONS = [
+    (1, "Базовые таблицы students, teachers, grades", [
+        """
+        CREATE TABLE IF NOT EXISTS students (
+            id SERIAL PRIMARY KEY,
+            last_name VARCHAR(50),
+            first_name VARCHAR(50),
+            middle_name VARCHAR(50),
+            birth_date DATE,
+            class_name TEXT[]
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS teachers (
+            id SERIAL PRIMARY KEY,
+            last_name VARCHAR(50),
+            first_name VARCHAR(50),
+            middle_name VARCHAR(50),
+            birth_date DATE,
+            subject VARCHAR(50),
+            classes TEXT[]
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS grades (
+            id SERIAL PRIMARY KEY,
+            student_id INTEGER REFERENCES students(id),
+            subject_name VARCHAR(50),
+            grade INTEGER CHECK (grade >=1 AND grade <= 5),
+            grade_date DATE DEFAULT CURRENT_DATE
+        )
+        """,
+        "ALTER TABLE students ADD COLUMN IF NOT EXISTS birth_date DATE",
+        "ALTER TABLE teachers ADD COLUMN IF NOT EXISTS birth_date DATE",
+        # Старые версии приложения сбрасывали последовательности при каждом запуске;
+        # делаем это один раз, чтобы выровнять базы, созданные до миграций.
+        """
+        SELECT setval(pg_get_serial_sequence(t.name, 'id'), COALESCE(t.max_id, 0) + 1, false)
+        FROM (
+            SELECT 'students' AS name, (SELECT MAX(id) FROM students) AS max_id
+            UNION ALL SELECT 'teachers', (SELECT MAX(id) FROM teachers)
+            UNION ALL SELECT 'grades', (SELECT MAX(id) FROM grades)
+        ) AS t
+        """,
+    ]),
+    (2, "Индексы под запросы приложения", [
+        """
+        CREATE INDEX IF NOT EXISTS students_fio_idx
+        ON students (last_name, first_name, (COALESCE(middle_name, '')))
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS teachers_fio_subject_idx
+        ON teachers (last_name, first_name, (COALESCE(middle_name, '')), subject)
+        """,
+        "CREATE INDEX IF NOT EXISTS students_class_name_gin_idx ON students USING gin (class_name)",
+        "CREATE INDEX IF NOT EXISTS teachers_classes_gin_idx ON teachers USING gin (classes)",
+        "CREATE INDEX IF NOT EXISTS grades_student_id_idx ON grades (student_id)",
+    ]),
+    (3, "Триграммный поиск (pg_trgm)", [
+        """
+        CREATE OR REPLACE FUNCTION school_search_text(parts text[]) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        AS $$ SELECT lower(array_to_string(parts, ' ')) $$
+        """,
+        # Без прав на расширение миграция не падает: поиск тогда остаётся в приложении.
+        """
+        DO $$
+        BEGIN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        EXCEPTION WHEN OTHERS THEN
+            RAISE NOTICE 'pg_trgm недоступен: %', SQLERRM;
+        END
+        $$
+        """,
+        """
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+                CREATE INDEX IF NOT EXISTS teachers_search_trgm_idx ON teachers
+                USING gin (school_search_text(ARRAY[last_name, first_name, middle_name, subject]::text[] || classes) gin_trgm_ops);
+                CREATE INDEX IF NOT EXISTS students_search_trgm_idx ON students
+                USING gin (school_search_text(ARRAY[last_name, first_name, middle_name]::text[] || class_name) gin_trgm_ops);
+                CREATE INDEX IF NOT EXISTS grades_subject_trgm_idx ON grades
+                USING gin (school_search_text(ARRAY[subject_name]::text[]) gin_trgm_ops);
+            END IF;
+        END
+        $$
+        """,
+    ]),
+    (4, "Уведомления об изменениях (LISTEN/NOTIFY)", [
+        f"""
+        CREATE OR REPLACE FUNCTION school_notify_change() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            changed_ids integer[];
+            payload text;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                SELECT array_agg(id) INTO changed_ids FROM old_rows;
+            ELSE
+                SELECT array_agg(id) INTO changed_ids FROM new_rows;
+            END IF;
+            IF changed_ids IS NULL THEN
+                RETURN NULL;
+            END IF;
+            payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'ids', changed_ids)::text;
+            -- Сообщение NOTIFY ограничено 8000 байт: при большом изменении
+            -- id не передаются, и клиенты перечитывают таблицу целиком.
+            IF octet_length(payload) > 7900 THEN
+                payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'ids', NULL)::text;
+            END IF;
+            PERFORM pg_notify('{CHANGE_CHANNEL}', payload);
+            RETURN NULL;
+        END
+        $$
+        """,
+        *_notify_trigger_statements("teachers"),
+        *_notify_trigger_statements("students"),
+        *_notify_trigger_statements("grades"),
+    ]),
+    (5, "Средние оценки учеников, поддерживаемые триггерами", [
+        """
+        CREATE TABLE IF NOT EXISTS student_grade_stats (
+            student_id INTEGER PRIMARY KEY REFERENCES students(id) ON DELETE CASCADE,
+            grade_sum BIGINT NOT NULL DEFAULT 0,
+            grade_count INTEGER NOT NULL DEFAULT 0,
+            avg_grade NUMERIC
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS student_subject_grade_stats (
+            student_id INTEGER REFERENCES students(id) ON DELETE CASCADE,
+            subject_name VARCHAR(50),
+            grade_sum BIGINT NOT NULL DEFAULT 0,
+            grade_count INTEGER NOT NULL DEFAULT 0,
+            avg_grade NUMERIC,
+            PRIMARY KEY (student_id, subject_name)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS student_grade_stats_avg_idx ON student_grade_stats (avg_grade)",
+        """
+        CREATE INDEX IF NOT EXISTS student_subject_grade_stats_avg_idx
+        ON student_subject_grade_stats (subject_name, avg_grade)
+        """,
+        # Изменения суммируются по оператору, а не по строке: пакетная загрузка
+        # оценок обновляет каждого ученика один раз. Таблицы переходов видны
+        # динамическому запросу, поэтому текст выборки выбирается по TG_OP.
+        """
+        CREATE OR REPLACE FUNCTION school_grade_stats_apply() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            changes text;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                changes := 'SELECT student_id, subject_name, grade, 1 AS sign FROM new_rows';
+            ELSIF TG_OP = 'DELETE' THEN
+                changes := 'SELECT student_id, subject_name, grade, -1 AS sign FROM old_rows';
+            ELSE
+                changes := 'SELECT student_id, subject_name, grade, 1 AS sign FROM new_rows '
+                        || 'UNION ALL SELECT student_id, subject_name, grade, -1 FROM old_rows';
+            END IF;
+            EXECUTE format($q$
+                WITH delta AS (
+                    SELECT student_id, COALESCE(subject_name, '') AS subject_name,
+                           SUM(sign * grade) AS grade_sum, SUM(sign) AS grade_count
+                    FROM (%s) AS c
+                    WHERE student_id IS NOT NULL AND grade IS NOT NULL
+                    GROUP BY 1, 2
+                ), by_subject AS (
+                    INSERT INTO student_subject_grade_stats AS st
+                        (student_id, subject_name, grade_sum, grade_count, avg_grade)
+                    SELECT student_id, subject_name, grade_sum, grade_count,
+                           grade_sum::numeric / NULLIF(grade_count, 0)
+                    FROM delta ORDER BY 1, 2
+                    ON CONFLICT (student_id, subject_name) DO UPDATE
+                    SET grade_sum = st.grade_sum + EXCLUDED.grade_sum,
+                        grade_count = st.grade_count + EXCLUDED.grade_count,
+                        avg_grade = (st.grade_sum + EXCLUDED.grade_sum)::numeric
+                                    / NULLIF(st.grade_count + EXCLUDED.grade_count, 0)
+                )
+                INSERT INTO student_grade_stats AS st (student_id, grade_sum, grade_count, avg_grade)
+                SELECT student_id, SUM(grade_sum), SUM(grade_count),
+                       SUM(grade_sum)::numeric / NULLIF(SUM(grade_count), 0)
+                FROM delta GROUP BY 1 ORDER BY 1
+                ON CONFLICT (student_id) DO UPDATE
+                SET grade_sum = st.grade_sum + EXCLUDED.grade_sum,
+                    grade_count = st.grade_count + EXCLUDED.grade_count,
+                    avg_grade = (st.grade_sum + EXCLUDED.grade_sum)::numeric
+                                / NULLIF(st.grade_count + EXCLUDED.grade_count, 0)
+            $q$, changes);
+            RETURN NULL;
+        END
+        $$
+        """,
+        *_stats_trigger_statements("grades", "school_grade_stats_apply"),
+        *GRADE_STATS_REBUILD,
+    ]),
+    # Задание хранит смещение последней записанной части файла: прерванный импорт
+    # продолжается с него. Ключ import_key - хэш файла и номер строки в нём, поэтому
+    # повторный импорт того же файла ничего не добавляет, а другие файлы не задевает.
+    (6, "Задания импорта с контрольными точками", [
+        """
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id SERIAL PRIMARY KEY,
+            table_name VARCHAR(20) NOT NULL,
+            file_name TEXT,
+            file_hash CHAR(64) NOT NULL,
+            rows_done INTEGER NOT NULL DEFAULT 0,
+            imported INTEGER NOT NULL DEFAULT 0,
+            rejected INTEGER NOT NULL DEFAULT 0,
+            finished BOOLEAN NOT NULL DEFAULT false,
+            started_at TIMESTAMP DEFAULT now(),
+            updated_at TIMESTAMP DEFAULT now()
+        )
+        """,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS import_jobs_unfinished_idx
+        ON import_jobs (table_name, file_hash) WHERE NOT finished
+        """,
+        "ALTER TABLE students ADD COLUMN IF NOT EXISTS import_key TEXT",
+        "ALTER TABLE grades ADD COLUMN IF NOT EXISTS import_key TEXT",
+        "CREATE UNIQUE INDEX IF NOT EXISTS students_import_key_idx ON students (import_key)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS grades_import_key_idx ON grades (import_key)",
+    ]),
+    # Индексы (выражение сортировки, id) повторяют ORDER BY из PAGE_QUERIES: страница
+    # читается диапазоном индекса, а не полным просмотром с сортировкой.
+    # Оценки по ФИО и классу упорядочены по столбцам students: их страницы идут
+    # по индексам учеников и grades_student_id_idx.
+    (7, "Индексы под постраничную загрузку", [
+        "CREATE INDEX IF NOT EXISTS teachers_page_fio_idx ON teachers ((COALESCE(last_name, '')), id)",
+        """
+        CREATE INDEX IF NOT EXISTS teachers_page_birth_date_idx
+        ON teachers ((COALESCE(birth_date, DATE '0001-01-01')), id)
+        """,
+        "CREATE INDEX IF NOT EXISTS teachers_page_subject_idx ON teachers ((COALESCE(subject, '')), id)",
+        "CREATE INDEX IF NOT EXISTS students_page_fio_idx ON students ((COALESCE(last_name, '')), id)",
+        """
+        CREATE INDEX IF NOT EXISTS students_page_birth_date_idx
+        ON students ((COALESCE(birth_date, DATE '0001-01-01')), id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS students_page_class_idx
+        ON students ((lpad(COALESCE(class_name[1], ''), 4, '0')), id)
+        """,
+        "CREATE INDEX IF NOT EXISTS grades_page_subject_idx ON grades ((COALESCE(subject_name, '')), id)",
+        "CREATE INDEX IF NOT EXISTS grades_page_grade_idx ON grades ((COALESCE(grade, 0)), id)",
+    ]),
+    # ФИО сортируется по фамилии, имени и отчеству, а не только по фамилии: индексы
+    # на одну фамилию из миграции 7 заменяются составными.
+    (8, "Сортировка страниц по полному ФИО", [
+        "DROP INDEX IF EXISTS teachers_page_fio_idx",
+        "DROP INDEX IF EXISTS students_page_fio_idx",
+        """
+        CREATE INDEX IF NOT EXISTS teachers_page_full_fio_idx ON teachers
+        ((COALESCE(last_name, '')), (COALESCE(first_name, '')), (COALESCE(middle_name, '')), id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS students_page_full_fio_idx ON students
+        ((COALESCE(last_name, '')), (COALESCE(first_name, '')), (COALESCE(middle_name, '')), id)
+        """,
+    ]),
+]
+
+# Выражения поиска совпадают с выражениями триграммных индексов из миграции 3.
+# Даты рождения и оценки в поиск не входят; поиск по загруженным строкам
+# (SchoolApp.SEARCH_COLUMNS) смотрит те же колонки.
+TEACHER_SEARCH_EXPR = "school_search_text(ARRAY[last_name, first_name, middle_name, subject]::text[] || classes)"
+
+STUDENT_SEARCH_EXPR = "school_search_text(ARRAY[last_name, first_name, middle_name]::text[] || class_name)"
+
+GRADE_SUBJECT_SEARCH_EXPR = "school_search_text(ARRAY[subject_name]::text[])"
+
+FIND_STUDENT_ID_QUERY = """
+    SELECT id FROM students
+    WHERE last_name = %s AND first_name = %s AND COALESCE(middle_name, '') = %s
+"""
+
+TEACHER_EXISTS_QUERY = """
+    SELECT id FROM teachers
+    WHERE last_name = %s
+      AND first_name = %s
+      AND COALESCE(middle_name, '') = %s
+      AND subject = %s
+    LIMIT 1
+"""
+
+TEACHER_CLASSES_BY_NAME_QUERY = """
+    SELECT classes
+    FROM teachers
+    WHERE last_name = %s AND first_name = %s AND COALESCE(middle_name, '') = %s
+    LIMIT 1
+"""
+
+STUDENTS_IN_CLASS_COUNT_QUERY = "SELECT COUNT(*) FROM students WHERE class_name @> ARRAY[%s]::text[]"
+
+# @> отбирает кандидатов по GIN-индексу, = сохраняет прежнее сравнение массивов
+# с учётом порядка и повторов классов.
+TEACHERS_BY_CLASSES_QUERY = """
+    SELECT last_name, first_name, middle_name
+    FROM teachers WHERE classes @> %s::text[] AND classes = %s::text[]
+"""
+
+ALL_TEACHERS_QUERY = "SELECT id, last_name, first_name, middle_name, birth_date, subject, classes FROM teachers"
+
+ALL_STUDENTS_QUERY = "SELECT id, last_name, first_name, middle_name, birth_date, class_name FROM students"
+
+ALL_GRADES_ROWS_QUERY = """
+    SELECT g.id,
+           g.student_id,
+           s.last_name,
+           s.first_name,
+           s.middle_name,
+           s.class_name,
+           g.subject_name,
+           g.grade
+    FROM grades g
+    JOIN students s ON s.id = g.student_id
+    ORDER BY g.id
+"""
+
+GRADES_BY_STUDENT_QUERY = "SELECT id FROM grades WHERE student_id = %s"
+
+# Ученики со средней оценкой выше/ниже порога: диапазон по индексу avg_grade.
+# Порог приводится к numeric, иначе сравнение пойдёт в float8 мимо индекса.
+HONOR_STUDENTS_QUERY = """
+    SELECT s.last_name, s.first_name, s.middle_name, s.class_name
+    FROM student_grade_stats st
+    JOIN students s ON s.id = st.student_id
+    WHERE st.avg_grade >= %s::numeric
+"""
+
+FAILING_STUDENTS_QUERY = """
+    SELECT s.last_name, s.first_name, s.middle_name, s.class_name
+    FROM student_grade_stats st
+    JOIN students s ON s.id = st.student_id
+    WHERE st.avg_grade < %s::numeric
+"""
+
+SUBJECT_HONOR_STUDENTS_QUERY = """
+    SELECT s.last_name, s.first_name, s.middle_name, s.class_name
+    FROM student_subject_grade_stats st
+    JOIN students s ON s.id = st.student_id
+    WHERE st.subject_name = %s AND st.avg_grade >= %s::numeric
+"""
+
+SUBJECT_FAILING_STUDENTS_QUERY = """
+    SELECT s.last_name, s.first_name, s.middle_name, s.class_name
+    FROM student_subject_grade_stats st
+    JOIN students s ON s.id = st.student_id
+    WHERE st.subject_name = %s AND st.avg_grade < %s::numeric
+"""
+
+# Постраничная выборка (keyset): для каждой таблицы - начало SELECT, колонка id,
+# колонки для выборки по набору значений (lookup), условие поиска и допустимые
+# выражения сортировки. Выражения подставляются в SQL только из этого словаря.
+PAGE_QUERIES = {
+    "teachers": {
+        "select": """
+            SELECT id, last_name, first_name, middle_name, birth_date, subject, classes,
+                   {page_key}
+            FROM teachers
+        """,
+        "id_column": "id",
+        "lookup": {"id": "id"},
+        "search": f"{TEACHER_SEARCH_EXPR} LIKE %s",
+        "sort": {
+            "id": "id",
+            "fio": ("COALESCE(last_name, '')", "COALESCE(first_name, '')", "COALESCE(middle_name, '')"),
+            "birth_date": "COALESCE(birth_date, DATE '0001-01-01')",
+            "subject": "COALESCE(subject, '')",
+        },
+    },
+    "students": {
+        "select": """
+            SELECT id, last_name, first_name, middle_name, birth_date, class_name,
+                   {page_key}
+            FROM students
+        """,
+        "id_column": "id",
+        "lookup": {"id": "id"},
+        "search": f"{STUDENT_SEARCH_EXPR} LIKE %s",
+        "sort": {
+            "id": "id",
+            "fio": ("COALESCE(last_name, '')", "COALESCE(first_name, '')", "COALESCE(middle_name, '')"),
+            "birth_date": "COALESCE(birth_date, DATE '0001-01-01')",
+            # "5А" -> "005А": номер класса сравнивается как число, затем буква.
+            "class": "lpad(COALESCE(class_name[1], ''), 4, '0')",
+        },
+    },
+    "grades": {
+        "select": """
+            SELECT g.id, g.student_id, s.last_name, s.first_name, s.middle_name,
+                   s.class_name, g.subject_name, g.grade,
+                   {page_key}
+            FROM grades g
+            JOIN students s ON s.id = g.student_id
+        """,
+        "id_column": "g.id",
+        "lookup": {"id": "g.id", "student_id": "g.student_id"},
+        # Поиск по предмету оценки и по ФИО/классу ученика; каждая ветка идёт по своему индексу.
+        "search": f"""
+            g.id IN (
+                SELECT id FROM grades WHERE {GRADE_SUBJECT_SEARCH_EXPR} LIKE %s
+                UNION
+                SELECT id FROM grades WHERE student_id IN (
+                    SELECT id FROM students WHERE {STUDENT_SEARCH_EXPR} LIKE %s
+                )
+            )
+        """,
+        "sort": {
+            "id": "g.id",
+            "fio": ("COALESCE(s.last_name, '')", "COALESCE(s.first_name, '')", "COALESCE(s.middle_name, '')"),
+            "subject": "COALESCE(g.subject_name, '')",
+            "grade": "COALESCE(g.grade, 0)",
+            "class": "lpad(COALESCE(s.class_name[1], ''), 4, '0')",
+        },
+    },
+}
+
+
+
+def page_sort_exprs(table_name, sort_key):
+    """Выражения сортировки страниц таблицы по sort_key (кортеж, даже если выражение одно)."""
+    page = PAGE_QUERIES[table_name]
+    if sort_key not in page["sort"]:
+        raise ValueError(f"Нельзя сортировать {table_name} по {sort_key}")
+    sort_exprs = page["sort"][sort_key]
+    return (sort_exprs,) if isinstance(sort_exprs, str) else sort_exprs
+
+
+def build_page_query(table_name, sort_key="id", after=None, limit=200, descending=False, search_pattern=None):
+    """Текст и параметры запроса одной страницы (см. SchoolDatabase.fetch_page).
+
+    search_pattern - готовый шаблон LIKE или None. Для составного ключа
+    сортировки (ФИО) значение сортировки в after - кортеж значений.
+    """
+    page = PAGE_QUERIES[table_name]
+    sort_exprs = page_sort_exprs(table_name, sort_key)
+    id_column = page["id_column"]
+    direction = "DESC" if descending else "ASC"
+
+    query = page["select"].format(page_key=", ".join(sort_exprs))
+    conditions = []
+    params = []
+    if search_pattern is not None:
+        conditions.append(page["search"])
+        params.extend([search_pattern] * page["search"].count("%s"))
+    if after is not None:
+        operator = "<" if descending else ">"
+        sort_value, last_id = after
+        sort_values = tuple(sort_value) if len(sort_exprs) > 1 else (sort_value,)
+        key = ", ".join((*sort_exprs, id_column))
+        placeholders = ", ".join(["%s"] * (len(sort_exprs) + 1))
+        # Граница только по первому выражению сортировки следует из сравнения
+        # кортежей, но её можно искать по индексу, даже если выражение и id из разных таблиц.
+        conditions.append(f"{sort_exprs[0]} {operator}= %s")
+        conditions.append(f"({key}) {operator} ({placeholders})")
+        params.append(sort_values[0])
+        params.extend((*sort_values, last_id))
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    order = ", ".join(f"{expr} {direction}" for expr in (*sort_exprs, id_column))
+    query += f" ORDER BY {order} LIMIT %s"
+    params.append(limit)
+    return query, params
+
+
+# Горячие запросы и индексы, которые они должны использовать (см. explain_hot_queries).
+HOT_QUERY_PLANS = {
+    "find_student_id": (FIND_STUDENT_ID_QUERY, ("Иванов", "Иван", ""), "students_fio_idx"),
+    "teacher_exists": (
+        TEACHER_EXISTS_QUERY, ("Иванов", "Иван", "", "Математика"), "teachers_fio_subject_idx"
+    ),
+    "get_teacher_classes_by_name": (
+        TEACHER_CLASSES_BY_NAME_QUERY, ("Иванов", "Иван", ""), "teachers_fio_subject_idx"
+    ),
+    "get_students_count": (STUDENTS_IN_CLASS_COUNT_QUERY, ("5А",), "students_class_name_gin_idx"),
+    "get_teachers_by_classes": (
+        TEACHERS_BY_CLASSES_QUERY, (["5А"], ["5А"]), "teachers_classes_gin_idx"
+    ),
+    "grades_by_student": (GRADES_BY_STUDENT_QUERY, (1,), "grades_student_id_idx"),
+    "honor_students": (HONOR_STUDENTS_QUERY, (4.5,), "student_grade_stats_avg_idx"),
+    "subject_failing_students": (
+        SUBJECT_FAILING_STUDENTS_QUERY, ("Математика", 3.5), "student_subject_grade_stats_avg_idx"
+    ),
+    "page_teachers_by_fio": (
+        *build_page_query("teachers", "fio", after=(("Иванов", "Иван", "Иванович"), 1)),
+        "teachers_page_full_fio_idx"
+    ),
+    "page_students_by_fio": (
+        *build_page_query("students", "fio", after=(("Иванов", "Иван", ""), 1)), "students_page_full_fio_idx"
+    ),
+    "page_teachers_by_subject": (
+        *build_page_query("teachers", "subject", after=("Математика", 1)), "teachers_page_subject_idx"
+    ),
+    "page_students_by_birth_date": (
+        *build_page_query("students", "birth_date", after=(datetime.date(2012, 9, 1), 1), descending=True),
+        "students_page_birth_date_idx"
+    ),
+    "page_students_by_class": (
+        *build_page_query("students", "class", after=("005А", 1)), "students_page_class_idx"
+    ),
+    "page_grades_by_grade": (
+        *build_page_query("grades", "grade", after=(4, 1)), "grades_page_grade_idx"
+    ),
+    # Триграммные индексы есть только при установленном pg_trgm.
+    "search_students": (
+        f"SELECT id FROM students WHERE {STUDENT_SEARCH_EXPR} LIKE %s", ("%иван%",), "students_search_trgm_idx"
+    ),
+}
+
 
 class SchoolDatabase:
-    """Простой класс-обёртка над PostgreSQL. Содержит все запросы приложения."""
-    def __init__(self):
+    """Простой класс-обёртка над PostgreSQL. Содержит все запросы приложения.
+
+    Соединения берутся из пула на время одной операции, поэтому методы
+    можно вызывать одновременно из разных потоков.
+    """
+    def __init__(self, min_connections=None, max_connections=None, itersize=None):
         db_config = {
             "dbname": os.getenv("SCHOOL_DB_NAME", "school_db"),
             "user": os.getenv("SCHOOL_DB_USER", "postgres"),
@@ -13,21 +599,134 @@ class SchoolDatabase:
             "host": os.getenv("SCHOOL_DB_HOST", "localhost"),
             "port": int(os.getenv("SCHOOL_DB_PORT", 5432)),
         }
-        self.DB_CONNECTION = psycopg2.connect(**db_config)
-        self.DB_CURSOR = self.DB_CONNECTION.cursor()
-        self.__create_tables()
-        self.reset_all_sequences()
+        if min_connections is None:
+            min_connections = int(os.getenv("SCHOOL_DB_POOL_MIN", 1))
+        if max_connections is None:
+            max_connections = int(os.getenv("SCHOOL_DB_POOL_MAX", 4))
+        max_connections = max(max_connections, min_connections, 1)
+        if itersize is None:
+            itersize = int(os.getenv("SCHOOL_DB_ITERSIZE", 2000))
+        self.itersize = itersize
+        self._cursor_numbers = itertools.count(1)
+        self._trigram_search = None
+        self._db_config = db_config
+        # pid серверного процесса -> соединение пула; закрытые соединения удаляются,
+        # чтобы pid, переданный сервером другому клиенту, не считался своим.
+        # Словарь меняют потоки пула и читает поток ChangeListener, поэтому под замком.
+        self._backend_pids = {}
+        self._backend_pids_lock = threading.Lock()
+        self._local = threading.local()
+
+        self._pool = ThreadedConnectionPool(min_connections, max_connections, **db_config)
+        self._pool_slots = threading.BoundedSemaphore(max_connections)
+        self.migrate()
 
     def __del__(self):
-        """Закрывает соединение и курсор при уничтожении объекта."""
+        """Закрывает соединения пула при уничтожении объекта."""
         try:
-            if hasattr(self, "DB_CURSOR") and self.DB_CURSOR:
-                self.DB_CURSOR.close()
-            if hasattr(self, "DB_CONNECTION") and self.DB_CONNECTION:
-                self.DB_CONNECTION.close()
+            self.close()
         except Exception:
             pass
 
+    def close(self):
+        """Закрывает все соединения пула."""
+        pool = getattr(self, "_pool", None)
+        if pool is not None and not pool.closed:
+            pool.closeall()
+        with self._backend_pids_lock:
+            self._backend_pids = {}
+
+    @contextmanager
+    def connection(self):
+        """Выдаёт соединение из пула на время одной операции.
+
+        При нормальном выходе из блока транзакция фиксируется, при ошибке - откатывается.
+        Если все соединения заняты, поток ждёт, пока какое-нибудь вернётся в пул.
+        Внутри transaction() отдаётся её соединение, а фиксирует его сама transaction.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+
+        self._pool_slots.acquire()
+        try:
+            conn = self._pool.getconn()
+            pid = conn.get_backend_pid()
+            with self._backend_pids_lock:
+                self._backend_pids[pid] = conn
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                # Пул закрывает и лишние простаивающие соединения (сверх minconn).
+                self._pool.putconn(conn, close=bool(conn.closed))
+                if conn.closed:
+                    with self._backend_pids_lock:
+                        if self._backend_pids.get(pid) is conn:
+                            del self._backend_pids[pid]
+        finally:
+            self._pool_slots.release()
+
+    @contextmanager
+    def transaction(self):
+        """Выполняет все методы, вызванные в блоке из этого потока, в одной транзакции.
+
+        Например, запись части импорта и контрольная точка задания фиксируются
+        вместе. Вложенный transaction() присоединяется к внешнему.
+        """
+        if getattr(self._local, "conn", None) is not None:
+            yield
+            return
+        with self.connection() as conn:
+            self._local.conn = conn
+            try:
+                yield
+            finally:
+                self._local.conn = None
+
+    @contextmanager
+    def cursor(self):
+        """Выдаёт курсор на соединении из пула (см. connection)."""
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                yield cur
+
+    def listen_connection(self):
+        """Открывает отдельное соединение (вне пула), подписанное на CHANGE_CHANNEL.
+
+        Соединение в режиме autocommit: уведомления приходят сразу, а не
+        по завершении транзакции. Закрывает его вызывающий.
+        """
+        conn = psycopg2.connect(**self._db_config)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {CHANGE_CHANNEL}")
+        return conn
+
+    def is_own_backend(self, pid):
+        """Принадлежит ли серверный процесс pid соединению из пула этого объекта."""
+        with self._backend_pids_lock:
+            return pid in self._backend_pids
+
+    def iter_query(self, query, params=None, itersize=None):
+        """Построчно отдаёт результат запроса через именованный (серверный) курсор.
+
+        Строки приходят с сервера пачками по itersize, так что память не зависит
+        от размера результата. Соединение занято, пока генератор не дочитан или не закрыт.
+        """
+        cursor_name = f"school_stream_{next(self._cursor_numbers)}"
+        with self.connection() as conn:
+            with conn.cursor(name=cursor_name) as cur:
+                cur.itersize = itersize or self.itersize
+                cur.execute(query, params)
+                for row in cur:
+                    yield row
+
     def _prepare_array(self, values):
         """Приводит список/строку классов к виду, понятному PostgreSQL."""
         if not values:
@@ -47,44 +746,104 @@ class SchoolDatabase:
                 result.append(text)
         return result
 
-    def __create_tables(self):
-        """Создаёт таблицы, если их ещё нет."""
-        students_table = """
-                            CREATE TABLE IF NOT EXISTS students (
-                                id SERIAL PRIMARY KEY,
-                                last_name VARCHAR(50),
-                                first_name VARCHAR(50),
-                                middle_name VARCHAR(50),
-                                birth_date DATE,
-                                class_name TEXT[]
-                            );
-                        """
-        teachers_table = """
-                            CREATE TABLE IF NOT EXISTS teachers (
-                                id SERIAL PRIMARY KEY,
-                                last_name VARCHAR(50),
-                                first_name VARCHAR(50),
-                                middle_name VARCHAR(50),
-                                birth_date DATE,
-                                subject VARCHAR(50),
-                                classes TEXT[]
-                            );
-                        """
-        grades_table =  """
-                            CREATE TABLE IF NOT EXISTS grades (
-                                id SERIAL PRIMARY KEY,
-                                student_id INTEGER REFERENCES students(id),
-                                subject_name VARCHAR(50),
-                                grade INTEGER CHECK (grade >=1 AND grade <= 5),
-                                grade_date DATE DEFAULT CURRENT_DATE
-                            );
-                       """
-        self.DB_CURSOR.execute(students_table)
-        self.DB_CURSOR.execute(teachers_table)
-        self.DB_CURSOR.execute(grades_table)
-        self.DB_CURSOR.execute("ALTER TABLE students ADD COLUMN IF NOT EXISTS birth_date DATE")
-        self.DB_CURSOR.execute("ALTER TABLE teachers ADD COLUMN IF NOT EXISTS birth_date DATE")
-        self.DB_CONNECTION.commit()
+    def _pg_array_literal(self, values):
+        """Записывает список классов как литерал массива PostgreSQL (для COPY)."""
+        items = []
+        for item in self._prepare_array(values):
+            escaped = item.replace("\\", "\\\\").replace('"', '\\"')
+            items.append(f'"{escaped}"')
+        return "{" + ",".join(items) + "}"
+
+    def _reserve_ids(self, cur, table_name, count):
+        """Заранее берёт count значений из последовательности id таблицы."""
+        cur.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s) ORDER BY 1",
+            (table_name, count)
+        )
+        return [row[0] for row in cur.fetchall()]
+
+    def _copy_to_stage(self, cur, stage_table, columns, text_columns, rows):
+        """Передаёт строки во временную таблицу через COPY FROM STDIN."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(rows)
+        buffer.seek(0)
+        cur.copy_expert(
+            f"COPY {stage_table} ({', '.join(columns)}) FROM STDIN "
+            f"WITH (FORMAT csv, FORCE_NOT_NULL ({', '.join(text_columns)}))",
+            buffer
+        )
+
+    def _like_pattern(self, text):
+        """Шаблон LIKE для поиска подстроки: спецсимволы экранируются, регистр понижается."""
+        escaped = text.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return f"%{escaped}%"
+
+    def has_trigram_search(self):
+        """Проверяет, установлено ли расширение pg_trgm (результат запоминается)."""
+        if self._trigram_search is None:
+            with self.cursor() as cur:
+                cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+                self._trigram_search = cur.fetchone()[0]
+        return self._trigram_search
+
+    def get_schema_version(self):
+        """Возвращает номер последней применённой миграции (0 для пустой базы)."""
+        try:
+            with self.cursor() as cur:
+                cur.execute("SELECT MAX(version) FROM schema_version")
+                version = cur.fetchone()[0]
+        except errors.UndefinedTable:
+            return 0
+        return version or 0
+
+    def migrate(self):
+        """Доводит схему базы до последней версии из MIGRATIONS.
+
+        Если схема уже актуальна, это единственный запрос к schema_version.
+        Иначе недостающие шаги выполняются по порядку в одной транзакции
+        под advisory-блокировкой, чтобы два клиента не мигрировали одновременно.
+        """
+        latest_version = MIGRATIONS[-1][0]
+        if self.get_schema_version() >= latest_version:
+            return
+
+        with self.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_ID,))
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT,
+                    applied_at TIMESTAMP DEFAULT now()
+                )
+            """)
+            cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            current_version = cur.fetchone()[0]
+            for version, description, statements in MIGRATIONS:
+                if version <= current_version:
+                    continue
+                for statement in statements:
+                    cur.execute(statement)
+                cur.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+
+    def explain_hot_queries(self):
+        """Проверяет через EXPLAIN, что горячие запросы используют свои индексы.
+
+        На время проверки последовательное сканирование запрещается: на маленьких
+        таблицах планировщик всё равно выбрал бы его. Возвращает словарь
+        {имя запроса: (индекс используется, текст плана)}.
+        """
+        results = {}
+        with self.cursor() as cur:
+            cur.execute("SET LOCAL enable_seqscan = off")
+            for name, (query, params, index_name) in HOT_QUERY_PLANS.items():
+                cur.execute("EXPLAIN " + query, params)
+                plan = "\n".join(row[0] for row in cur.fetchall())
+                results[name] = (index_name in plan, plan)
+        return results
 
     def add_student(self, last_name, first_name, class_name, middle_name="", birth_date=None):
         """Добавляет ученика и возвращает его id."""
@@ -95,13 +854,12 @@ class SchoolDatabase:
                         RETURNING id
                         """
         class_array = self._prepare_array(class_name)
-        self.DB_CURSOR.execute(
-            insert_student_query,
-            (last_name, first_name, middle_name, birth_date, class_array)
-        )
-        student_id = self.DB_CURSOR.fetchone()[0]
-        self.DB_CONNECTION.commit()
-        return student_id
+        with self.cursor() as cur:
+            cur.execute(
+                insert_student_query,
+                (last_name, first_name, middle_name, birth_date, class_array)
+            )
+            return cur.fetchone()[0]
 
     def update_students(self, student_id, last_name, first_name,
                         class_name, middle_name="", birth_date=None):
@@ -112,51 +870,65 @@ class SchoolDatabase:
             WHERE id = %s
         """
         class_array = self._prepare_array(class_name)
-        self.DB_CURSOR.execute(
-            update_student_query,
-            (last_name, first_name, class_array, middle_name, birth_date, student_id)
-        )
-        self.DB_CONNECTION.commit()
+        with self.cursor() as cur:
+            cur.execute(
+                update_student_query,
+                (last_name, first_name, class_array, middle_name, birth_date, student_id)
+            )
 
     def get_students_count(self, class_name=None):
         """Считает учеников в школе или в выбранном классе."""
-        if class_name:
-            query = "SELECT COUNT(*) FROM students WHERE %s = ANY(class_name)"
-            self.DB_CURSOR.execute(query, (class_name,))
-        else:
-            self.DB_CURSOR.execute("SELECT COUNT(*) FROM students")
-        return self.DB_CURSOR.fetchone()[0]
-
-    def get_grades(self):
-        """Возвращает данные для отчёта об успеваемости."""
-        self.DB_CURSOR.execute("""
-            SELECT last_name, first_name, middle_name, class_name
-            FROM students WHERE id IN (
-                SELECT student_id FROM grades
-                GROUP BY student_id
-                HAVING AVG(grade) >= 4.5
-                
-                )
-            """)
-        good_students = self.DB_CURSOR.fetchall()
-
-        self.DB_CURSOR.execute("""
-            SELECT last_name, first_name, middle_name, class_name
-            FROM students WHERE id IN (
-                SELECT student_id FROM grades
-                GROUP BY student_id
-                HAVING AVG(grade) < 3.5
-                
-                )
-            """)
-        bad_students = self.DB_CURSOR.fetchall()
+        with self.cursor() as cur:
+            if class_name:
+                cur.execute(STUDENTS_IN_CLASS_COUNT_QUERY, (class_name,))
+            else:
+                cur.execute("SELECT COUNT(*) FROM students")
+            return cur.fetchone()[0]
+
+    def get_table_count(self, table_name):
+        """Возвращает количество записей в одной из таблиц приложения."""
+        if table_name not in ("students", "teachers", "grades"):
+            raise ValueError(f"Неизвестная таблица: {table_name}")
+        with self.cursor() as cur:
+            cur.execute(f"SELECT COUNT(*) FROM {table_name}")
+            return cur.fetchone()[0]
+
+    def get_grades(self, honor_threshold=4.5, failing_threshold=3.5, subject=None):
+        """Возвращает данные для отчёта об успеваемости.
+
+        Отличники - ученики со средней оценкой не ниже honor_threshold,
+        двоечники - ниже failing_threshold. Средние берутся из таблиц
+        student_grade_stats (или student_subject_grade_stats, если задан
+        subject), которые триггеры поддерживают при каждом изменении оценок.
+        """
+        with self.cursor() as cur:
+            if subject is None:
+                cur.execute(HONOR_STUDENTS_QUERY, (honor_threshold,))
+                good_students = cur.fetchall()
+                cur.execute(FAILING_STUDENTS_QUERY, (failing_threshold,))
+                bad_students = cur.fetchall()
+            else:
+                cur.execute(SUBJECT_HONOR_STUDENTS_QUERY, (subject, honor_threshold))
+                good_students = cur.fetchall()
+                cur.execute(SUBJECT_FAILING_STUDENTS_QUERY, (subject, failing_threshold))
+                bad_students = cur.fetchall()
+
+            cur.execute("SELECT COUNT(*) FROM students")
+            total_students = cur.fetchone()[0]
 
         return {
             'good_students': good_students,
             'bad_students': bad_students,
-            'total_students': self.get_students_count()
+            'total_students': total_students
         }
 
+    def rebuild_grade_stats(self):
+        """Пересчитывает средние оценки учеников по таблице grades целиком."""
+        with self.cursor() as cur:
+            cur.execute("LOCK TABLE grades IN SHARE MODE")
+            for statement in GRADE_STATS_REBUILD:
+                cur.execute(statement)
+
     def add_grade(self, student_id, subject_name, grade):
         """Добавляет новую оценку и возвращает её id."""
         query = """
@@ -164,34 +936,174 @@ class SchoolDatabase:
             VALUES (%s, %s, %s)
             RETURNING id
         """
-        self.DB_CURSOR.execute(query, (student_id, subject_name, grade))
-        grade_id = self.DB_CURSOR.fetchone()[0]
-        self.DB_CONNECTION.commit()
-        return grade_id
+        with self.cursor() as cur:
+            cur.execute(query, (student_id, subject_name, grade))
+            return cur.fetchone()[0]
+
+    def add_grades_bulk(self, grade_rows, page_size=1000, import_keys=None):
+        """Добавляет пачку оценок одной транзакцией.
+
+        grade_rows - последовательность кортежей (student_id, subject_name, grade).
+        import_keys - ключи повторного импорта в порядке строк: оценки, чей ключ
+        уже есть в базе, пропускаются. Возвращает количество вставленных строк.
+        """
+        if import_keys is None:
+            query = "INSERT INTO grades (student_id, subject_name, grade) VALUES %s"
+            with self.cursor() as cur:
+                execute_values(cur, query, grade_rows, page_size=page_size)
+            return len(grade_rows)
+
+        query = """
+            INSERT INTO grades (student_id, subject_name, grade, import_key) VALUES %s
+            ON CONFLICT (import_key) DO NOTHING
+            RETURNING id
+        """
+        with self.cursor() as cur:
+            inserted = execute_values(
+                cur, query, [(*row, key) for row, key in zip(grade_rows, import_keys)],
+                page_size=page_size, fetch=True
+            )
+        return len(inserted)
+
+    def add_students_bulk(self, student_rows, import_keys=None):
+        """Загружает пачку учеников через COPY во временную таблицу и один INSERT.
+
+        student_rows - последовательность кортежей
+        (last_name, first_name, middle_name, birth_date, class_name).
+        import_keys - ключи повторного импорта в порядке строк: ученики, чей ключ
+        уже есть в базе, пропускаются.
+        Возвращает список id в том же порядке, что и входные строки, для пропущенных - None.
+        """
+        if not student_rows:
+            return []
+        if import_keys is None:
+            import_keys = [None] * len(student_rows)
+        with self.cursor() as cur:
+            ids = self._reserve_ids(cur, "students", len(student_rows))
+            cur.execute("""
+                CREATE TEMP TABLE students_stage (LIKE students) ON COMMIT DROP
+            """)
+            self._copy_to_stage(
+                cur,
+                "students_stage",
+                ("id", "last_name", "first_name", "middle_name", "birth_date", "class_name", "import_key"),
+                ("last_name", "first_name", "middle_name"),
+                (
+                    (student_id, last_name, first_name, middle_name or "",
+                     birth_date, self._pg_array_literal(class_name), import_key)
+                    for student_id, (last_name, first_name, middle_name, birth_date, class_name), import_key
+                    in zip(ids, student_rows, import_keys)
+                )
+            )
+            cur.execute("""
+                INSERT INTO students (id, last_name, first_name, middle_name, birth_date, class_name, import_key)
+                SELECT id, last_name, first_name, middle_name, birth_date, class_name, import_key
+                FROM students_stage
+                ON CONFLICT (import_key) DO NOTHING
+                RETURNING id
+            """)
+            inserted = {row[0] for row in cur.fetchall()}
+        return [student_id if student_id in inserted else None for student_id in ids]
+
+    def add_teachers_bulk(self, teacher_rows):
+        """Загружает пачку учителей через COPY во временную таблицу и один INSERT.
+
+        teacher_rows - последовательность кортежей
+        (last_name, first_name, middle_name, birth_date, subject, classes).
+        Учителя, которые уже есть в базе (ФИО + предмет), пропускаются.
+        Возвращает список id в порядке входных строк, для пропущенных - None.
+        """
+        if not teacher_rows:
+            return []
+        with self.cursor() as cur:
+            ids = self._reserve_ids(cur, "teachers", len(teacher_rows))
+            cur.execute("""
+                CREATE TEMP TABLE teachers_stage (LIKE teachers) ON COMMIT DROP
+            """)
+            self._copy_to_stage(
+                cur,
+                "teachers_stage",
+                ("id", "last_name", "first_name", "middle_name", "birth_date", "subject", "classes"),
+                ("last_name", "first_name", "middle_name", "subject"),
+                (
+                    (teacher_id, last_name, first_name, middle_name or "",
+                     birth_date, subject, self._pg_array_literal(classes))
+                    for teacher_id, (last_name, first_name, middle_name, birth_date, subject, classes)
+                    in zip(ids, teacher_rows)
+                )
+            )
+            cur.execute("""
+                INSERT INTO teachers (id, last_name, first_name, middle_name, birth_date, subject, classes)
+                SELECT st.id, st.last_name, st.first_name, st.middle_name, st.birth_date, st.subject, st.classes
+                FROM teachers_stage st
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM teachers t
+                    WHERE t.last_name = st.last_name
+                      AND t.first_name = st.first_name
+                      AND COALESCE(t.middle_name, '') = st.middle_name
+                      AND t.subject = st.subject
+                )
+                RETURNING id
+            """)
+            inserted = {row[0] for row in cur.fetchall()}
+        return [teacher_id if teacher_id in inserted else None for teacher_id in ids]
+
+    def start_import_job(self, table_name, file_name, file_hash):
+        """Находит незавершённое задание импорта файла в таблицу или создаёт новое.
+
+        Возвращает (id задания, записано строк файла, добавлено, отклонено);
+        у нового задания счётчики нулевые.
+        """
+        with self.cursor() as cur:
+            cur.execute("""
+                SELECT id, rows_done, imported, rejected FROM import_jobs
+                WHERE table_name = %s AND file_hash = %s AND NOT finished
+                FOR UPDATE
+            """, (table_name, file_hash))
+            job = cur.fetchone()
+            if job is not None:
+                return job
+            cur.execute(
+                "INSERT INTO import_jobs (table_name, file_name, file_hash) VALUES (%s, %s, %s) RETURNING id",
+                (table_name, file_name, file_hash)
+            )
+            return cur.fetchone()[0], 0, 0, 0
+
+    def checkpoint_import_job(self, job_id, rows_done, imported, rejected):
+        """Запоминает, сколько строк файла записано; вызывается в transaction() вместе с записью части."""
+        with self.cursor() as cur:
+            cur.execute("""
+                UPDATE import_jobs SET rows_done = %s, imported = %s, rejected = %s, updated_at = now()
+                WHERE id = %s
+            """, (rows_done, imported, rejected, job_id))
+
+    def finish_import_job(self, job_id):
+        """Отмечает задание импорта завершённым."""
+        with self.cursor() as cur:
+            cur.execute("UPDATE import_jobs SET finished = true, updated_at = now() WHERE id = %s", (job_id,))
 
     def delete_student(self, student_id):
         """Удаляет ученика и все его оценки."""
-        self.DB_CURSOR.execute("DELETE FROM grades WHERE student_id = %s", (student_id,))
-        self.DB_CURSOR.execute("DELETE FROM students WHERE id = %s", (student_id,))
-        self.DB_CONNECTION.commit()
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM grades WHERE student_id = %s", (student_id,))
+            cur.execute("DELETE FROM students WHERE id = %s", (student_id,))
 
     def add_teacher(self, last_name, first_name, subject, classes, middle_name="", birth_date=None):
         """Добавляет учителя и возвращает его id."""
         add_teacher_query = """
-                                INSERT INTO teachers (last_name, first_name, 
+                                INSERT INTO teachers (last_name, first_name,
                                 middle_name, birth_date, subject, classes)
                                 VALUES (%s, %s, %s, %s, %s, %s)
                                 RETURNING id
                                 """
         classes_array = self._prepare_array(classes)
 
-        self.DB_CURSOR.execute(
-            add_teacher_query,
-            (last_name, first_name, middle_name, birth_date, subject, classes_array)
-        )
-        teacher_id = self.DB_CURSOR.fetchone()[0]
-        self.DB_CONNECTION.commit()
-        return teacher_id
+        with self.cursor() as cur:
+            cur.execute(
+                add_teacher_query,
+                (last_name, first_name, middle_name, birth_date, subject, classes_array)
+            )
+            return cur.fetchone()[0]
 
     def update_teachers(self, teacher_id, last_name, first_name,
                         subject, classes, middle_name="", birth_date=None):
@@ -202,51 +1114,46 @@ class SchoolDatabase:
                     WHERE id = %s
                 """
         classes_array = self._prepare_array(classes)
-        self.DB_CURSOR.execute(
-            update_teachers_query,
-            (last_name, first_name, subject, classes_array, middle_name, birth_date, teacher_id)
-        )
-        self.DB_CONNECTION.commit()
+        with self.cursor() as cur:
+            cur.execute(
+                update_teachers_query,
+                (last_name, first_name, subject, classes_array, middle_name, birth_date, teacher_id)
+            )
 
     def get_teachers_by_subject(self, subject):
         """Находит учителей по предмету."""
-        self.DB_CURSOR.execute("""SELECT last_name, first_name, middle_name
-         FROM teachers WHERE subject = %s""", (subject,))
-        return self.DB_CURSOR.fetchall()
+        with self.cursor() as cur:
+            cur.execute("""SELECT last_name, first_name, middle_name
+             FROM teachers WHERE subject = %s""", (subject,))
+            return cur.fetchall()
 
     def get_teachers_by_classes(self, classes):
         """Находит учителей по набору классов."""
-        self.DB_CURSOR.execute("""SELECT last_name, first_name, middle_name
-        FROM teachers WHERE classes = %s""", (classes,))
-        return self.DB_CURSOR.fetchall()
+        with self.cursor() as cur:
+            classes_array = self._prepare_array(classes)
+            cur.execute(TEACHERS_BY_CLASSES_QUERY, (classes_array, classes_array))
+            return cur.fetchall()
 
     def get_teacher_classes(self, teacher_id):
         """Возвращает список классов, закреплённых за учителем."""
-        self.DB_CURSOR.execute("SELECT classes FROM teachers WHERE id = %s", (teacher_id,))
-        return self.DB_CURSOR.fetchone()[0]
+        with self.cursor() as cur:
+            cur.execute("SELECT classes FROM teachers WHERE id = %s", (teacher_id,))
+            return cur.fetchone()[0]
 
     def delete_teacher(self, teacher_id):
         """Удаляет учителя."""
-        self.DB_CURSOR.execute("DELETE FROM teachers WHERE id = %s", (teacher_id,))
-        self.DB_CONNECTION.commit()
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM teachers WHERE id = %s", (teacher_id,))
 
     def get_all_grades_rows(self):
         """Возвращает все оценки вместе с ФИО учеников и их классами."""
-        grade_rows_query = """
-            SELECT g.id,
-                   g.student_id,
-                   s.last_name,
-                   s.first_name,
-                   s.middle_name,
-                   s.class_name,
-                   g.subject_name,
-                   g.grade
-            FROM grades g
-            JOIN students s ON s.id = g.student_id
-            ORDER BY g.id
-        """
-        self.DB_CURSOR.execute(grade_rows_query)
-        return self.DB_CURSOR.fetchall()
+        with self.cursor() as cur:
+            cur.execute(ALL_GRADES_ROWS_QUERY)
+            return cur.fetchall()
+
+    def iter_grades_rows(self, itersize=None):
+        """То же, что get_all_grades_rows, но генератором на серверном курсоре."""
+        return self.iter_query(ALL_GRADES_ROWS_QUERY, itersize=itersize)
 
     def update_grade(self, grade_id, student_id, subject_name, grade):
         """Правит существующую оценку."""
@@ -255,29 +1162,35 @@ class SchoolDatabase:
             SET student_id = %s, subject_name = %s, grade = %s
             WHERE id = %s
         """
-        self.DB_CURSOR.execute(query, (student_id, subject_name, grade, grade_id))
-        self.DB_CONNECTION.commit()
+        with self.cursor() as cur:
+            cur.execute(query, (student_id, subject_name, grade, grade_id))
 
     def delete_grade(self, grade_id):
         """Удаляет оценку."""
-        self.DB_CURSOR.execute("DELETE FROM grades WHERE id = %s", (grade_id,))
-        self.DB_CONNECTION.commit()
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM grades WHERE id = %s", (grade_id,))
 
     def find_student_id(self, last_name, first_name, middle_name=""):
         """Ищет id ученика по ФИО."""
-        query = """
-            SELECT id FROM students
-            WHERE last_name = %s AND first_name = %s AND COALESCE(middle_name, '') = %s
-        """
-        self.DB_CURSOR.execute(query, (last_name, first_name, middle_name))
-        result = self.DB_CURSOR.fetchone()
+        with self.cursor() as cur:
+            cur.execute(FIND_STUDENT_ID_QUERY, (last_name, first_name, middle_name))
+            result = cur.fetchone()
         return result[0] if result else None
 
+    def get_student_fio_rows(self):
+        """Возвращает (id, фамилия, имя, отчество) всех учеников для построения индекса ФИО."""
+        with self.cursor() as cur:
+            cur.execute(
+                "SELECT id, last_name, first_name, COALESCE(middle_name, '') FROM students"
+            )
+            return cur.fetchall()
+
     def get_student_id_by_grade_id(self, grade_id):
         """Получает student_id по grade_id."""
         query = "SELECT student_id FROM grades WHERE id = %s"
-        self.DB_CURSOR.execute(query, (grade_id,))
-        result = self.DB_CURSOR.fetchone()
+        with self.cursor() as cur:
+            cur.execute(query, (grade_id,))
+            result = cur.fetchone()
         return result[0] if result else None
 
     def get_student_fio_by_id(self, student_id):
@@ -285,8 +1198,9 @@ class SchoolDatabase:
         query = """
             SELECT last_name, first_name, middle_name FROM students WHERE id = %s
         """
-        self.DB_CURSOR.execute(query, (student_id,))
-        result = self.DB_CURSOR.fetchone()
+        with self.cursor() as cur:
+            cur.execute(query, (student_id,))
+            result = cur.fetchone()
         if result:
             last_name, first_name, middle_name = result
             return f"{last_name} {first_name} {middle_name}".strip()
@@ -297,8 +1211,9 @@ class SchoolDatabase:
         query = """
             SELECT class_name, birth_date FROM students WHERE id = %s
         """
-        self.DB_CURSOR.execute(query, (student_id,))
-        result = self.DB_CURSOR.fetchone()
+        with self.cursor() as cur:
+            cur.execute(query, (student_id,))
+            result = cur.fetchone()
         if result:
             class_name, birth_date = result
             return class_name, birth_date
@@ -306,37 +1221,30 @@ class SchoolDatabase:
 
     def teacher_exists(self, last_name, first_name, middle_name, subject):
         """Проверяет, есть ли учитель с таким ФИО и предметом."""
-        query = """
-            SELECT id FROM teachers
-            WHERE last_name = %s
-              AND first_name = %s
-              AND COALESCE(middle_name, '') = %s
-              AND subject = %s
-            LIMIT 1
-        """
-        self.DB_CURSOR.execute(query, (last_name, first_name, middle_name, subject))
-        return self.DB_CURSOR.fetchone() is not None
+        with self.cursor() as cur:
+            cur.execute(TEACHER_EXISTS_QUERY, (last_name, first_name, middle_name, subject))
+            return cur.fetchone() is not None
 
     def clear_teachers(self):
         """Полностью очищает таблицу учителей."""
-        self.DB_CURSOR.execute("DELETE FROM teachers")
-        self.reset_sequence("teachers")
-        self.DB_CONNECTION.commit()
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM teachers")
+            self._reset_sequence(cur, "teachers")
 
     def clear_students(self):
         """Полностью очищает таблицу учеников."""
-        self.DB_CURSOR.execute("DELETE FROM students")
-        self.reset_sequence("students")
-        self.DB_CONNECTION.commit()
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM students")
+            self._reset_sequence(cur, "students")
 
     def clear_grades(self):
         """Полностью очищает таблицу оценок."""
-        self.DB_CURSOR.execute("DELETE FROM grades")
-        self.reset_sequence("grades")
-        self.DB_CONNECTION.commit()
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM grades")
+            self._reset_sequence(cur, "grades")
 
-    def reset_sequence(self, table_name):
-        """Сбрасывает последовательность id для указанной таблицы."""
+    def _reset_sequence(self, cur, table_name):
+        """Сбрасывает последовательность id таблицы на уже открытом курсоре."""
         query = f"""
             SELECT setval(
                 pg_get_serial_sequence('{table_name}', 'id'),
@@ -344,66 +1252,109 @@ class SchoolDatabase:
                 false
             )
         """
-        self.DB_CURSOR.execute(query)
-        self.DB_CONNECTION.commit()
+        cur.execute(query)
+
+    def reset_sequence(self, table_name):
+        """Сбрасывает последовательность id для указанной таблицы."""
+        with self.cursor() as cur:
+            self._reset_sequence(cur, table_name)
 
     def reset_all_sequences(self):
         """Сбрасывает последовательности для всех таблиц."""
-        for table in ("students", "teachers", "grades"):
-            self.reset_sequence(table)
+        with self.cursor() as cur:
+            for table in ("students", "teachers", "grades"):
+                self._reset_sequence(cur, table)
 
     def fetch_all_teachers(self):
         """Возвращает все строки из таблицы teachers."""
-        self.DB_CURSOR.execute("SELECT id, last_name, first_name, middle_name, birth_date, subject, classes FROM teachers")
-        return self.DB_CURSOR.fetchall()
+        with self.cursor() as cur:
+            cur.execute(ALL_TEACHERS_QUERY)
+            return cur.fetchall()
+
+    def iter_teachers(self, itersize=None):
+        """То же, что fetch_all_teachers, но генератором на серверном курсоре."""
+        return self.iter_query(ALL_TEACHERS_QUERY, itersize=itersize)
 
     def fetch_all_students(self):
         """Возвращает все строки из таблицы students."""
-        self.DB_CURSOR.execute("SELECT id, last_name, first_name, middle_name, birth_date, class_name FROM students")
-        return self.DB_CURSOR.fetchall()
+        with self.cursor() as cur:
+            cur.execute(ALL_STUDENTS_QUERY)
+            return cur.fetchall()
+
+    def iter_students(self, itersize=None):
+        """То же, что fetch_all_students, но генератором на серверном курсоре."""
+        return self.iter_query(ALL_STUDENTS_QUERY, itersize=itersize)
+
+    def fetch_page(self, table_name, sort_key="id", after=None, limit=200, descending=False, search=None):
+        """Возвращает одну страницу строк таблицы (keyset-пагинация).
+
+        Строки упорядочены по (sort_key, id); after - пара (значение сортировки, id)
+        последней строки предыдущей страницы или None для первой страницы.
+        Если задан search, возвращаются только строки, содержащие эту подстроку
+        (без учёта регистра). К каждой строке в конце добавлено значение сортировки
+        (page_key); у составного ключа (ФИО) это кортеж (фамилия, имя, отчество).
+        """
+        key_size = len(page_sort_exprs(table_name, sort_key))
+        query, params = build_page_query(
+            table_name, sort_key, after, limit, descending, self._like_pattern(search) if search else None
+        )
+        with self.cursor() as cur:
+            cur.execute(query, params)
+            rows = cur.fetchall()
+        if key_size > 1:
+            rows = [row[:-key_size] + (row[-key_size:],) for row in rows]
+        return rows
+
+    def fetch_rows_by_ids(self, table_name, ids, column="id"):
+        """Возвращает строки таблицы в формате fetch_page (без page_key), у которых column из ids."""
+        page = PAGE_QUERIES[table_name]
+        lookup = page["lookup"][column]
+        query = page["select"].format(page_key=page["id_column"])
+        query += f" WHERE {lookup} = ANY(%s) ORDER BY {page['id_column']}"
+        with self.cursor() as cur:
+            cur.execute(query, (list(ids),))
+            return [row[:-1] for row in cur.fetchall()]
 
     def get_subject_list(self):
         """Возвращает список всех предметов."""
-        self.DB_CURSOR.execute("""
-            SELECT DISTINCT subject
-            FROM teachers
-            WHERE subject IS NOT NULL AND subject <> ''
-            ORDER BY subject
-        """)
-        return [row[0] for row in self.DB_CURSOR.fetchall()]
+        with self.cursor() as cur:
+            cur.execute("""
+                SELECT DISTINCT subject
+                FROM teachers
+                WHERE subject IS NOT NULL AND subject <> ''
+                ORDER BY subject
+            """)
+            return [row[0] for row in cur.fetchall()]
 
     def get_teacher_fios(self):
         """Возвращает список ФИО учителей."""
-        self.DB_CURSOR.execute("""
-            SELECT last_name, first_name, COALESCE(middle_name, '')
-            FROM teachers
-            ORDER BY last_name, first_name, middle_name
-        """)
-        return self.DB_CURSOR.fetchall()
+        with self.cursor() as cur:
+            cur.execute("""
+                SELECT last_name, first_name, COALESCE(middle_name, '')
+                FROM teachers
+                ORDER BY last_name, first_name, middle_name
+            """)
+            return cur.fetchall()
 
     def get_class_list(self):
         """Возвращает список классов в школе."""
-        self.DB_CURSOR.execute("""
-            SELECT DISTINCT class_name
-            FROM (
-                SELECT UNNEST(class_name) AS class_name
-                FROM students
-            ) AS t
-            WHERE class_name IS NOT NULL AND class_name <> ''
-            ORDER BY class_name
-        """)
-        return [row[0] for row in self.DB_CURSOR.fetchall()]
+        with self.cursor() as cur:
+            cur.execute("""
+                SELECT DISTINCT class_name
+                FROM (
+                    SELECT UNNEST(class_name) AS class_name
+                    FROM students
+                ) AS t
+                WHERE class_name IS NOT NULL AND class_name <> ''
+                ORDER BY class_name
+            """)
+            return [row[0] for row in cur.fetchall()]
 
     def get_teacher_classes_by_name(self, last_name, first_name, middle_name=""):
         """Возвращает массив классов по ФИО учителя."""
-        query = """
-            SELECT classes
-            FROM teachers
-            WHERE last_name = %s AND first_name = %s AND COALESCE(middle_name, '') = %s
-            LIMIT 1
-        """
-        self.DB_CURSOR.execute(query, (last_name, first_name, middle_name))
-        result = self.DB_CURSOR.fetchone()
+        with self.cursor() as cur:
+            cur.execute(TEACHER_CLASSES_BY_NAME_QUERY, (last_name, first_name, middle_name))
+            result = cur.fetchone()
         return result[0] if result else []
 
     def get_teacher_by_id(self, teacher_id):
@@ -413,8 +1364,9 @@ class SchoolDatabase:
             FROM teachers
             WHERE id = %s
         """
-        self.DB_CURSOR.execute(query, (teacher_id,))
-        return self.DB_CURSOR.fetchone()
+        with self.cursor() as cur:
+            cur.execute(query, (teacher_id,))
+            return cur.fetchone()
 
     def get_student_by_id(self, student_id):
         """Получает данные ученика по ID."""
@@ -423,8 +1375,9 @@ class SchoolDatabase:
             FROM students
             WHERE id = %s
         """
-        self.DB_CURSOR.execute(query, (student_id,))
-        return self.DB_CURSOR.fetchone()
+        with self.cursor() as cur:
+            cur.execute(query, (student_id,))
+            return cur.fetchone()
 
     def get_grade_by_id(self, grade_id):
         """Получает данные оценки по ID."""
@@ -433,5 +1386,6 @@ class SchoolDatabase:
             FROM grades
             WHERE id = %s
         """
-        self.DB_CURSOR.execute(query, (grade_id,))
-        return self.DB_CURSOR.fetchone()
+        with self.cursor() as cur:
+            cur.execute(query, (grade_id,))
+            return cur.fetchone()
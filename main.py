@@ -8,20 +8,24 @@ __author__ = "Nika Sheshko"
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import csv
-import xml.etree.ElementTree as ET
 import datetime
-import re
+import itertools
 import os
+import time
+import threading
 import logging
-from xhtml2pdf.default import DEFAULT_FONT
-from xml.dom import minidom
-from jinja2 import Environment, FileSystemLoader
-from xhtml2pdf import pisa
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from database import SchoolDatabase
 from models import Teacher, Student, GradeRecord
+from virtual_treeview import VirtualTreeview
+from search_index import TrigramIndex
+from search_scheduler import SearchScheduler
+from sort_index import SortIndex, column_sort_key, parse_single_class, parse_teacher_classes
+from task_executor import TaskExecutor, ProgressDialog, OperationCancelled
+from change_listener import ChangeListener
+from validation import PARALLEL_MIN_ROWS, SchoolValidator, create_validation_pool, validate_rows
+from school_io import (
+    FileRows, detect_file_format, file_sha256, iter_chunks, iter_csv_rows, iter_xml_rows, rows_sha256
+)
 
 # Настройка логирования
 logging.basicConfig(
@@ -41,64 +45,103 @@ app_file_handler.setFormatter(app_formatter)
 app_logger.addHandler(app_file_handler)
 app_logger.propagate = False
 
+# Время жизни кэша справочных запросов SchoolDataManager, секунды.
+CACHE_TTL_SECONDS = float(os.getenv("SCHOOL_CACHE_TTL", 300))
 
-class SchoolDataManager:
-    """Готовит данные из базы для графического интерфейса."""
+# Размер части при потоковом импорте файла в БД (строк на транзакцию).
+IMPORT_CHUNK_SIZE = int(os.getenv("SCHOOL_IMPORT_CHUNK_SIZE", 5000))
 
-    ALLOWED_SUBJECTS = [
-        "Начальные классы",
-        "Русский язык", "Русская литература", "Иностранный язык",
-        "Английский язык", "Немецкий язык", "История России",
-        "Всемирная история", "Математика", "Физика", "Химия",
-        "Биология", "География", "Информатика", "ОБЖ",
-        "Физкультура", "Музыка", "ИЗО", "Человек и мир",
-        "Обществознание", "Экономика"
-    ]
 
-    CLASS_LETTERS = {
-        1: ["А", "Б", "В"],
-        2: ["А", "Б", "В"],
-        3: ["А", "Б", "В"],
-        4: ["А", "Б", "В"],
-        5: ["А", "Б"],
-        6: ["А", "Б"],
-        7: ["А", "Б"],
-        8: ["А", "Б"],
-        9: ["А", "Б"],
-        10: ["А", "Б"],
-        11: ["А", "Б"]
+class SchoolDataManager(SchoolValidator):
+    """Готовит данные из базы для графического интерфейса.
+
+    SchoolDatabase выдаёт каждому запросу своё соединение из пула, а кэш
+    справочных запросов защищён блокировкой, поэтому методы можно вызывать
+    из рабочих потоков одновременно.
+
+    Результаты справочных запросов (списки предметов, учителей, классов,
+    количество учеников, отчёт об успеваемости) кэшируются на CACHE_TTL
+    секунд. Методы, меняющие данные, сбрасывают записи, зависящие от
+    изменённых таблиц (CACHE_DEPENDENCIES). Закэшированные списки общие
+    для всех вызывающих, изменять их нельзя.
+    """
+
+    # Время жизни записи кэша в секундах по виду запроса; 0 отключает кэш.
+    CACHE_TTL = {
+        "subjects": CACHE_TTL_SECONDS,
+        "teacher_list": CACHE_TTL_SECONDS,
+        "class_list": CACHE_TTL_SECONDS,
+        "teachers_by_subject": CACHE_TTL_SECONDS,
+        "teacher_classes": CACHE_TTL_SECONDS,
+        "student_count": CACHE_TTL_SECONDS,
+        "academic_report": CACHE_TTL_SECONDS,
     }
 
-    def __init__(self):
-        self.db = SchoolDatabase()
+    # Таблицы, от которых зависит результат запроса каждого вида.
+    CACHE_DEPENDENCIES = {
+        "subjects": ("teachers",),
+        "teacher_list": ("teachers",),
+        "class_list": ("students",),
+        "teachers_by_subject": ("teachers",),
+        "teacher_classes": ("teachers",),
+        "student_count": ("students",),
+        "academic_report": ("students", "grades"),
+    }
+
+    def __init__(self, min_connections=None, max_connections=None):
+        self.db = SchoolDatabase(min_connections, max_connections)
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._cache_generation = 0
+
+    def cached(self, key, loader):
+        """Возвращает значение из кэша по ключу (вид, *аргументы) или загружает его.
+
+        Значение, загрузка которого пересеклась со сбросом кэша, не
+        сохраняется: оно могло быть прочитано до изменения данных.
+        """
+        ttl = self.CACHE_TTL.get(key[0], 0)
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+            generation = self._cache_generation
+
+        value = loader()
+        if ttl > 0:
+            with self._cache_lock:
+                if generation == self._cache_generation:
+                    self._cache[key] = (time.monotonic() + ttl, value)
+        return value
+
+    def invalidate_cache(self, *tables):
+        """Сбрасывает записи кэша, зависящие от таблиц; без аргументов - весь кэш."""
+        with self._cache_lock:
+            self._cache_generation += 1
+            if not tables:
+                self._cache.clear()
+                return
+            stale = [key for key in self._cache
+                     if any(table in tables for table in self.CACHE_DEPENDENCIES.get(key[0], ()))]
+            for key in stale:
+                del self._cache[key]
+        app_logger.debug(f"Кэш сброшен для таблиц: {', '.join(tables)}")
 
     def is_database_empty(self):
         """Проверяет, пустая ли БД"""
         try:
-            self.db.DB_CURSOR.execute("SELECT COUNT(*) FROM students")
-            student_count = self.db.DB_CURSOR.fetchone()[0]
-
-            self.db.DB_CURSOR.execute("SELECT COUNT(*) FROM teachers")
-            teacher_count = self.db.DB_CURSOR.fetchone()[0]
-
-            self.db.DB_CURSOR.execute("SELECT COUNT(*) FROM grades")
-            grade_count = self.db.DB_CURSOR.fetchone()[0]
-
-            return student_count == 0 and teacher_count == 0 and grade_count == 0
+            return all(self.db.get_table_count(table) == 0 for table in ("students", "teachers", "grades"))
         except:
             return True
 
     def get_table_count(self, table_name):
         """Возвращает количество записей в таблице"""
-        self.db.DB_CURSOR.execute(f"SELECT COUNT(*) FROM {table_name}")
-        return self.db.DB_CURSOR.fetchone()[0]
+        return self.db.get_table_count(table_name)
 
     def build_student_index(self):
         """Создает словарь ФИО -> id для всех учеников"""
-        self.db.DB_CURSOR.execute(
-            "SELECT id, last_name, first_name, COALESCE(middle_name, '') FROM students"
-        )
-        students = self.db.DB_CURSOR.fetchall()
+        students = self.db.get_student_fio_rows()
         index = {}
         for student in students:
             student_id, last_name, first_name, middle_name = student
@@ -115,129 +158,6 @@ class SchoolDataManager:
         middle_name = parts[2] if len(parts) > 2 else ""
         return last_name, first_name, middle_name
 
-    def split_classes(self, text):
-        """Разбивает строку с классами на список."""
-        return [cls.strip() for cls in text.split(",") if cls.strip()]
-
-    def format_fio(self, last_name, first_name, middle_name):
-        return " ".join(part for part in [last_name, first_name, middle_name] if part)
-
-    def parse_and_validate_fio(self, fio):
-        """Проверяет ФИО и возвращает отдельные части."""
-        fio = fio.strip()
-        if not fio:
-            raise ValueError("Поле ФИО не может быть пустым")
-        parts = fio.split()
-        if len(parts) < 2:
-            raise ValueError("Нужно указать минимум фамилию и имя")
-        last_name = parts[0]
-        first_name = parts[1]
-        middle_name = " ".join(parts[2:]) if len(parts) > 2 else ""
-        for chunk in [last_name, first_name] + ([middle_name] if middle_name else []):
-            if not self.is_valid_name_part(chunk):
-                raise ValueError("Имя и фамилия могут содержать только буквы, пробелы и дефис")
-        return last_name, first_name, middle_name
-
-    def is_valid_name_part(self, text):
-        """Проверяет имя/фамилию на допустимые символы."""
-        pattern = r"^[А-ЯЁа-яё]+([ -][А-ЯЁа-яё]+)*$"
-        return re.match(pattern, text) is not None
-
-    def parse_birth_date(self, date_str):
-        """Преобразует строку ДД.ММ.ГГГГ в объект date."""
-        date_str = date_str.strip()
-        if not date_str:
-            raise ValueError("Укажите дату рождения в формате ДД.ММ.ГГГГ")
-        try:
-            value = datetime.datetime.strptime(date_str, "%d.%m.%Y").date()
-        except ValueError:
-            raise ValueError("Дата должна быть в формате ДД.ММ.ГГГГ")
-        if value > datetime.date.today():
-            raise ValueError("Дата рождения не может быть в будущем")
-        return value
-
-    def calculate_age(self, birth_date):
-        """Возвращает возраст на сегодняшний день."""
-        today = datetime.date.today()
-        age = today.year - birth_date.year
-        if (today.month, today.day) < (birth_date.month, birth_date.day):
-            age -= 1
-        return age
-
-    def validate_teacher_age(self, birth_date):
-        """Проверяет, подходит ли возраст для учителя."""
-        age = self.calculate_age(birth_date)
-        if age < 20:
-            raise ValueError("Учитель не может быть младше 20 лет")
-        if age > 86:
-            raise ValueError("Учитель не может быть старше 86 лет")
-
-    def validate_student_age(self, birth_date, class_name):
-        """Проверяет возраст ученика с учётом класса."""
-        age = self.calculate_age(birth_date)
-        grade = self.extract_grade(class_name)
-        
-        age_limits = {
-            1: (6, 8),
-            2: (7, 9),
-            3: (8, 10),
-            4: (9, 11),
-            5: (10, 12),
-            6: (11, 13),
-            7: (12, 14),
-            8: (13, 15),
-            9: (14, 16),
-            10: (15, 17),
-            11: (16, 18)
-        }
-        
-        if grade not in age_limits:
-            raise ValueError(f"Некорректный номер класса: {grade}")
-        
-        min_age, max_age = age_limits[grade]
-        
-        if age < min_age:
-            raise ValueError(f"Для {class_name} минимальный возраст {min_age} лет")
-        if age > max_age:
-            raise ValueError(f"Для {class_name} максимальный возраст {max_age} лет")
-
-    def extract_grade(self, class_name):
-        """Возвращает номер класса из строки вида 5А."""
-        digits = "".join(ch for ch in class_name if ch.isdigit())
-        if not digits:
-            raise ValueError("Некорректный номер класса")
-        grade = int(digits)
-        if grade not in self.CLASS_LETTERS:
-            raise ValueError("Такого класса нет в школе")
-        return grade
-
-    def validate_subject(self, subject):
-        """Проверяет, что предмет входит в список допустимых."""
-        subject = subject.strip()
-        if subject not in self.ALLOWED_SUBJECTS:
-            raise ValueError("Выберите предмет из списка")
-        return subject
-
-    def validate_teacher_classes(self, classes_str):
-        """Проверяет набор классов у учителя."""
-        if not classes_str.strip():
-            raise ValueError("Укажите хотя бы один класс")
-        classes = self.split_classes(classes_str)
-        if not classes:
-            raise ValueError("Укажите хотя бы один класс")
-        for cls in classes:
-            self.validate_class_name(cls)
-        return classes
-
-    def validate_class_name(self, class_name):
-        """Проверяет запись класса вроде 5А."""
-        class_name = class_name.strip().upper()
-        grade = self.extract_grade(class_name)
-        letter = class_name[-1]
-        if letter not in self.CLASS_LETTERS[grade]:
-            raise ValueError(f"В {grade} классе нет литеры {letter}")
-        return f"{grade}{letter}"
-
     def get_allowed_classes(self):
         """Возвращает список всех возможных классов (для ComboBox)."""
         result = []
@@ -248,23 +168,23 @@ class SchoolDataManager:
 
     def get_subject_list(self):
         try:
-            return self.db.get_subject_list()
+            return self.cached(("subjects",), self.db.get_subject_list)
         except Exception as e:
             app_logger.error(f"Ошибка получения списка предметов: {e}")
             return []
 
     def get_teacher_list(self):
         try:
-            teachers = self.db.get_teacher_fios()
-            return [self.format_fio(*teacher).strip() for teacher in teachers]
+            return self.cached(("teacher_list",), lambda: [
+                self.format_fio(*teacher).strip() for teacher in self.db.get_teacher_fios()
+            ])
         except Exception as e:
             app_logger.error(f"Ошибка получения списка учителей: {e}")
             return []
 
     def get_student_list(self):
         try:
-            rows = self.db.fetch_all_students()
-            return [self.format_fio(row[1], row[2], row[3]).strip() for row in rows]
+            return [self.format_fio(row[1], row[2], row[3]).strip() for row in self.db.iter_students()]
         except Exception as e:
             app_logger.error(f"Ошибка получения списка учеников: {e}", exc_info=True)
             return []
@@ -274,15 +194,16 @@ class SchoolDataManager:
 
     def get_class_list(self):
         try:
-            return self.db.get_class_list()
+            return self.cached(("class_list",), self.db.get_class_list)
         except Exception as e:
             app_logger.error(f"Ошибка получения списка классов: {e}")
             return []
 
     def get_teachers_by_subject(self, subject):
         try:
-            teachers = self.db.get_teachers_by_subject(subject)
-            return [self.format_fio(*teacher).strip() for teacher in teachers]
+            return self.cached(("teachers_by_subject", subject), lambda: [
+                self.format_fio(*teacher).strip() for teacher in self.db.get_teachers_by_subject(subject)
+            ])
         except Exception as e:
             app_logger.error(f"Ошибка запроса учителей по предмету: {e}", exc_info=True)
             return []
@@ -290,7 +211,10 @@ class SchoolDataManager:
     def get_teacher_classes(self, fio):
         try:
             last_name, first_name, middle_name = self.parse_fio(fio)
-            classes = self.db.get_teacher_classes_by_name(last_name, first_name, middle_name)
+            classes = self.cached(
+                ("teacher_classes", last_name, first_name, middle_name),
+                lambda: self.db.get_teacher_classes_by_name(last_name, first_name, middle_name)
+            )
             return classes if classes else []
         except Exception as e:
             logging.error(f"Ошибка получения классов учителя: {e}", exc_info=True)
@@ -301,70 +225,124 @@ class SchoolDataManager:
         try:
             if class_name:
                 class_name = class_name.strip()
-            return self.db.get_students_count(class_name if class_name else None)
+            class_name = class_name if class_name else None
+            return self.cached(("student_count", class_name),
+                               lambda: self.db.get_students_count(class_name))
         except Exception as e:
             app_logger.error(f"Ошибка получения количества учеников: {e}", exc_info=True)
             return []
 
+    def make_teacher_entry(self, row):
+        """Превращает строку таблицы teachers в запись для GUI."""
+        teacher_id, last_name, first_name, middle_name, birth_date, subject, classes = row
+        teacher = Teacher(last_name, first_name, middle_name, subject, classes or [])
+        birth_str = birth_date.strftime("%d.%m.%Y") if birth_date else ""
+        values = (teacher.full_name, birth_str, teacher.subject, ", ".join(teacher.classes))
+        return {
+            "id": teacher_id,
+            "birth_date": birth_str,
+            "values": values
+        }
+
+    def make_student_entry(self, row):
+        """Превращает строку таблицы students в запись для GUI."""
+        student_id, last_name, first_name, middle_name, birth_date, classes = row
+        student = Student(last_name, first_name, middle_name, classes or [])
+        birth_str = birth_date.strftime("%d.%m.%Y") if birth_date else ""
+        values = (student.full_name, birth_str, ", ".join(student.classes))
+        return {
+            "id": student_id,
+            "birth_date": birth_str,
+            "values": values
+        }
+
+    def make_grade_entry(self, row):
+        """Превращает строку оценки (с данными ученика) в запись для GUI."""
+        grade_id, student_id, last_name, first_name, middle_name, class_name, subject_name, grade = row
+        fio = f"{last_name} {first_name} {middle_name}".strip()
+        if class_name:
+            class_str = ", ".join(class_name) if isinstance(class_name, list) else str(class_name)
+        else:
+            class_str = ""
+        grade_obj = GradeRecord(student_id, subject_name, grade)
+        return {
+            "id": grade_id,
+            "student_id": student_id,
+            "values": grade_obj.to_display_tuple(fio, class_str)
+        }
+
+    def iter_all_teachers(self, itersize=None):
+        """Отдаёт учителей по одному через серверный курсор (постоянная память)."""
+        for row in self.db.iter_teachers(itersize):
+            yield self.make_teacher_entry(row)
+
+    def iter_all_students(self, itersize=None):
+        """Отдаёт учеников по одному через серверный курсор (постоянная память)."""
+        for row in self.db.iter_students(itersize):
+            yield self.make_student_entry(row)
+
+    def iter_all_grades(self, itersize=None):
+        """Отдаёт оценки по одной через серверный курсор (постоянная память)."""
+        for row in self.db.iter_grades_rows(itersize):
+            yield self.make_grade_entry(row)
+
+    def get_page(self, table, after=None, limit=200, sort_key="id", descending=False, search=None):
+        """Возвращает страницу записей для GUI и курсор следующей страницы.
+
+        Курсор - пара (значение сортировки, id) последней строки (для ФИО значение -
+        кортеж фамилии, имени и отчества); None, если страниц больше нет. С search в страницу попадают только найденные строки.
+        """
+        make_entry = self.entry_maker(table)
+        rows = self.db.fetch_page(table, sort_key, after, limit, descending, search)
+        entries = [make_entry(row[:-1]) for row in rows]
+        next_cursor = (rows[-1][-1], rows[-1][0]) if len(rows) == limit else None
+        return entries, next_cursor
+
+    def get_rows_by_ids(self, table, ids, column="id"):
+        """Записи для GUI по набору id; для оценок column="student_id" выбирает оценки учеников."""
+        make_entry = self.entry_maker(table)
+        return [make_entry(row) for row in self.db.fetch_rows_by_ids(table, ids, column)]
+
+    def entry_maker(self, table):
+        """Функция, превращающая строку таблицы из БД в запись для GUI."""
+        if table == "teachers":
+            return self.make_teacher_entry
+        elif table == "students":
+            return self.make_student_entry
+        else:
+            return self.make_grade_entry
+
+    def supports_server_search(self):
+        """Можно ли искать на стороне PostgreSQL (установлен pg_trgm)."""
+        try:
+            return self.db.has_trigram_search()
+        except Exception as e:
+            app_logger.error(f"Не удалось проверить наличие pg_trgm: {e}", exc_info=True)
+            return False
+
     def get_all_teachers(self):
         """Получение всех учителей в формате для GUI"""
         try:
-            rows = self.db.fetch_all_teachers()
-            teachers = []
-            for teacher_id, last_name, first_name, middle_name, birth_date, subject, classes in rows:
-                teacher = Teacher(last_name, first_name, middle_name, subject, classes or [])
-                birth_str = birth_date.strftime("%d.%m.%Y") if birth_date else ""
-                values = (teacher.full_name, birth_str, teacher.subject, ", ".join(teacher.classes))
-                teachers.append({
-                    "id": teacher_id,
-                    "birth_date": birth_str,
-                    "values": values
-                })
-            return teachers
+            return list(self.iter_all_teachers())
         except Exception as e:
             app_logger.error(f"Ошибка получения учителей: {e}", exc_info=True)
-            return []
+            raise
 
     def get_all_students(self):
         """Получение всех учеников в формате для GUI"""
         try:
-            rows = self.db.fetch_all_students()
-            result = []
-            for student_id, last_name, first_name, middle_name, birth_date, classes in rows:
-                student = Student(last_name, first_name, middle_name, classes or [])
-                birth_str = birth_date.strftime("%d.%m.%Y") if birth_date else ""
-                values = (student.full_name, birth_str, ", ".join(student.classes))
-                result.append({
-                    "id": student_id,
-                    "birth_date": birth_str,
-                    "values": values
-                })
-            return result
+            return list(self.iter_all_students())
         except Exception as e:
             app_logger.error(f"Ошибка получения учеников: {e}", exc_info=True)
-            return []
+            raise
 
     def get_all_grades(self):
         """Получение всех оценок для отображения"""
         try:
-            rows = self.db.get_all_grades_rows()
-            result = []
-            for grade_id, student_id, last_name, first_name, middle_name, class_name, subject_name, grade in rows:
-                fio = f"{last_name} {first_name} {middle_name}".strip()
-                if class_name:
-                    class_str = ", ".join(class_name) if isinstance(class_name, list) else str(class_name)
-                else:
-                    class_str = ""
-                grade_obj = GradeRecord(student_id, subject_name, grade)
-                result.append({
-                    "id": grade_id,
-                    "student_id": student_id,
-                    "values": grade_obj.to_display_tuple(fio, class_str)
-                })
-            return result
+            return list(self.iter_all_grades())
         except Exception as e:
             app_logger.error(f"Ошибка получения оценок: {e}", exc_info=True)
-            return []
+            raise
 
     def add_teacher_gui(self, fio, subject, classes_str, birth_date_str):
         """Добавляет нового учителя после всех проверок."""
@@ -394,6 +372,7 @@ class SchoolDataManager:
             last, first, middle, subj, class_list = teacher.to_db_payload()
 
             self.db.add_teacher(last, first, subj, class_list, middle, birth_date.isoformat())
+            self.invalidate_cache("teachers")
             app_logger.info(f"Учитель успешно добавлен в базу данных: {last_name} {first_name} {middle_name} - {subject}")
             return True
 
@@ -419,6 +398,7 @@ class SchoolDataManager:
             app_logger.debug("Возраст ученика успешно валидирован")
 
             self.db.add_student(last_name, first_name, [class_name], middle_name, birth_date.isoformat())
+            self.invalidate_cache("students")
             app_logger.info(f"Ученик успешно добавлен в базу данных: {last_name} {first_name} {middle_name} - {class_name}")
             return True
 
@@ -458,6 +438,7 @@ class SchoolDataManager:
                 raise ValueError("Ученик с таким ФИО не найден")
 
             self.db.add_grade(student_id, subject, grade)
+            self.invalidate_cache("grades")
             app_logger.info(f"Оценка успешно добавлена: ученик {last_name} {first_name} {middle_name}, предмет {subject}, оценка {grade}")
             return True
 
@@ -465,59 +446,234 @@ class SchoolDataManager:
             app_logger.error(f"Ошибка при добавлении оценки для ученика {fio}: {e}", exc_info=True)
             raise
 
-    def import_teachers(self, teachers_rows):
-        """Импортирует учителей из загруженного файла в базу."""
-        imported = 0
-        for row in teachers_rows:
-            if len(row) >= 4:
-                fio, birth, subject, classes_str = row[0], row[1], row[2], row[3]
-            elif len(row) == 3:
-                fio, subject, classes_str = row
-                birth = "01.01.1980"
-            else:
+    def import_teachers_bulk(self, teachers_rows, progress=None, first_row=1, seen=None, pool=None):
+        """Импортирует учителей пакетом через COPY.
+
+        Возвращает кортеж (imported, rejected), как import_grades_bulk (pool - тоже).
+        Дубликаты внутри файла и учителя, которые уже есть в базе, попадают в rejected;
+        seen - множество уже встреченных учителей, общее для частей одного файла.
+        """
+        app_logger.info(f"Начало пакетного импорта учителей: {len(teachers_rows)} строк")
+        accepted = []
+        accepted_rows = []
+        if seen is None:
+            seen = set()
+        valid, rejected = self.validate_import_rows("teachers", teachers_rows, first_row, progress, pool=pool)
+        for row_number, row, values in valid:
+            key = values[0], values[1], values[2], values[4]
+            if key in seen:
+                app_logger.warning(f"Строка {row_number} с учителем отклонена: такой учитель уже есть в файле")
+                rejected.append((row_number, row, "Такой учитель уже есть в файле"))
                 continue
-            try:
-                self.add_teacher_gui(fio, subject, classes_str, birth)
-                imported += 1
-            except Exception as exc:
-                app_logger.error(f"Ошибка импорта учителя: {exc}")
-        return imported
+            seen.add(key)
+            accepted.append(values)
+            accepted_rows.append((row_number, row))
 
-    def import_students(self, student_rows):
-        """Импортирует учеников из загруженного файла."""
+        self.report_import_progress(progress, None, len(teachers_rows))
+        ids = self.db.add_teachers_bulk(accepted)
+        self.invalidate_cache("teachers")
         imported = 0
-        for row in student_rows:
-            if len(row) >= 3:
-                fio, birth, class_str = row[0], row[1], row[2]
-            elif len(row) == 2:
-                fio, class_str = row
-                birth = "01.09.2012"
+        for teacher_id, (row_number, row) in zip(ids, accepted_rows):
+            if teacher_id is None:
+                rejected.append((row_number, row, "Такой учитель уже есть в базе"))
             else:
-                continue
-            try:
-                self.add_student_gui(fio, class_str, birth)
                 imported += 1
-            except Exception as exc:
-                app_logger.error(f"Ошибка импорта ученика: {exc}", exc_info=True)
-                
-        return imported
+        rejected.sort(key=lambda item: item[0])
+
+        app_logger.info(f"Пакетный импорт учителей завершён: добавлено {imported}, отклонено {len(rejected)}")
+        return imported, rejected
+
+    def import_students_bulk(self, student_rows, progress=None, first_row=1, source_hash=None, pool=None):
+        """Импортирует учеников пакетом через COPY.
+
+        Возвращает кортеж (imported, rejected), как import_grades_bulk (pool - тоже).
+        С source_hash строки получают ключи повторного импорта (см. import_keys).
+        """
+        app_logger.info(f"Начало пакетного импорта учеников: {len(student_rows)} строк")
+        valid, rejected = self.validate_import_rows("students", student_rows, first_row, progress, pool=pool)
+        accepted = [values for _, _, values in valid]
+
+        self.report_import_progress(progress, None, len(student_rows))
+        ids = self.db.add_students_bulk(accepted, self.import_keys(source_hash, valid))
+        self.invalidate_cache("students")
+        imported = sum(1 for student_id in ids if student_id is not None)
+        if imported < len(ids):
+            app_logger.info(f"Пропущено уже импортированных учеников: {len(ids) - imported}")
+
+        app_logger.info(f"Пакетный импорт учеников завершён: добавлено {imported}, отклонено {len(rejected)}")
+        return imported, rejected
+
+    def import_keys(self, source_hash, valid):
+        """Ключи повторного импорта (import_key) для принятых строк.
+
+        Ключ - SHA-256 источника (файла) и номер строки в нём. Повторный импорт
+        того же файла даёт те же ключи и ничего не добавляет, а одинаковые
+        строки разных файлов (одна и та же оценка в двух ведомостях) остаются
+        разными записями. Без source_hash возвращается None.
+        """
+        if source_hash is None:
+            return None
+        return [f"{source_hash}:{row_number}" for row_number, _, _ in valid]
+
+    def import_rows_chunked(self, table, rows, chunk_size=None, progress=None, total=None, job=None):
+        """Импортирует поток строк (например, iter_xml_rows) частями по chunk_size.
+
+        Каждая часть проверяется и записывается своей транзакцией через
+        import_*_bulk, поэтому в памяти одновременно только одна часть и
+        отклонённые строки. progress(done, total, message) вызывается перед
+        каждой частью; отмена прерывает импорт между частями, уже записанные
+        части остаются в базе. Возвращает (imported, rejected), как import_*_bulk.
+
+        job - задание импорта (id, хэш источника, записано строк, добавлено,
+        отклонено), см. run_import_job: строки до контрольной точки пропускаются,
+        ученики и оценки получают ключи повторного импорта по хэшу источника,
+        а контрольная точка задания фиксируется в одной транзакции с каждой частью.
+        """
+        chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+        app_logger.info(f"Начало импорта в таблицу {table} частями по {chunk_size} строк")
+        student_index = self.build_student_index() if table == "grades" else None
+        seen = set()
+        imported = 0
+        rejected = []
+        done = 0
+        source_hash = None
+        # Пул процессов создаётся при первой части, которую стоит проверять
+        # параллельно, и служит всем следующим. Небольшой импорт обходится без
+        # процессов и не передаёт им student_index.
+        pool = None
+        pool_checked = False
+
+        def chunk_pool(chunk):
+            nonlocal pool, pool_checked
+            if not pool_checked and len(chunk) >= PARALLEL_MIN_ROWS:
+                pool = create_validation_pool(student_index)
+                pool_checked = True
+            return pool
 
-    def import_grades(self, grade_rows):
-        """Импортирует оценки из загруженного файла."""
+        try:
+            if job is not None:
+                job_id, source_hash, rows_done, job_imported, job_rejected = job
+                if rows_done:
+                    app_logger.info(f"Импорт продолжается с контрольной точки: пропускается строк {rows_done}")
+                    rows = iter(rows)
+                    done = sum(1 for _ in itertools.islice(rows, rows_done))
+            for chunk in iter_chunks(rows, chunk_size):
+                if progress is not None:
+                    progress(done, total, f"Импортировано строк: {done}" + (f" из {total}" if total else ""))
+                pool = chunk_pool(chunk)
+                with self.db.transaction():
+                    if table == "teachers":
+                        count, chunk_rejected = self.import_teachers_bulk(
+                            chunk, first_row=done + 1, seen=seen, pool=pool
+                        )
+                    elif table == "students":
+                        count, chunk_rejected = self.import_students_bulk(
+                            chunk, first_row=done + 1, source_hash=source_hash, pool=pool
+                        )
+                    else:
+                        count, chunk_rejected = self.import_grades_bulk(
+                            chunk, first_row=done + 1, student_index=student_index, source_hash=source_hash,
+                            pool=pool
+                        )
+                    if job is not None:
+                        job_imported += count
+                        job_rejected += len(chunk_rejected)
+                        self.db.checkpoint_import_job(job_id, done + len(chunk), job_imported, job_rejected)
+                # Кэш мог перечитаться до фиксации части.
+                self.invalidate_cache(table)
+                imported += count
+                rejected.extend(chunk_rejected)
+                done += len(chunk)
+
+            if job is not None:
+                self.db.finish_import_job(job_id)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+        app_logger.info(f"Импорт в таблицу {table} завершён: строк {done}, добавлено {imported}, отклонено {len(rejected)}")
+        return imported, rejected
+
+    def import_file(self, table, filename, rows=None, chunk_size=None, progress=None):
+        """Импортирует файл частями как возобновляемое задание (таблица import_jobs).
+
+        Если прошлый импорт этого же файла (по SHA-256) в таблицу прервался,
+        он продолжается с последней записанной части. Ученики и оценки получают
+        ключи из хэша файла и номера строки (см. import_keys), поэтому повторный
+        импорт того же файла ничего не добавляет; повторы учителей отсекаются по
+        ФИО и предмету. rows - строки файла (по умолчанию FileRows).
+        Возвращает (imported, rejected) этого запуска, как import_rows_chunked.
+        """
+        if rows is None:
+            rows = FileRows(filename, table)
+        return self.run_import_job(table, rows, os.path.basename(filename), file_sha256(filename), chunk_size, progress)
+
+    def import_loaded_rows(self, table, rows, name, chunk_size=None, progress=None):
+        """Импортирует уже прочитанные строки файла как возобновляемое задание (см. import_file).
+
+        Задание определяется хэшем самих строк, name - имя файла для журнала заданий.
+        """
+        return self.run_import_job(table, rows, name, rows_sha256(rows), chunk_size, progress, len(rows))
+
+    def run_import_job(self, table, rows, name, source_hash, chunk_size=None, progress=None, total=None):
+        """Находит или создаёт задание импорта по хэшу источника и выполняет его через import_rows_chunked."""
+        job_id, rows_done, imported, rejected = self.db.start_import_job(table, name, source_hash)
+        app_logger.info(f"Задание импорта {job_id}: '{name}' в таблицу {table}, записано строк {rows_done}")
+        return self.import_rows_chunked(
+            table, rows, chunk_size, progress, total, job=(job_id, source_hash, rows_done, imported, rejected)
+        )
+
+    def validate_import_rows(self, table, rows, first_row=1, progress=None, student_index=None, pool=None):
+        """Проверяет строки импорта (с pool большие наборы - в пуле процессов, см. validate_rows).
+
+        Возвращает (valid, rejected): [(номер строки, строка, значения)] и
+        [(номер строки, строка, причина)] в порядке строк.
+        """
+        total = len(rows)
+        valid, rejected = validate_rows(
+            self, table, rows, first_row, student_index,
+            progress=lambda done: self.report_import_progress(progress, done, total), pool=pool
+        )
+        for row_number, _, reason in rejected:
+            app_logger.warning(f"Строка {row_number} таблицы {table} отклонена: {reason}")
+        return valid, rejected
+
+    def report_import_progress(self, progress, row_number, total, every=500):
+        """Передаёт прогресс импорта: каждые every строк проверки и перед записью (row_number=None)."""
+        if progress is None:
+            return
+        if row_number is None:
+            progress(total, total, "Запись в базу...")
+        elif row_number % every == 0 or row_number == total:
+            progress(row_number, total, f"Проверено строк: {row_number} из {total}")
+
+    def import_grades_bulk(self, grade_rows, progress=None, first_row=1, student_index=None, source_hash=None,
+                           pool=None):
+        """Импортирует оценки пакетом: один запрос на поиск учеников и одна транзакция на вставку.
+
+        Возвращает кортеж (imported, rejected), где rejected - список
+        (номер строки, строка, причина отказа). Номера строк начинаются с first_row.
+        progress(done, total, message) вызывается во время проверки строк; если он
+        бросит исключение (отмена), в базу ничего не записывается. С source_hash
+        оценки, уже записанные прошлым импортом того же файла, пропускаются (см. import_keys).
+        pool - пул процессов проверки (create_validation_pool), общий для частей импорта.
+        """
+        app_logger.info(f"Начало пакетного импорта оценок: {len(grade_rows)} строк")
+        if student_index is None:
+            student_index = self.build_student_index()
+
+        valid, rejected = self.validate_import_rows("grades", grade_rows, first_row, progress, student_index, pool)
+        accepted = [values for _, _, values in valid]
+
+        self.report_import_progress(progress, None, len(grade_rows))
         imported = 0
-        for row in grade_rows:
-            if len(row) < 3:
-                continue
-            fio, subject, grade_value = row
-            if subject.strip() == "Начальные классы":
-                continue
-            try:
-                self.add_grade_gui(fio, subject, grade_value)
-                imported += 1
-            except Exception as exc:
-                app_logger.error(f"Ошибка импорта оценки: {exc}", exc_info=True)
-                
-        return imported
+        if accepted:
+            imported = self.db.add_grades_bulk(accepted, import_keys=self.import_keys(source_hash, valid))
+            self.invalidate_cache("grades")
+        if imported < len(accepted):
+            app_logger.info(f"Пропущено уже импортированных оценок: {len(accepted) - imported}")
+
+        app_logger.info(f"Пакетный импорт оценок завершён: добавлено {imported}, отклонено {len(rejected)}")
+        return imported, rejected
 
     def update_teacher_gui(self, teacher_id, new_fio, new_subject, new_classes_str, birth_date_str):
         """Обновление учителя из GUI"""
@@ -529,6 +685,7 @@ class SchoolDataManager:
         self.db.update_teachers(
             teacher_id, last_name, first_name, subject, classes, middle_name, birth_date.isoformat()
         )
+        self.invalidate_cache("teachers")
         return True
 
     def delete_teacher_gui(self, teacher_id):
@@ -543,6 +700,7 @@ class SchoolDataManager:
                 app_logger.debug(f"Удаление учителя: {teacher_name} (ID: {teacher_id})")
 
             self.db.delete_teacher(teacher_id)
+            self.invalidate_cache("teachers")
             app_logger.info(f"Учитель успешно удален: ID {teacher_id}")
             return True
         except Exception as e:
@@ -569,6 +727,7 @@ class SchoolDataManager:
             self.db.update_students(
                 student_id, last_name, first_name, [class_name], middle_name, birth_date.isoformat()
             )
+            self.invalidate_cache("students")
             app_logger.info(f"Ученик успешно обновлен: ID {student_id}")
             return True
 
@@ -588,6 +747,8 @@ class SchoolDataManager:
                 app_logger.debug(f"Удаление ученика: {student_name} (ID: {student_id})")
 
             self.db.delete_student(student_id)
+            # Оценки ученика удаляются вместе с ним.
+            self.invalidate_cache("students", "grades")
             app_logger.info(f"Ученик успешно удален: ID {student_id}")
             return True
         except Exception as e:
@@ -643,6 +804,7 @@ class SchoolDataManager:
             else:
                 app_logger.debug("Обновление оценки без изменения ученика")
                 self.db.update_grade(grade_id, current_student_id, subject_name, grade_int)
+            self.invalidate_cache("students", "grades")
 
             app_logger.info(f"Оценка успешно обновлена: ID {grade_id}")
             return True
@@ -663,16 +825,20 @@ class SchoolDataManager:
                 app_logger.debug(f"Удаление оценки: ID {grade_id}, ученик ID {grade_info[0]}, предмет '{grade_info[1]}', оценка {grade_info[2]}")
 
             self.db.delete_grade(grade_id)
+            self.invalidate_cache("grades")
             app_logger.info(f"Оценка успешно удалена: ID {grade_id}")
             return True
         except Exception as e:
             app_logger.error(f"Ошибка удаления оценки с ID {grade_id}: {e}", exc_info=True)
             return False
 
-    def get_academic_report(self):
+    def get_academic_report(self, honor_threshold=4.5, failing_threshold=3.5, subject=None):
         """Возвращает словарь с данными по отличникам и двоечникам."""
         try:
-            return self.db.get_grades()
+            return self.cached(
+                ("academic_report", honor_threshold, failing_threshold, subject),
+                lambda: self.db.get_grades(honor_threshold, failing_threshold, subject)
+            )
         except Exception as e:
             app_logger.error(f"Ошибка получения отчета: {e}", exc_info=True)
             return {'good_students': [], 'bad_students': [], 'total_students': 0}
@@ -680,6 +846,9 @@ class SchoolDataManager:
 
 def _pretty_write_xml(root, filename):
     """Красивое сохранение XML"""
+    import xml.etree.ElementTree as ET
+    from xml.dom import minidom
+
     xml_str = minidom.parseString(ET.tostring(root)).toprettyxml(indent=" ")
     with open(filename, 'w', encoding="utf-8") as f:
         f.write(xml_str)
@@ -721,18 +890,33 @@ class NoImportFileError(Exception):
 
 
 class ReportGenerator:
-    """Создаёт PDF-отчёт на основе HTML-шаблона."""
+    """Создаёт PDF-отчёт на основе HTML-шаблона.
+
+    jinja2, xhtml2pdf и reportlab тяжёлые и нужны только для отчётов, поэтому
+    импортируются при создании генератора и первом построении PDF, а не при запуске.
+    """
+
+    fonts_registered = False
 
     def __init__(self):
+        from jinja2 import Environment, FileSystemLoader
+
         if not os.path.exists('templates'):
             os.makedirs('templates')
         self.env = Environment(loader=FileSystemLoader('templates'))
 
-    def generate_pdf_report(self, data, report_type, output_file):
-        """Генерация PDF отчета с использованием HTML шаблона"""
+    def generate_pdf_report(self, data, report_type, output_file, progress=None):
+        """Генерация PDF отчета с использованием HTML шаблона.
+
+        progress(done, total, message) вызывается перед каждым этапом; отмена
+        (исключение из progress) пробрасывается как есть.
+        """
         app_logger.info(f"Начало генерации PDF отчета: тип '{report_type}', файл '{output_file}', записей: {len(data)}")
+        if progress is None:
+            progress = lambda done, total, message: None
 
         try:
+            progress(0, 3, "Загрузка шаблона...")
             template = self.env.get_template('report_template_pdf.html')
             app_logger.debug("HTML шаблон успешно загружен")
 
@@ -747,6 +931,7 @@ class ReportGenerator:
             font_path = os.path.abspath("fonts").replace("\\", "/")
             app_logger.debug(f"Путь к шрифтам: {font_path}")
 
+            progress(1, 3, "Формирование HTML...")
             html_content = template.render(
                 report_type=report_type,
                 generation_date=datetime.datetime.now().strftime('%d.%m.%Y %H:%M'),
@@ -757,29 +942,45 @@ class ReportGenerator:
             )
             app_logger.debug("HTML контент успешно сгенерирован")
 
+            progress(2, 3, "Создание PDF...")
             return self.generate_pdf_from_html_template(html_content, output_file)
 
+        except OperationCancelled:
+            raise
         except Exception as e:
             app_logger.error(f"Ошибка при генерации PDF отчета '{report_type}': {str(e)}", exc_info=True)
             raise FileOperationError(f"Ошибка при генерации PDF отчета: {str(e)}")
 
+    def register_fonts(self):
+        """Регистрирует шрифты DejaVu для кириллицы (один раз за запуск)."""
+        if ReportGenerator.fonts_registered:
+            return
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        from xhtml2pdf.default import DEFAULT_FONT
+
+        font_folder = os.path.abspath("fonts")
+        app_logger.debug(f"Регистрация шрифтов из папки: {font_folder}")
+
+        pdfmetrics.registerFont(TTFont("DejaVuSans", os.path.join(font_folder, "DejaVuSans.ttf")))
+        pdfmetrics.registerFont(TTFont("DejaVuSans-Bold", os.path.join(font_folder, "DejaVuSans-Bold.ttf")))
+        app_logger.debug("Шрифты успешно зарегистрированы")
+
+        DEFAULT_FONT["helvetica"] = "DejaVuSans"
+        DEFAULT_FONT["Helvetica"] = "DejaVuSans"
+        DEFAULT_FONT["helvetica-bold"] = "DejaVuSans-Bold"
+        DEFAULT_FONT["Helvetica-Bold"] = "DejaVuSans-Bold"
+        app_logger.debug("Настройки шрифтов по умолчанию обновлены")
+        ReportGenerator.fonts_registered = True
+
     def generate_pdf_from_html_template(self, html_content, output_file):
         """Создание PDF из HTML контента"""
         app_logger.debug(f"Начало создания PDF файла: '{output_file}'")
 
         try:
-            font_folder = os.path.abspath("fonts")
-            app_logger.debug(f"Регистрация шрифтов из папки: {font_folder}")
-
-            pdfmetrics.registerFont(TTFont("DejaVuSans", os.path.join(font_folder, "DejaVuSans.ttf")))
-            pdfmetrics.registerFont(TTFont("DejaVuSans-Bold", os.path.join(font_folder, "DejaVuSans-Bold.ttf")))
-            app_logger.debug("Шрифты успешно зарегистрированы")
+            from xhtml2pdf import pisa
 
-            DEFAULT_FONT["helvetica"] = "DejaVuSans"
-            DEFAULT_FONT["Helvetica"] = "DejaVuSans"
-            DEFAULT_FONT["helvetica-bold"] = "DejaVuSans-Bold"
-            DEFAULT_FONT["Helvetica-Bold"] = "DejaVuSans-Bold"
-            app_logger.debug("Настройки шрифтов по умолчанию обновлены")
+            self.register_fonts()
 
             with open(output_file, "wb") as output_file_obj:
                 app_logger.debug("Создание PDF с помощью pisa")
@@ -804,12 +1005,31 @@ class ReportGenerator:
 class SchoolApp:
     """Главное окно приложения: таблицы, кнопки и вся логика GUI."""
 
-    def __init__(self, root):
+    PAGE_SIZE = 200
+
+    # Ключи сортировки fetch_page для колонок таблиц; None - колонку сортирует приложение.
+    DB_SORT_KEYS = {
+        "teachers": ("fio", "birth_date", "subject", None),
+        "students": ("fio", "birth_date", "class"),
+        "grades": ("fio", "subject", "grade", "class"),
+    }
+
+    # Колонки, по которым ищет триграммный индекс, - те же, что у поиска в PostgreSQL
+    # (PAGE_QUERIES[...]["search"]): ФИО, предмет и классы, без дат рождения и оценок.
+    SEARCH_COLUMNS = {
+        "teachers": (0, 2, 3),
+        "students": (0, 2),
+        "grades": (0, 1, 3),
+    }
+
+    def __init__(self, root, paged=None, virtual=None, server_search=None, sort_pushdown=None,
+                 live_updates=None):
         self.logger = app_logger
         """Создаёт окно, настраивает виджеты и загружает данные."""
         app_logger.info("Запуск приложения SchoolApp.")
         app_logger.debug("Инициализация основных атрибутов приложения")
 
+        self.started_at = time.perf_counter()
         self.root = root
         self.root.title("Школьная база данных")
         self.root.configure(bg='#f0f0f0')
@@ -821,10 +1041,78 @@ class SchoolApp:
             "students": "database",
             "grades": "database",
         }
+        self.sort_option_maps = {}
+        self.sort_state = {"teachers": {}, "students": {}, "grades": {}}
+        self.sort_specs = {"teachers": (), "students": (), "grades": ()}
+        self.loaded_import_data = {}
+        self.info_window = None
+
+        # Постраничный режим: таблицы из БД подгружаются страницами по мере прокрутки.
+        if paged is None:
+            paged = os.getenv("SCHOOL_APP_PAGED", "0") == "1"
+        self.paged = paged
+        self.page_state = {
+            table: {
+                "cursor": None, "sort_key": "fio", "descending": False, "pending": False,
+                "search": None, "search_cursor": None,
+            }
+            for table in ("teachers", "students", "grades")
+        }
+
+        # Виртуальный режим: в Treeview живут только видимые строки, остальные - в списке.
+        if virtual is None:
+            virtual = os.getenv("SCHOOL_APP_VIRTUAL", "0") == "1"
+        self.virtual = virtual
+
+        # Триграммные индексы для поиска; обновляются вместе с кэшем строк таблиц.
+        self.search_indexes = {
+            table: TrigramIndex(columns=self.SEARCH_COLUMNS[table]) for table in ("teachers", "students", "grades")
+        }
+        self.sort_indexes = {
+            table: SortIndex(table, self.row_iid) for table in ("teachers", "students", "grades")
+        }
+
+        # В постраничном режиме сортировка по колонке перезапрашивает данные с ORDER BY.
+        if sort_pushdown is None:
+            sort_pushdown = os.getenv("SCHOOL_APP_SORT_PUSHDOWN", "1") == "1"
+        self.sort_pushdown = sort_pushdown
+
+        # Поиск при вводе: с задержкой, в фоновом потоке, показывается только последний запрос.
+        self.search_scheduler = SearchScheduler(root)
+        self.search_request = None
+
+        # Долгие операции с БД и файлами выполняются в пуле, результаты приходят через root.after.
+        self.executor = TaskExecutor(root)
+        self.refresh_generations = {"teachers": 0, "students": 0, "grades": 0}
+
+        # Таблица читается из БД, когда её впервые показывают; остальные
+        # подгружаются в фоне после того, как первая стала доступна (SCHOOL_APP_PREFETCH).
+        self.loaded_tables = set()
+        self.table_load_started = {}
+        self.prefetch = os.getenv("SCHOOL_APP_PREFETCH", "1") == "1"
+        self.interactive = False
 
         app_logger.debug("Инициализация менеджера данных")
         self.data_manager = SchoolDataManager()
 
+        # Поиск в БД нужен в постраничном режиме: в памяти там только прокрученные страницы.
+        if server_search is None:
+            server_search = os.getenv("SCHOOL_APP_SERVER_SEARCH", "1") == "1"
+        self.server_search = server_search and self.paged and self.data_manager.supports_server_search()
+        if server_search and self.paged and not self.server_search:
+            app_logger.info("pg_trgm недоступен, поиск выполняется по загруженным строкам")
+
+        # Изменения, сделанные другими клиентами, приходят через LISTEN/NOTIFY.
+        self.change_listener = None
+        if live_updates is None:
+            live_updates = os.getenv("SCHOOL_APP_LIVE_UPDATES", "1") == "1"
+        if live_updates:
+            db = self.data_manager.db
+            self.change_listener = ChangeListener(
+                root, db.listen_connection, self.on_remote_changes, db.is_own_backend
+            )
+            self.change_listener.start()
+
         app_logger.debug("Настройка стилей интерфейса")
         style = ttk.Style()
 
@@ -850,17 +1138,24 @@ class SchoolApp:
         app_logger.debug("Создание таблицы оценок")
         self.create_grades_table()
 
+
         app_logger.debug("Отображение таблицы учителей по умолчанию")
         self.show_table("teachers")
 
         app_logger.info("Приложение SchoolApp успешно инициализировано")
 
+    def make_treeview(self, master, columns):
+        """Создаёт Treeview для таблицы: обычный или виртуальный, в зависимости от режима."""
+        if self.virtual:
+            return VirtualTreeview(master, columns, show="headings")
+        return ttk.Treeview(master, columns=columns, show="headings")
+
     def create_teachers_table(self):
         """Создаёт таблицу учителей и заполняет её."""
         self.teachers_frame = tk.Frame(self.table_frame, bg='#f0f0f0')
 
         columns = ("ФИО", "Дата рождения", "Предмет", "Классы")
-        self.teachers_tree = ttk.Treeview(self.teachers_frame, columns=columns, show="headings")
+        self.teachers_tree = self.make_treeview(self.teachers_frame, columns)
 
         for col in columns:
             self.teachers_tree.heading(col, text=col,
@@ -870,17 +1165,17 @@ class SchoolApp:
             else:
                 self.teachers_tree.column(col, width=180)
 
-        self.teachers_data = self.data_manager.get_all_teachers()
-
-        for teacher in self.teachers_data:
-            self.teachers_tree.insert("", "end", iid=str(teacher["id"]), values=teacher["values"])
+        # Строки загружаются в фоне при первом показе таблицы (ensure_table_loaded).
+        self.teachers_data = []
 
         scrollbar = ttk.Scrollbar(self.teachers_frame, orient="vertical", command=self.teachers_tree.yview)
-        self.teachers_tree.configure(yscrollcommand=scrollbar.set)
+        self.teachers_tree.configure(
+            yscrollcommand=lambda first, last: self.on_tree_scroll("teachers", scrollbar, first, last))
+        self.teachers_tree.bind("<Shift-Button-1>", lambda e: self.on_heading_shift_click("teachers", e))
         scrollbar.pack(side="right", fill="y")
         self.teachers_tree.pack(side="left", fill="both", expand=True)
 
-        self.original_teachers_data = [row.copy() for row in self.teachers_data]
+        self.set_table_data("teachers", self.teachers_data)
         self.teacher_sort_map = {
             "ФИО (А-Я)": (0, False),
             "ФИО (Я-А)": (0, True),
@@ -890,6 +1185,7 @@ class SchoolApp:
             "Предмет (Я-А)": (2, True),
             "Классы (А-Я)": (3, False),
             "Классы (Я-А)": (3, True),
+            "Предмет, затем ФИО": ((2, False), (0, False)),
         }
         self.teachers_sort_options = list(self.teacher_sort_map.keys())
         self.sort_option_maps["teachers"] = self.teacher_sort_map
@@ -900,7 +1196,7 @@ class SchoolApp:
         self.students_frame = tk.Frame(self.table_frame, bg='#f0f0f0')
 
         columns = ("ФИО", "Дата рождения", "Класс")
-        self.students_tree = ttk.Treeview(self.students_frame, columns=columns, show="headings")
+        self.students_tree = self.make_treeview(self.students_frame, columns)
 
         for col in columns:
             self.students_tree.heading(col, text=col,
@@ -910,17 +1206,17 @@ class SchoolApp:
             else:
                 self.students_tree.column(col, width=260)
 
-        self.students_data = self.data_manager.get_all_students()
-
-        for student in self.students_data:
-            self.students_tree.insert("", "end", iid=str(student["id"]), values=student["values"])
+        # Строки загружаются в фоне при первом показе таблицы (ensure_table_loaded).
+        self.students_data = []
 
         scrollbar = ttk.Scrollbar(self.students_frame, orient="vertical", command=self.students_tree.yview)
-        self.students_tree.configure(yscrollcommand=scrollbar.set)
+        self.students_tree.configure(
+            yscrollcommand=lambda first, last: self.on_tree_scroll("students", scrollbar, first, last))
+        self.students_tree.bind("<Shift-Button-1>", lambda e: self.on_heading_shift_click("students", e))
         scrollbar.pack(side="right", fill="y")
         self.students_tree.pack(side="left", fill="both", expand=True)
 
-        self.original_students_data = [row.copy() for row in self.students_data]
+        self.set_table_data("students", self.students_data)
         self.student_sort_map = {
             "ФИО (А-Я)": (0, False),
             "ФИО (Я-А)": (0, True),
@@ -928,6 +1224,7 @@ class SchoolApp:
             "Дата рождения (младшие первыми)": (1, True),
             "Класс (от меньшего к большему)": (2, False),
             "Класс (от большего к меньшему)": (2, True),
+            "Класс, затем ФИО": ((2, False), (0, False)),
         }
         self.students_sort_options = list(self.student_sort_map.keys())
         self.sort_option_maps["students"] = self.student_sort_map
@@ -938,7 +1235,7 @@ class SchoolApp:
         self.grades_frame = tk.Frame(self.table_frame, bg='#f0f0f0')
 
         columns = ("ФИО", "Предмет", "Оценка", "Класс")
-        self.grades_tree = ttk.Treeview(self.grades_frame, columns=columns, show="headings")
+        self.grades_tree = self.make_treeview(self.grades_frame, columns)
 
         for col in columns:
             self.grades_tree.heading(col, text=col,
@@ -948,17 +1245,17 @@ class SchoolApp:
             else:
                 self.grades_tree.column(col, width=200)
 
-        self.grades_data = self.data_manager.get_all_grades()
-
-        for grade in self.grades_data:
-            self.grades_tree.insert("", "end", iid=str(grade["id"]), values=grade["values"])
+        # Строки загружаются в фоне при первом показе таблицы (ensure_table_loaded).
+        self.grades_data = []
 
         scrollbar = ttk.Scrollbar(self.grades_frame, orient="vertical", command=self.grades_tree.yview)
-        self.grades_tree.configure(yscrollcommand=scrollbar.set)
+        self.grades_tree.configure(
+            yscrollcommand=lambda first, last: self.on_tree_scroll("grades", scrollbar, first, last))
+        self.grades_tree.bind("<Shift-Button-1>", lambda e: self.on_heading_shift_click("grades", e))
         scrollbar.pack(side="right", fill="y")
         self.grades_tree.pack(side="left", fill="both", expand=True)
 
-        self.original_grades_data = [row.copy() for row in self.grades_data]
+        self.set_table_data("grades", self.grades_data)
         self.grade_sort_map = {
             "ФИО (А-Я)": (0, False),
             "ФИО (Я-А)": (0, True),
@@ -968,6 +1265,8 @@ class SchoolApp:
             "Оценка (от большей к меньшей)": (2, True),
             "Класс (А-Я)": (3, False),
             "Класс (Я-А)": (3, True),
+            "Класс, затем ФИО": ((3, False), (0, False)),
+            "Предмет, затем оценка (от большей)": ((1, False), (2, True)),
         }
         self.grades_sort_options = list(self.grade_sort_map.keys())
         self.sort_option_maps["grades"] = self.grade_sort_map
@@ -1024,6 +1323,7 @@ class SchoolApp:
             "Создать файл",
             "Добавить запись",
             "Импорт в БД",
+            "Импорт файла в БД",
             "Редактировать",
             "Удалить"
         ]
@@ -1036,6 +1336,7 @@ class SchoolApp:
             "Создать файл": "new_file.png",
             "Добавить запись": "new_line_inage.png",
             "Импорт в БД": "db_import.png",
+            "Импорт файла в БД": "db_import.png",
             "Редактировать": "edit_icon.png",
             "Удалить": "delete_icon.png"
         }
@@ -1051,6 +1352,8 @@ class SchoolApp:
                 click_handler = self.on_add_click
             elif text == "Импорт в БД":
                 click_handler = self.on_import_to_db_click
+            elif text == "Импорт файла в БД":
+                click_handler = self.on_stream_import_click
             elif text == "Редактировать":
                 click_handler = self.on_edit_click
             elif text == "Удалить":
@@ -1093,15 +1396,7 @@ class SchoolApp:
 
     def detect_file_format(self, filename):
         """Определяет формат файла по расширению."""
-        _, ext = os.path.splitext(filename)
-        ext = ext.lower()
-
-        if ext == '.xml':
-            return 'xml'
-        elif ext == '.csv' or ext == '.txt':
-            return 'csv'
-        else:
-            return None
+        return detect_file_format(filename)
 
     def save_to_file(self, filename):
         """Сохраняет данные текущей таблицы в файл."""
@@ -1126,6 +1421,8 @@ class SchoolApp:
 
     def save_to_csv(self, filename):
         """Сохраняет данные текущей таблицы в CSV."""
+        import csv
+
         try:
             with open(filename, 'w', newline='', encoding='utf-8') as file:
                 writer = csv.writer(file)
@@ -1149,6 +1446,8 @@ class SchoolApp:
 
     def save_to_xml(self, filename):
         """Сохраняет данные текущей таблицы в XML."""
+        import xml.etree.ElementTree as ET
+
         try:
             root = ET.Element("school_data")
 
@@ -1214,86 +1513,25 @@ class SchoolApp:
     def load_from_csv(self, filename):
         """Загружает CSV в текущую таблицу."""
         try:
-            with open(filename, 'r', encoding='utf-8') as file:
-                reader = csv.reader(file)
-                header = next(reader, None)
-                rows = [row for row in reader]
-
-                self.apply_loaded_rows(rows)
+            rows = list(iter_csv_rows(filename, self.current_table))
+            self.set_table_data_from_rows(self.current_table, rows)
             return True
         except Exception as e:
             raise FileOperationError(f"Ошибка при загрузке CSV файла: {str(e)}")
 
     def load_from_xml(self, filename):
-        """Загружает XML в текущую таблицу."""
-        try:
-            tree_xml = ET.parse(filename)
-            root = tree_xml.getroot()
-
-            if self.current_table == "teachers":
-                teachers_element = root.find("teachers")
-                rows = [
-                    (
-                        teacher_element.get("fio", ""),
-                        teacher_element.get("birth_date", ""),
-                        teacher_element.get("subject", ""),
-                        teacher_element.get("classes", "")
-                    )
-                    for teacher_element in teachers_element.findall("teacher")
-                ] if teachers_element is not None else []
-                self.apply_loaded_rows(rows)
-            elif self.current_table == "students":
-                students_element = root.find("students")
-                rows = [
-                    (
-                        student_element.get("fio", ""),
-                        student_element.get("birth_date", ""),
-                        student_element.get("class", "")
-                    )
-                    for student_element in students_element.findall("student")
-                ] if students_element is not None else []
-                self.apply_loaded_rows(rows)
-            else:
-                grades_element = root.find("grades")
-                rows = [
-                    (grade_element.get("fio", ""), grade_element.get("subject", ""), 
-                     grade_element.get("value", ""), grade_element.get("class", ""))
-                    for grade_element in grades_element.findall("grade")
-                ] if grades_element is not None else []
-                self.apply_loaded_rows(rows)
+        """Загружает XML в текущую таблицу.
 
+        Файл читается потоково (iterparse), строки сразу приводятся к колонкам
+        таблицы: дерево документа и промежуточные копии строк не строятся.
+        """
+        try:
+            rows = list(iter_xml_rows(filename, self.current_table))
+            self.set_table_data_from_rows(self.current_table, rows)
             return True
         except Exception as e:
             raise XMLProcessingError(f"Ошибка при загрузке XML файла: {str(e)}")
 
-    def apply_loaded_rows(self, rows):
-        """Применяет загруженные строки к текущей таблице."""
-        normalized = []
-
-        if self.current_table == "teachers":
-            for row in rows:
-                if len(row) >= 4:
-                    normalized.append((row[0], row[1], row[2], row[3]))
-                elif len(row) == 3:
-                    normalized.append((row[0], "", row[1], row[2]))
-            self.set_table_data_from_rows("teachers", normalized)
-
-        elif self.current_table == "students":
-            for row in rows:
-                if len(row) >= 3:
-                    normalized.append((row[0], row[1], row[2]))
-                elif len(row) == 2:
-                    normalized.append((row[0], "", row[1]))
-            self.set_table_data_from_rows("students", normalized)
-
-        else:
-            for row in rows:
-                if len(row) >= 4:
-                    normalized.append((row[0], row[1], row[2], row[3]))
-                elif len(row) >= 3:
-                    normalized.append((row[0], row[1], row[2], ""))
-            self.set_table_data_from_rows("grades", normalized)
-
     def set_table_data_from_rows(self, table, rows):
         """Обновляет Treeview списком строк."""
         data_entries = []
@@ -1304,40 +1542,134 @@ class SchoolApp:
             data_entries.append(entry)
 
         if table == "teachers":
-            self.teachers_data = data_entries
-            self.original_teachers_data = [row.copy() for row in data_entries]
+            self.set_table_data("teachers", data_entries)
             self.data_source["teachers"] = "file"
             self.loaded_import_data["teachers"] = rows
             self.populate_tree(self.teachers_tree, self.teachers_data)
         elif table == "students":
-            self.students_data = data_entries
-            self.original_students_data = [row.copy() for row in data_entries]
+            self.set_table_data("students", data_entries)
             self.data_source["students"] = "file"
             self.loaded_import_data["students"] = rows
             self.populate_tree(self.students_tree, self.students_data)
         else:
-            self.grades_data = data_entries
-            self.original_grades_data = [row.copy() for row in data_entries]
+            self.set_table_data("grades", data_entries)
             self.data_source["grades"] = "file"
             self.loaded_import_data["grades"] = rows
-            self.populate_tree(self.grades_tree, self.grades_data)
+            self.populate_tree(self.grades_tree, data_entries)
 
     def on_import_to_db_click(self, _):
-        """Импортирует загруженные данные в БД"""
+        """Импортирует загруженные данные в БД в фоне, с прогрессом и возможностью отмены."""
         try:
-            imported = self.import_loaded_data_to_db()
-            messagebox.showinfo("Импорт в БД", f"Импортировано записей: {imported}")
+            table, rows = self.get_rows_for_import()
         except NoImportFileError as e:
             app_logger.warning(f"Попытка импорта без выбранного файла: {e}")
             messagebox.showwarning("Импорт в БД", str(e))
-        except Exception as e:
-            app_logger.error(f"Ошибка импорта в БД: {e}", exc_info=True)
-            messagebox.showerror("Импорт в БД", f"Ошибка импорта: {str(e)}")
+            return
 
-    def import_loaded_data_to_db(self):
+        dialog = ProgressDialog(self.root, "Импорт в БД")
+
+        def on_done(result):
+            dialog.close()
+            imported, rejected = self.finish_import(table, result)
+            self.show_import_summary("Импорт в БД", imported, rejected)
+
+        def on_error(exc):
+            dialog.close()
+            if isinstance(exc, OperationCancelled):
+                app_logger.info(f"Импорт в таблицу {table} отменён")
+                self.refresh_data(table, full=True)
+                messagebox.showinfo(
+                    "Импорт в БД",
+                    "Импорт отменён, уже записанные части остались в базе.\n"
+                    "Повторный импорт этих данных продолжится с места остановки."
+                )
+                return
+            app_logger.error(f"Ошибка импорта в БД: {exc}", exc_info=exc)
+            self.refresh_data(table, full=True)
+            messagebox.showerror("Импорт в БД", f"Ошибка импорта: {str(exc)}")
+
+        task = self.executor.submit(
+            self.run_import, table, rows, os.path.basename(self.current_file), name=f"Импорт в таблицу {table}",
+            on_done=on_done, on_error=on_error, on_progress=dialog.update, pass_task=True,
+        )
+        dialog.on_cancel = task.cancel
+
+    def on_stream_import_click(self, _):
+        """Импортирует CSV/XML-файл прямо в БД частями, не выводя строки в таблицу.
+
+        Файл читается потоково и пишется в текущую таблицу частями по
+        IMPORT_CHUNK_SIZE строк, поэтому память не зависит от размера файла.
+        Полоса прогресса показывает прочитанную долю файла. Прерванный импорт
+        того же файла продолжается с последней записанной части (см. import_file).
+        """
         table = self.current_table
-        app_logger.info(f"Начало импорта данных в таблицу {table}")
+        file_path = filedialog.askopenfilename(
+            title="Выберите файл для импорта в БД",
+            filetypes=[
+                ("CSV файлы", "*.csv"),
+                ("XML файлы", "*.xml"),
+                ("Текстовые файлы", "*.txt"),
+                ("Все файлы", "*.*")
+            ]
+        )
+        if not file_path:
+            app_logger.warning("Файл для потокового импорта не выбран")
+            return
 
+        dialog = ProgressDialog(self.root, "Импорт файла в БД")
+
+        def on_done(result):
+            dialog.close()
+            imported, rejected = self.finish_import(table, result)
+            self.show_import_summary("Импорт файла в БД", imported, rejected)
+
+        def on_error(exc):
+            dialog.close()
+            if isinstance(exc, OperationCancelled):
+                app_logger.info(f"Потоковый импорт в таблицу {table} отменён")
+                # Части, записанные до отмены, уже в базе.
+                self.refresh_data(table, full=True)
+                messagebox.showinfo(
+                    "Импорт файла в БД",
+                    "Импорт отменён, уже записанные части остались в базе.\n"
+                    "Повторный импорт этого файла продолжится с места остановки."
+                )
+                return
+            app_logger.error(f"Ошибка потокового импорта в БД: {exc}", exc_info=exc)
+            self.refresh_data(table, full=True)
+            messagebox.showerror("Импорт файла в БД", f"Ошибка импорта: {str(exc)}")
+
+        task = self.executor.submit(
+            self.run_stream_import, table, file_path, name=f"Импорт файла в таблицу {table}",
+            on_done=on_done, on_error=on_error, on_progress=dialog.update, pass_task=True,
+        )
+        dialog.on_cancel = task.cancel
+
+    def run_stream_import(self, task, table, filename):
+        """Потоковый импорт файла в таблицу; выполняется в рабочем потоке."""
+        app_logger.info(f"Начало потокового импорта файла '{filename}' в таблицу {table}")
+        rows = FileRows(filename, table)
+
+        def progress(done, total, message):
+            task.progress(rows.position(), rows.size, f"Обработано строк: {done}")
+
+        task.progress(0, None, "Вычисление контрольной суммы файла...")
+        return self.data_manager.import_file(table, filename, rows, progress=progress)
+
+    def show_import_summary(self, title, imported, rejected, examples=5):
+        """Сообщает итог импорта: сколько строк принято, сколько отклонено и почему (первые examples)."""
+        message = f"Импортировано записей: {imported}"
+        if rejected:
+            message += f"\nОтклонено строк: {len(rejected)}"
+            for row_number, _, reason in rejected[:examples]:
+                message += f"\n  строка {row_number}: {reason}"
+            if len(rejected) > examples:
+                message += "\n  ... (подробности в журнале)"
+        messagebox.showinfo(title, message)
+
+    def get_rows_for_import(self):
+        """Возвращает (таблица, строки файла) для импорта или бросает NoImportFileError."""
+        table = self.current_table
         if not self.current_file:
             app_logger.warning(f"Попытка импорта в таблицу {table} без выбранного файла")
             raise NoImportFileError("Сначала выберите файл для загрузки.")
@@ -1346,20 +1678,20 @@ class SchoolApp:
         if not rows:
             app_logger.warning(f"Попытка импорта в таблицу {table} без загруженных данных")
             raise NoImportFileError("Сначала загрузите файл для текущей таблицы.")
+        return table, rows
 
+    def run_import(self, task, table, rows, name):
+        """Импорт загруженных строк в таблицу частями с контрольными точками; выполняется в рабочем потоке."""
+        app_logger.info(f"Начало импорта данных в таблицу {table}")
         app_logger.debug(f"Найдено {len(rows)} строк для импорта в таблицу {table}")
+        return self.data_manager.import_loaded_rows(table, rows, name, progress=task.progress)
 
-        if table == "teachers":
-            imported = self.data_manager.import_teachers(rows)
-        elif table == "students":
-            imported = self.data_manager.import_students(rows)
-        else:
-            imported = self.data_manager.import_grades(rows)
-
-        self.refresh_data(table)
-        self.data_source[table] = "database"
+    def finish_import(self, table, result):
+        """После импорта перечитывает таблицу из БД и возвращает (imported, rejected)."""
+        imported, rejected = result
+        self.refresh_data(table, full=True)
         app_logger.info(f"Успешно импортировано {imported} записей в таблицу {table}")
-        return imported
+        return imported, rejected
 
     def on_add_click(self, _):
         """Открывает окно добавления новой записи."""
@@ -1588,24 +1920,18 @@ class SchoolApp:
 
             if self.current_table == "teachers":
                 tree = self.teachers_tree
-                for item in tree.get_children():
-                    tree.delete(item)
-                self.teachers_data = []
-                self.original_teachers_data = []
+                tree.delete(*tree.get_children())
+                self.set_table_data("teachers", [])
                 self.data_source["teachers"] = "file"
             elif self.current_table == "students":
                 tree = self.students_tree
-                for item in tree.get_children():
-                    tree.delete(item)
-                self.students_data = []
-                self.original_students_data = []
+                tree.delete(*tree.get_children())
+                self.set_table_data("students", [])
                 self.data_source["students"] = "file"
             else:
                 tree = self.grades_tree
-                for item in tree.get_children():
-                    tree.delete(item)
-                self.grades_data = []
-                self.original_grades_data = []
+                tree.delete(*tree.get_children())
+                self.set_table_data("grades", [])
                 self.data_source["grades"] = "file"
 
             self.save_to_file(file_path)
@@ -1743,25 +2069,327 @@ class SchoolApp:
         else:
             combo['values'] = full_list
 
-    def refresh_data(self, table_type=None):
-        """Обновляет данные из базы для указанной таблицы."""
+    def refresh_data(self, table_type=None, full=False):
+        """Обновляет данные из базы для указанной таблицы.
+
+        Строки читаются в пуле потоков, окно при этом не блокируется. Если
+        таблица уже показывает данные из БД, в Treeview переносится только
+        разница с новыми строками по id, а не полная перерисовка. Результат
+        устаревшего обновления (когда следом запущено новое) отбрасывается.
+        """
         table = table_type or self.current_table
+        full = full or self.paged or self.data_source[table] != "database"
+        if table not in self.loaded_tables:
+            self.table_load_started.setdefault(table, time.perf_counter())
+        state = self.page_state[table]
+        # До прихода новых строк старый курсор страниц недействителен.
+        state["cursor"] = None
+        self.refresh_generations[table] += 1
+        generation = self.refresh_generations[table]
+
+        return self.executor.submit(
+            self.read_table_rows, table, state["sort_key"], state["descending"],
+            name=f"Загрузка таблицы {table}",
+            on_done=lambda result: self.apply_refreshed_rows(table, generation, full, result),
+            on_error=lambda exc: self.on_refresh_error(table, generation, exc),
+        )
+
+    def on_refresh_error(self, table, generation, exc):
+        """Ошибка загрузки таблицы: при следующем показе таблица будет запрошена снова."""
+        if generation == self.refresh_generations[table] and table not in self.loaded_tables:
+            self.table_load_started.pop(table, None)
+        self.on_task_error("Загрузка данных", exc)
+
+    def apply_refreshed_rows(self, table, generation, full, result):
+        """Показывает строки, прочитанные refresh_data (в главном потоке)."""
+        if generation != self.refresh_generations[table]:
+            return
+        new_rows, cursor = result
+        self.page_state[table]["cursor"] = cursor
+        if table not in self.loaded_tables:
+            self.on_table_loaded(table)
+
+        if full:
+            self.set_table_data(table, new_rows)
+            self.data_source[table] = "database"
+            self.populate_tree(self.get_tree(table), new_rows)
+            search_term = self.page_state[table]["search"]
+            if search_term and table == self.current_table:
+                self.perform_search(search_term)
+            return
+
+        self.apply_rows_diff(table, new_rows)
+
+    def on_remote_changes(self, changes):
+        """Применяет изменения других клиентов (из ChangeListener) к загруженным таблицам.
+
+        changes - {таблица: множество id или None}. Для известных id из БД
+        читаются только эти строки; None означает полное обновление через
+        refresh_data. Оценки показывают ФИО и класс ученика, поэтому при
+        изменении учеников перечитываются и их оценки.
+        """
+        app_logger.debug(f"Изменения от других клиентов: {changes}")
+        self.data_manager.invalidate_cache(*changes)
+
+        updates = []
+        for table, ids in changes.items():
+            updates.append((table, ids, "id"))
+            if table == "students":
+                updates.append(("grades", ids, "student_id"))
+
+        for table, ids, column in updates:
+            if table not in self.loaded_tables or self.data_source[table] != "database":
+                continue
+            if ids is None:
+                self.refresh_data(table)
+                continue
+            generation = self.refresh_generations[table]
+            self.executor.submit(
+                self.data_manager.get_rows_by_ids, table, ids, column,
+                name=f"Обновление строк таблицы {table}",
+                on_done=lambda rows, table=table, ids=ids, column=column, generation=generation:
+                    self.apply_remote_rows(table, ids, column, generation, rows),
+                on_error=lambda exc: app_logger.error(f"Ошибка чтения изменённых строк: {exc}", exc_info=exc),
+            )
 
+    def apply_remote_rows(self, table, ids, column, generation, rows):
+        """Показывает строки, перечитанные on_remote_changes (в главном потоке)."""
+        # Запущенное позже полное обновление уже содержит эти изменения.
+        if generation != self.refresh_generations[table]:
+            return
+        self.apply_rows_delta(table, ids, rows, column)
+
+    def on_task_error(self, title, exc):
+        """Показывает ошибку фоновой задачи; отмену пользователем только записывает в журнал."""
+        if isinstance(exc, OperationCancelled):
+            app_logger.info(str(exc))
+            return
+        app_logger.error(f"{title}: {exc}", exc_info=exc)
+        messagebox.showerror(title, f"Произошла ошибка: {exc}")
+
+    def get_table_data(self, table):
+        """Возвращает кэш строк таблицы (список словарей с id и values)."""
         if table == "teachers":
-            self.teachers_data = self.data_manager.get_all_teachers()
-            self.original_teachers_data = [row.copy() for row in self.teachers_data]
-            self.data_source["teachers"] = "database"
-            self.populate_tree(self.teachers_tree, self.teachers_data)
+            return self.original_teachers_data
         elif table == "students":
-            self.students_data = self.data_manager.get_all_students()
-            self.original_students_data = [row.copy() for row in self.students_data]
-            self.data_source["students"] = "database"
-            self.populate_tree(self.students_tree, self.students_data)
+            return self.original_students_data
+        else:
+            return self.original_grades_data
+
+    def set_table_data(self, table, rows):
+        """Запоминает строки таблицы; *_data и original_*_data ссылаются на один список."""
+        if table == "teachers":
+            self.teachers_data = self.original_teachers_data = rows
+        elif table == "students":
+            self.students_data = self.original_students_data = rows
         else:
-            self.grades_data = self.data_manager.get_all_grades()
-            self.original_grades_data = [row.copy() for row in self.grades_data]
-            self.data_source["grades"] = "database"
-            self.populate_tree(self.grades_tree, self.grades_data)
+            self.grades_data = self.original_grades_data = rows
+        self.search_indexes[table].rebuild(rows)
+        self.sort_indexes[table].rebuild(rows)
+
+    def apply_rows_diff(self, table, new_rows):
+        """Сверяет кэш таблицы с новыми строками по id и переносит в Treeview только разницу.
+
+        Кэш правится на месте: изменённые словари обновляются, удалённые убираются,
+        новые дописываются в конец. Возвращает (добавлено, изменено, удалено).
+        """
+        data = self.get_table_data(table)
+        new_by_id = {row["id"]: row for row in new_rows}
+        old_ids = {row["id"] for row in data}
+
+        kept = []
+        changed = []
+        deleted = []
+        for row in data:
+            fresh = new_by_id.get(row["id"])
+            if fresh is None:
+                deleted.append(row)
+                continue
+            if fresh != row:
+                row.clear()
+                row.update(fresh)
+                changed.append(row)
+            kept.append(row)
+        inserted = [row for row in new_rows if row["id"] not in old_ids]
+        data[:] = kept
+        data.extend(inserted)
+        return self.show_row_changes(table, inserted, changed, deleted)
+
+    def apply_rows_delta(self, table, ids, fresh_rows, column="id"):
+        """Применяет к кэшу таблицы свежие строки для набора id (изменения других клиентов).
+
+        Строки кэша, чьё значение column входит в ids и которых нет среди
+        fresh_rows, удалены в БД. Новые строки дописываются в конец, кроме
+        постраничного режима: там они появятся при прокрутке или обновлении.
+        Возвращает (добавлено, изменено, удалено).
+        """
+        data = self.get_table_data(table)
+        fresh_by_id = {row["id"]: row for row in fresh_rows}
+
+        kept = []
+        changed = []
+        deleted = []
+        for row in data:
+            fresh = fresh_by_id.pop(row["id"], None)
+            if fresh is None:
+                if row.get(column) in ids:
+                    deleted.append(row)
+                else:
+                    kept.append(row)
+                continue
+            if fresh != row:
+                row.clear()
+                row.update(fresh)
+                changed.append(row)
+            kept.append(row)
+        inserted = [] if self.paged else list(fresh_by_id.values())
+        data[:] = kept
+        data.extend(inserted)
+        return self.show_row_changes(table, inserted, changed, deleted)
+
+    def show_row_changes(self, table, inserted, changed, deleted):
+        """Обновляет индексы и Treeview после правки кэша таблицы на месте."""
+        data = self.get_table_data(table)
+        tree = self.get_tree(table)
+        index = self.search_indexes[table]
+        for row in deleted:
+            index.remove(row)
+        for row in changed:
+            index.update(row)
+        index.add_many(inserted)
+        self.sort_indexes[table].rebuild(data)
+
+        search_term = self.search_var.get().strip()
+        if search_term and table == self.current_table:
+            # Отфильтрованный вид проще пересобрать поиском по обновлённому кэшу.
+            self.perform_search(search_term)
+        else:
+            stale = [str(row["id"]) for row in deleted if tree.exists(str(row["id"]))]
+            if stale:
+                tree.delete(*stale)
+            for row in changed:
+                if tree.exists(str(row["id"])):
+                    tree.item(str(row["id"]), values=row["values"])
+            for row in inserted:
+                tree.insert("", "end", iid=str(row["id"]), values=row["values"])
+
+        app_logger.debug(
+            f"Обновление таблицы {table}: добавлено {len(inserted)}, изменено {len(changed)}, удалено {len(deleted)}"
+        )
+        return len(inserted), len(changed), len(deleted)
+
+    def get_tree(self, table):
+        """Возвращает Treeview указанной таблицы."""
+        if table == "teachers":
+            return self.teachers_tree
+        elif table == "students":
+            return self.students_tree
+        else:
+            return self.grades_tree
+
+    def read_table_rows(self, table, sort_key, descending):
+        """Читает строки таблицы и курсор следующей страницы; можно вызывать из рабочего потока."""
+        if not self.paged:
+            if table == "teachers":
+                return self.data_manager.get_all_teachers(), None
+            elif table == "students":
+                return self.data_manager.get_all_students(), None
+            else:
+                return self.data_manager.get_all_grades(), None
+
+        # Ошибка уходит в on_refresh_error, чтобы таблица запросилась снова.
+        return self.data_manager.get_page(table, None, self.PAGE_SIZE, sort_key, descending)
+
+    def load_next_page(self, table):
+        """Подгружает следующую страницу таблицы из БД в пуле потоков.
+
+        Пока страница читается, state["pending"] не даёт запросить её повторно.
+        """
+        state = self.page_state[table]
+        if not self.paged or self.data_source[table] != "database":
+            state["pending"] = False
+            return
+        if state["search"]:
+            self.load_next_search_page(table)
+            return
+        if state["cursor"] is None:
+            state["pending"] = False
+            return
+
+        generation = self.refresh_generations[table]
+        self.executor.submit(
+            self.data_manager.get_page, table, state["cursor"], self.PAGE_SIZE,
+            state["sort_key"], state["descending"],
+            name=f"Загрузка страницы таблицы {table}",
+            on_done=lambda result: self.append_page(table, generation, result),
+            on_error=lambda exc: self.on_page_error(table, f"Загрузка страницы таблицы {table}", exc),
+        )
+
+    def on_page_error(self, table, title, exc):
+        """Ошибка подгрузки страницы: курсор остаётся прежним, следующая прокрутка повторит запрос."""
+        self.page_state[table]["pending"] = False
+        self.on_task_error(title, exc)
+
+    def append_page(self, table, generation, result):
+        """Дописывает страницу, прочитанную load_next_page, в кэш и Treeview (в главном потоке)."""
+        state = self.page_state[table]
+        state["pending"] = False
+        # Таблицу успели перечитать заново: страница относится к старому курсору.
+        if generation != self.refresh_generations[table]:
+            return
+        rows, state["cursor"] = result
+        app_logger.debug(f"Подгружено {len(rows)} строк в таблицу {table}")
+
+        self.get_table_data(table).extend(rows)
+        self.search_indexes[table].add_many(rows)
+        self.sort_indexes[table].extend(rows)
+
+        # При активном поиске новые строки попадут в таблицу после сброса фильтра.
+        if not self.search_var.get().strip():
+            tree = self.get_tree(table)
+            for row in rows:
+                tree.insert("", "end", iid=str(row["id"]), values=row["values"])
+
+    def load_next_search_page(self, table):
+        """Дописывает в Treeview следующую страницу результатов поиска в БД.
+
+        Результаты поиска не попадают в кэш таблицы: после сброса фильтра
+        показываются обычные загруженные страницы.
+        """
+        state = self.page_state[table]
+        if state["search_cursor"] is None:
+            state["pending"] = False
+            return
+        search_term, cursor = state["search"], state["search_cursor"]
+        self.executor.submit(
+            self.data_manager.get_page, table, cursor, self.PAGE_SIZE,
+            state["sort_key"], state["descending"], search_term,
+            name=f"Поиск в таблице {table}",
+            on_done=lambda result: self.append_search_page(table, search_term, cursor, result),
+            on_error=lambda exc: self.on_page_error(table, f"Загрузка результатов поиска в таблице {table}", exc),
+        )
+
+    def append_search_page(self, table, search_term, cursor, result):
+        """Дописывает страницу результатов поиска в Treeview, если поиск не сменился (в главном потоке)."""
+        state = self.page_state[table]
+        state["pending"] = False
+        if state["search"] != search_term or state["search_cursor"] != cursor:
+            return
+        rows, state["search_cursor"] = result
+        app_logger.debug(f"Подгружено {len(rows)} найденных строк в таблицу {table}")
+
+        tree = self.get_tree(table)
+        for row in rows:
+            tree.insert("", "end", iid=str(row["id"]), values=row["values"])
+
+    def on_tree_scroll(self, table, scrollbar, first, last):
+        """Двигает полосу прокрутки и в постраничном режиме подгружает данные у конца списка."""
+        scrollbar.set(first, last)
+        state = self.page_state[table]
+        cursor = state["search_cursor"] if state["search"] else state["cursor"]
+        if self.paged and float(last) >= 0.9 and cursor is not None and not state["pending"]:
+            state["pending"] = True
+            self.root.after_idle(self.load_next_page, table)
 
     def format_field_error(self, table, message):
         """Добавляет подсказку по полю, в котором возникла ошибка."""
@@ -2138,26 +2766,43 @@ class SchoolApp:
         self.class_count_var.set(f"Ученики в классе {class_name}: {count}")
 
     def refresh_info_center_data(self):
+        """Перечитывает данные справочного центра в фоне и обновляет его виджеты."""
+        if not self.info_window or not tk.Toplevel.winfo_exists(self.info_window):
+            return
+        self.executor.submit(
+            self.read_info_center_data, name="Данные справочного центра",
+            on_done=self.show_info_center_data,
+            on_error=lambda exc: self.on_task_error("Справочный центр", exc),
+        )
+
+    def read_info_center_data(self):
+        """Собирает данные справочного центра; выполняется в рабочем потоке."""
+        return {
+            "subjects": self.data_manager.get_subject_list(),
+            "teachers": self.data_manager.get_teacher_list(),
+            "classes": self.data_manager.get_class_list(),
+            "total_students": self.data_manager.get_student_count(),
+            "report": self.data_manager.get_academic_report(),
+        }
+
+    def show_info_center_data(self, data):
+        """Заполняет виджеты справочного центра (в главном потоке)."""
         if not self.info_window or not tk.Toplevel.winfo_exists(self.info_window):
             return
 
-        subjects = self.data_manager.get_subject_list()
         if hasattr(self, 'subject_combo'):
-            self.subject_combo['values'] = subjects
+            self.subject_combo['values'] = data["subjects"]
 
-        teachers = self.data_manager.get_teacher_list()
         if hasattr(self, 'teacher_combo'):
-            self.teacher_combo['values'] = teachers
+            self.teacher_combo['values'] = data["teachers"]
 
-        classes = self.data_manager.get_class_list()
         if hasattr(self, 'student_class_combo'):
-            self.student_class_combo['values'] = classes
+            self.student_class_combo['values'] = data["classes"]
 
-        total_students = self.data_manager.get_student_count()
         if hasattr(self, 'total_students_var'):
-            self.total_students_var.set(f"Всего учеников: {total_students}")
+            self.total_students_var.set(f"Всего учеников: {data['total_students']}")
 
-        report = self.data_manager.get_academic_report()
+        report = data["report"]
         if hasattr(self, 'good_count_var'):
             self.good_count_var.set(f"Отличники: {len(report.get('good_students', []))}")
         if hasattr(self, 'bad_count_var'):
@@ -2208,33 +2853,40 @@ class SchoolApp:
 
     def populate_tree(self, tree, data_rows):
         """Перерисовывает содержимое Treeview."""
-        for item in tree.get_children():
-            tree.delete(item)
+        tree.delete(*tree.get_children())
 
         for row in data_rows:
-            row_id = row.get("id")
-            if row_id is not None:
-                tree.insert("", "end", iid=str(row_id), values=row["values"])
+            iid = self.row_iid(row)
+            if iid is not None:
+                tree.insert("", "end", iid=iid, values=row["values"])
             else:
-                tree.insert("", "end", values=row["values"])
+                # Строке без id (из файла) запоминаем iid, выданный Treeview.
+                row["iid"] = tree.insert("", "end", values=row["values"])
+
+    def row_iid(self, row):
+        """iid строки в Treeview: id из БД или iid, выданный при первом выводе строки из файла."""
+        row_id = row.get("id")
+        if row_id is not None:
+            return str(row_id)
+        return row.get("iid")
 
     def sync_table_from_tree(self, table):
         """Сохраняет текущие значения из Treeview в кэш."""
         if table == "teachers":
             tree = self.teachers_tree
-            rows = [{"id": None, "values": tree.item(item, 'values')} for item in tree.get_children()]
-            self.teachers_data = rows
-            self.original_teachers_data = [row.copy() for row in rows]
+            rows = [{"id": None, "iid": item, "values": tree.item(item, 'values')} for item in tree.get_children()]
+            self.set_table_data("teachers", rows)
         elif table == "students":
             tree = self.students_tree
-            rows = [{"id": None, "values": tree.item(item, 'values')} for item in tree.get_children()]
-            self.students_data = rows
-            self.original_students_data = [row.copy() for row in rows]
+            rows = [{"id": None, "iid": item, "values": tree.item(item, 'values')} for item in tree.get_children()]
+            self.set_table_data("students", rows)
         else:
             tree = self.grades_tree
-            rows = [{"id": None, "student_id": None, "values": tree.item(item, 'values')} for item in tree.get_children()]
-            self.grades_data = rows
-            self.original_grades_data = [row.copy() for row in rows]
+            rows = [
+                {"id": None, "student_id": None, "iid": item, "values": tree.item(item, 'values')}
+                for item in tree.get_children()
+            ]
+            self.set_table_data("grades", rows)
 
     def handle_delete(self, selected_items):
         """Удаляет строки из таблицы и БД (если нужно)."""
@@ -2281,33 +2933,96 @@ class SchoolApp:
                 self.sync_table_from_tree("grades")
 
     def perform_search(self, search_term):
-        """Выполняет поиск по таблице"""
-        app_logger.info(f"Выполнение поиска в таблице {self.current_table}: '{search_term}'")
+        """Выполняет поиск по таблице.
 
-        tree, data = self.get_tree_and_data()
-        app_logger.debug(f"Поиск среди {len(data)} записей")
+        Поиск в БД идёт в пуле потоков; результат показывается, только если
+        за это время не начат другой поиск.
+        """
+        app_logger.info(f"Выполнение поиска в таблице {self.current_table}: '{search_term}'")
+        self.search_scheduler.cancel()
+        table = self.current_table
+        request = self.search_request = (table, search_term)
+        args = self.search_args(table, search_term)
+        server = args[2]
+        if not server:
+            self.show_search_results(table, search_term, self.search_rows(*args))
+            return
 
-        filtered = []
-        search_term_lower = search_term.lower()
+        def on_done(result):
+            if self.search_request == request:
+                self.show_search_results(table, search_term, result)
 
-        for row in data:
-            if any(search_term_lower in str(field).lower() for field in row["values"]):
-                filtered.append(row)
+        self.executor.submit(
+            self.search_rows, *args, name=f"Поиск в таблице {table}",
+            on_done=on_done, on_error=lambda exc: self.on_task_error("Ошибка поиска", exc),
+        )
 
-        app_logger.info(f"Найдено {len(filtered)} записей по запросу '{search_term}'")
-        self.populate_tree(tree, filtered)
+    def search_args(self, table, search_term):
+        """Собирает аргументы search_rows в главном потоке, пока состояние таблицы не изменилось."""
+        state = self.page_state[table]
+        server = self.server_search and self.data_source[table] == "database"
+        return table, search_term, server, state["sort_key"], state["descending"]
+
+    def search_rows(self, table, search_term, server, sort_key, descending):
+        """Находит строки таблицы; может выполняться в рабочем потоке.
+
+        С server=True ищет в PostgreSQL и возвращает первую страницу результатов
+        с курсором следующей; при ошибке БД, как и без server, ищет по
+        загруженным строкам через триграммный индекс. В обоих случаях поиск
+        идёт по одним и тем же колонкам (SEARCH_COLUMNS). Возвращает (строки, курсор,
+        найдено ли в БД). Виджетов и состояния окна не трогает.
+        """
+        if server:
+            try:
+                rows, cursor = self.data_manager.get_page(
+                    table, None, self.PAGE_SIZE, sort_key, descending, search_term
+                )
+                return rows, cursor, True
+            except Exception as e:
+                app_logger.error(f"Ошибка поиска в БД по таблице {table}: {e}", exc_info=True)
+
+        return self.search_indexes[table].search(search_term), None, False
+
+    def show_search_results(self, table, search_term, result):
+        """Показывает найденные строки в Treeview таблицы (только в главном потоке)."""
+        rows, cursor, from_server = result
+        state = self.page_state[table]
+        if from_server:
+            # Остальные страницы результатов подгружаются при прокрутке.
+            state["search"] = search_term
+            state["search_cursor"] = cursor
+            app_logger.info(f"Найдено в БД {len(rows)} записей на первой странице по запросу '{search_term}'")
+        else:
+            state["search"] = state["search_cursor"] = None
+            app_logger.info(f"Найдено {len(rows)} записей по запросу '{search_term}'")
+        self.populate_tree(self.get_tree(table), rows)
 
     def on_search(self, event):
-        """Обработчик поиска по таблице при вводе текста"""
+        """Обработчик поиска по таблице при вводе текста.
+
+        Поиск запускается после паузы в наборе и выполняется в фоне;
+        отображается только результат последнего запроса.
+        """
         try:
             search_term = self.search_var.get().strip()
 
             if not search_term:
-                self.reset_filters()
+                if self.search_request is not None:
+                    self.reset_filters()
                 return
 
             self.validate_search_input(search_term)
-            self.perform_search(search_term)
+            table = self.current_table
+            if self.search_request == (table, search_term):
+                # Стрелки, Shift и т.п. не меняют запрос.
+                return
+            self.search_request = (table, search_term)
+            self.search_scheduler.schedule(
+                self.search_rows,
+                lambda result: self.show_search_results(table, search_term, result),
+                *self.search_args(table, search_term),
+                on_error=lambda exc: self.on_task_error("Ошибка поиска", exc)
+            )
 
         except EmptySearchError:
             pass
@@ -2333,6 +3048,32 @@ class SchoolApp:
             self.update_sort_options(self.grades_sort_options)
 
         self.current_file = None
+        self.ensure_table_loaded(self.current_table)
+
+    def ensure_table_loaded(self, table):
+        """Запускает первую загрузку таблицы, если она ещё не загружена и не загружается."""
+        if table not in self.loaded_tables and table not in self.table_load_started:
+            self.refresh_data(table, full=True)
+
+    def prefetch_tables(self):
+        """Подгружает в фоне таблицы, которые ещё ни разу не показывались."""
+        for table in ("teachers", "students", "grades"):
+            self.ensure_table_loaded(table)
+
+    def on_table_loaded(self, table):
+        """Отмечает первую загрузку таблицы и замеряет время до готовности окна."""
+        elapsed_ms = (time.perf_counter() - self.table_load_started.pop(table)) * 1000
+        self.loaded_tables.add(table)
+        app_logger.info(f"Таблица {table} загружена за {elapsed_ms:.0f} мс")
+
+        if not self.interactive and table == self.current_table:
+            self.interactive = True
+            # update_idletasks дорисовывает таблицу, чтобы замер включал первую отрисовку строк.
+            self.root.update_idletasks()
+            tti_ms = (time.perf_counter() - self.started_at) * 1000
+            app_logger.info(f"Время до готовности интерфейса: {tti_ms:.0f} мс")
+            if self.prefetch:
+                self.root.after_idle(self.prefetch_tables)
 
     def update_sort_options(self, options):
         """Обновляет доступные опции для сортировки текущей таблицы"""
@@ -2376,93 +3117,24 @@ class SchoolApp:
         column_info = sort_map.get(sort_by)
         if not column_info:
             return
-        column_index, reverse = column_info
-        self.sort_treeview(tree, column_index, reverse)
+        if isinstance(column_info[0], tuple):
+            # Сортировка по нескольким колонкам: ((колонка, по убыванию), ...).
+            self.sort_treeview_by(tree, column_info)
+        else:
+            column_index, reverse = column_info
+            self.sort_treeview(tree, column_index, reverse)
 
     def parse_single_class(self, class_str):
         """Парсинг строки с классами для более точной сортировки"""
-        if not class_str:
-            return 0, ''
-
-        class_str = str(class_str).strip().upper()
-
-        digits = ''
-        letters = ''
-
-        for char in class_str:
-            if char.isdigit():
-                digits += char
-            else:
-                letters += char
-
-        class_num = int(digits) if digits else 0
-
-        return class_num, letters
+        return parse_single_class(class_str)
 
     def parse_teacher_classes(self, classes_str):
         """Разбитие строки для точной сортировки учителей по классам"""
-        if not classes_str:
-            return 0, classes_str
-
-        classes_str = str(classes_str).strip().upper()
-
-        numbers = []
-        current_number = ''
-
-        for char in classes_str:
-            if char.isdigit():
-                current_number += char
-            else:
-                if current_number:
-                    numbers.append(int(current_number))
-                    current_number = ''
-
-        if current_number:
-            numbers.append(int(current_number))
-
-        if numbers:
-            min_class = min(numbers)
-            return min_class, classes_str
-        else:
-            return 0, classes_str
+        return parse_teacher_classes(classes_str)
 
     def get_sort_key(self, value, column_index):
         """Возвращает ключ сортировки для значения в зависимости от типа колонки"""
-        if value is None:
-            value_str = ""
-        else:
-            value_str = str(value).strip()
-
-        if self.current_table in ("teachers", "students") and column_index == 1:
-            try:
-                if value_str:
-                    dt = datetime.datetime.strptime(value_str, "%d.%m.%Y")
-                    return (dt,)
-                else:
-                    return (datetime.datetime.min,)
-            except ValueError:
-                return (value_str.lower() if value_str else "",)
-
-        if self.current_table == "students" and column_index == 2:
-            return self.parse_single_class(value_str)
-
-        if self.current_table == "teachers" and column_index == 3:
-            return self.parse_teacher_classes(value_str)
-
-        if self.current_table == "grades" and column_index == 3:
-            return self.parse_single_class(value_str)
-
-        if self.current_table == "grades" and column_index == 2:
-            try:
-                if value_str:
-                    return (int(value_str),)
-                else:
-                    return (0,)
-            except (TypeError, ValueError):
-                return (value_str.lower() if value_str else "",)
-
-        return (value_str.lower() if value_str else "",)
-
+        return column_sort_key(self.current_table, column_index, value)
 
     def on_column_sort(self, table, column_id):
         """Переключает направление сортировки при клике по заголовку."""
@@ -2478,6 +3150,27 @@ class SchoolApp:
         self.sort_treeview(tree, column_id, reverse)
         state[column_id] = not reverse
 
+    def on_heading_shift_click(self, table, event):
+        """Shift+щелчок по заголовку добавляет колонку к текущей сортировке.
+
+        Повторный Shift+щелчок по колонке, которая уже есть в сортировке,
+        меняет её направление.
+        """
+        tree = self.get_tree(table)
+        if tree.identify_region(event.x, event.y) != "heading":
+            return None
+        column_index = int(tree.identify_column(event.x)[1:]) - 1
+
+        spec = list(self.sort_specs[table])
+        for position, (index, reverse) in enumerate(spec):
+            if index == column_index:
+                spec[position] = (index, not reverse)
+                break
+        else:
+            spec.append((column_index, False))
+        self.sort_treeview_by(tree, spec)
+        return "break"
+
     def sort_treeview(self, tree, column, reverse=False):
         """Выполняет сортировку данных по указанной колонке"""
         if isinstance(column, str):
@@ -2492,26 +3185,77 @@ class SchoolApp:
         columns = tree['columns']
         if column_index < 0 or column_index >= len(columns):
             return
-        column_id = columns[column_index]
+        self.sort_treeview_by(tree, ((column_index, reverse),))
 
-        items = []
-        for item in tree.get_children(''):
-            value = tree.set(item, column_id)
-            sort_key = self.get_sort_key(value, column_index)
-            items.append((sort_key, item))
+    def sort_treeview_by(self, tree, spec):
+        """Сортирует Treeview по нескольким колонкам: spec - пары (колонка, по убыванию).
 
-        try:
-            items.sort(key=lambda x: x[0], reverse=reverse)
-        except (TypeError, ValueError):
-            items.sort(key=lambda x: str(x[0]).lower(), reverse=reverse)
+        Ключи берутся из заранее посчитанных колонок SortIndex, перестановки
+        для недавних спецификаций кэшируются, порядок строк в Treeview меняется
+        одной операцией. В постраничном режиме сортировка по одной колонке
+        выполняется в БД (ORDER BY), см. push_sort_to_db.
+        """
+        spec = tuple(spec)
+        table = self.get_table_of_tree(tree)
+        self.sort_specs[table] = spec
+
+        if len(spec) == 1 and self.push_sort_to_db(table, spec[0][0], spec[0][1]):
+            return
+
+        items = tree.get_children('')
+        ordered = self.sort_indexes[table].sort_items(items, spec)
+        if ordered is None:
+            # Элементы, добавленные в Treeview в обход кэша: ключи считаются на месте.
+            columns = tree['columns']
+            ordered = list(items)
+            for column_index, reverse in reversed(spec):
+                column_id = columns[column_index]
+                ordered.sort(
+                    key=lambda item: column_sort_key(table, column_index, tree.set(item, column_id)),
+                    reverse=reverse
+                )
+
+        tree.set_children('', *ordered)
+
+    def push_sort_to_db(self, table, column_index, reverse):
+        """Перезагружает постраничную таблицу из БД в нужном порядке.
+
+        Возвращает False, если сортировать нужно в приложении: таблица не
+        постраничная, не из БД, выключен SCHOOL_APP_SORT_PUSHDOWN или колонку
+        нельзя сортировать в SQL.
+        """
+        if not (self.sort_pushdown and self.paged and self.data_source[table] == "database"):
+            return False
+        sort_key = self.DB_SORT_KEYS[table][column_index]
+        if sort_key is None:
+            return False
+
+        state = self.page_state[table]
+        if state["sort_key"] == sort_key and state["descending"] == reverse:
+            return True
+        state["sort_key"] = sort_key
+        state["descending"] = reverse
+        app_logger.debug(f"Сортировка таблицы {table} в БД по {sort_key}, по убыванию: {reverse}")
+        self.refresh_data(table)
+        return True
 
-        for index, (_, item) in enumerate(items):
-            tree.move(item, '', index)
+    def get_table_of_tree(self, tree):
+        """Возвращает имя таблицы, которой принадлежит Treeview."""
+        if tree is self.teachers_tree:
+            return "teachers"
+        elif tree is self.students_tree:
+            return "students"
+        else:
+            return "grades"
 
     def reset_filters(self):
         """Сбрасывает все фильтры и сортировку к исходному состоянию"""
         app_logger.info(f"Сброс фильтров и сортировки для таблицы {self.current_table}")
         self.search_var.set("")
+        self.search_scheduler.cancel()
+        self.search_request = None
+        state = self.page_state[self.current_table]
+        state["search"] = state["search_cursor"] = None
         tree, data = self.get_tree_and_data()
         app_logger.debug(f"Восстановлено {len(data)} записей")
         self.populate_tree(tree, data)
@@ -2527,44 +3271,65 @@ class SchoolApp:
             self.apply_sorting()
 
     def setup_report_generator(self):
-        """Инициализация генератора отчетов"""
-        self.report_generator = ReportGenerator()
+        """Инициализация генератора отчетов: сам генератор создаётся при первом отчёте."""
+        self._report_generator = None
+
+    @property
+    def report_generator(self):
+        """Генератор отчетов; создаётся (и импортирует библиотеки PDF) при первом обращении."""
+        if self._report_generator is None:
+            app_logger.debug("Создание генератора отчетов")
+            self._report_generator = ReportGenerator()
+        return self._report_generator
 
     def generate_pdf_report(self):
-        """Генерация PDF отчета"""
-        try:
-            if self.current_table == "teachers":
-                data = [row["values"] for row in self.original_teachers_data]
-                report_type = "Учителя"
-            elif self.current_table == "students":
-                data = [row["values"] for row in self.original_students_data]
-                report_type = "Ученики"
-            else:
-                data = [row["values"] for row in self.original_grades_data]
-                report_type = "Оценки"
+        """Генерация PDF отчета в фоне, с прогрессом и возможностью отмены."""
+        if self.current_table == "teachers":
+            data = [row["values"] for row in self.original_teachers_data]
+            report_type = "Учителя"
+        elif self.current_table == "students":
+            data = [row["values"] for row in self.original_students_data]
+            report_type = "Ученики"
+        else:
+            data = [row["values"] for row in self.original_grades_data]
+            report_type = "Оценки"
 
-            if not data:
-                messagebox.showwarning("Генерация отчета", "Нет данных для отчета")
-                return
+        if not data:
+            messagebox.showwarning("Генерация отчета", "Нет данных для отчета")
+            return
 
-            file_path = filedialog.asksaveasfilename(
-                title="Сохранить PDF отчет",
-                defaultextension=".pdf",
-                filetypes=[("PDF файлы", "*.pdf")]
-            )
+        file_path = filedialog.asksaveasfilename(
+            title="Сохранить PDF отчет",
+            defaultextension=".pdf",
+            filetypes=[("PDF файлы", "*.pdf")]
+        )
 
-            if not file_path:
-                return
+        if not file_path:
+            return
 
-            success = self.report_generator.generate_pdf_report(data, report_type, file_path)
+        dialog = ProgressDialog(self.root, "Генерация отчета")
 
+        def on_done(success):
+            dialog.close()
             if success:
                 messagebox.showinfo("Успех", "PDF отчет сохранен!")
 
-        except FileOperationError as e:
-            messagebox.showerror("Ошибка", str(e))
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Ошибка генерации отчета: {str(e)}")
+        def on_error(exc):
+            dialog.close()
+            if isinstance(exc, OperationCancelled):
+                app_logger.info("Генерация PDF отчета отменена")
+            elif isinstance(exc, FileOperationError):
+                messagebox.showerror("Ошибка", str(exc))
+            else:
+                messagebox.showerror("Ошибка", f"Ошибка генерации отчета: {str(exc)}")
+
+        generator = self.report_generator
+        task = self.executor.submit(
+            lambda task: generator.generate_pdf_report(data, report_type, file_path, task.progress),
+            name="Генерация PDF отчета",
+            on_done=on_done, on_error=on_error, on_progress=dialog.update, pass_task=True,
+        )
+        dialog.on_cancel = task.cancel
 
     def on_generate_pdf(self, _=None):
         """Обработчик кнопки PDF"""
@@ -2584,5 +3349,8 @@ if __name__ == "__main__":
 
     app_logger.info("Запуск главного цикла приложения")
     root.mainloop()
+    if app.change_listener is not None:
+        app.change_listener.stop()
+    app.executor.shutdown()
 
     app_logger.info("Приложение завершено")
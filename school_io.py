@@ -0,0 +1,170 @@
+"""Потоковое чтение строк таблиц из файлов CSV и XML.
+
+Строки отдаются генераторами по одной, уже приведёнными к колонкам таблицы,
+поэтому файл любого размера читается в постоянной памяти.
+"""
+
+import os
+
+# Раздел XML-файла, тег записи и атрибуты колонок для каждой таблицы
+# (в том же виде, в каком файл пишет SchoolApp.save_to_xml).
+XML_LAYOUT = {
+    "teachers": ("teachers", "teacher", ("fio", "birth_date", "subject", "classes")),
+    "students": ("students", "student", ("fio", "birth_date", "class")),
+    "grades": ("grades", "grade", ("fio", "subject", "value", "class")),
+}
+
+
+def detect_file_format(filename):
+    """Определяет формат файла по расширению: 'xml', 'csv' или None."""
+    _, ext = os.path.splitext(filename)
+    ext = ext.lower()
+
+    if ext == '.xml':
+        return 'xml'
+    elif ext == '.csv' or ext == '.txt':
+        return 'csv'
+    else:
+        return None
+
+
+def normalize_row(table, row):
+    """Приводит строку файла к колонкам таблицы; неполную строку - к None.
+
+    В файлах учителей и учеников дата рождения может отсутствовать,
+    в файлах оценок - класс.
+    """
+    if table == "teachers":
+        if len(row) >= 4:
+            return row[0], row[1], row[2], row[3]
+        elif len(row) == 3:
+            return row[0], "", row[1], row[2]
+    elif table == "students":
+        if len(row) >= 3:
+            return row[0], row[1], row[2]
+        elif len(row) == 2:
+            return row[0], "", row[1]
+    else:
+        if len(row) >= 4:
+            return row[0], row[1], row[2], row[3]
+        elif len(row) >= 3:
+            return row[0], row[1], row[2], ""
+    return None
+
+
+def iter_csv_rows(source, table):
+    """Отдаёт строки CSV-файла (первая строка - заголовок) в колонках таблицы.
+
+    source - имя файла или файл, открытый в двоичном режиме.
+    """
+    import csv
+    import io
+
+    if isinstance(source, str):
+        file = open(source, 'r', encoding='utf-8', newline='')
+    else:
+        file = io.TextIOWrapper(source, encoding='utf-8', newline='')
+    with file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for row in reader:
+            row = normalize_row(table, row)
+            if row is not None:
+                yield row
+
+
+def iter_xml_rows(source, table):
+    """Отдаёт записи таблицы из XML-файла (имени или двоичного файла) через iterparse.
+
+    Читаются только записи внутри раздела таблицы (<teachers>, <students>,
+    <grades>). Обработанные элементы сразу удаляются из дерева, так что
+    в памяти остаётся не больше одной записи.
+    """
+    import xml.etree.ElementTree as ET
+
+    section_tag, record_tag, attributes = XML_LAYOUT[table]
+    section = None
+    depth = 0
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            # Разделы - прямые потомки корня, записи - потомки разделов.
+            if depth == 2:
+                section = element
+            continue
+
+        depth -= 1
+        if depth == 2:
+            if section.tag == section_tag and element.tag == record_tag:
+                yield tuple(element.get(name, "") for name in attributes)
+            # Записи чужих разделов тоже не копятся в памяти.
+            section.clear()
+
+
+def iter_file_rows(filename, table):
+    """Отдаёт строки таблицы из CSV- или XML-файла (формат по расширению)."""
+    if detect_file_format(filename) == 'xml':
+        return iter_xml_rows(filename, table)
+    return iter_csv_rows(filename, table)
+
+
+class FileRows:
+    """Строки таблицы из файла с отслеживанием прочитанной части для полосы прогресса.
+
+    Файл открывается при обходе и закрывается в конце; position() можно
+    вызывать во время обхода, в том числе из того же рабочего потока.
+    """
+
+    def __init__(self, filename, table):
+        self.filename = filename
+        self.table = table
+        self.size = os.path.getsize(filename)
+        self._file = None
+
+    def position(self):
+        """Сколько байт файла уже прочитано."""
+        if self._file is None:
+            return 0
+        if self._file.closed:
+            return self.size
+        return self._file.tell()
+
+    def __iter__(self):
+        with open(self.filename, 'rb') as self._file:
+            if detect_file_format(self.filename) == 'xml':
+                yield from iter_xml_rows(self._file, self.table)
+            else:
+                yield from iter_csv_rows(self._file, self.table)
+
+
+def file_sha256(filename, block_size=1 << 20):
+    """SHA-256 содержимого файла (hex), файл читается блоками."""
+    import hashlib
+
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def rows_sha256(rows):
+    """SHA-256 уже прочитанных строк файла (hex)."""
+    import hashlib
+
+    digest = hashlib.sha256()
+    for row in rows:
+        digest.update(repr(tuple(row)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def iter_chunks(rows, size):
+    """Разбивает поток строк на списки не длиннее size."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
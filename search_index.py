@@ -0,0 +1,154 @@
+"""Инвертированный триграммный индекс для поиска по строкам таблиц."""
+
+import itertools
+import threading
+
+NGRAM_SIZE = 3
+FIELD_SEPARATOR = "\x00"
+
+
+def row_text(values, columns=None):
+    """Текст строки для поиска: поля в нижнем регистре через разделитель.
+
+    columns - номера полей values, по которым идёт поиск (по умолчанию все).
+    Разделитель не встречается в запросах, поэтому совпадение никогда не
+    перескакивает через границу двух полей - как и при поиске по каждому полю.
+    """
+    if columns is not None:
+        values = [values[column] for column in columns]
+    return FIELD_SEPARATOR.join(str(field).lower() for field in values)
+
+
+def trigrams(text):
+    """Множество триграмм текста."""
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+class TrigramIndex:
+    """Индекс строк таблицы (словарей с ключом "values") по триграммам.
+
+    Для каждой триграммы хранится множество строк, в тексте которых она есть.
+    Кандидаты на совпадение - пересечение этих множеств по всем триграммам
+    запроса, начиная с самого короткого; затем кандидаты проверяются обычным
+    поиском подстроки. Запросы короче трёх символов просматривают заранее
+    подготовленный текст всех строк.
+
+    Строки различаются по идентичности объекта, так что изменённую на месте
+    строку нужно передать в update. Результаты возвращаются в порядке
+    добавления строк в индекс. Методы защищены блокировкой и могут
+    вызываться из рабочих потоков. columns ограничивает поиск частью полей
+    (см. row_text).
+    """
+
+    def __init__(self, rows=(), columns=None):
+        self.columns = columns
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._entries = {}
+        self._order = itertools.count()
+        self.rebuild(rows)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def rebuild(self, rows):
+        """Строит индекс заново по списку строк."""
+        with self._lock:
+            self._postings = {}
+            self._entries = {}
+            self._order = itertools.count()
+            for row in rows:
+                self._add(row)
+
+    def add(self, row):
+        """Добавляет строку в индекс."""
+        with self._lock:
+            self._add(row)
+
+    def add_many(self, rows):
+        """Добавляет несколько строк за одну блокировку."""
+        with self._lock:
+            for row in rows:
+                self._add(row)
+
+    def remove(self, row):
+        """Убирает строку из индекса; отсутствующая строка игнорируется."""
+        with self._lock:
+            self._remove(id(row))
+
+    def update(self, row):
+        """Переиндексирует строку после изменения её values, сохраняя её место."""
+        with self._lock:
+            entry = self._entries.get(id(row))
+            if entry is None:
+                self._add(row)
+                return
+            text = row_text(row["values"], self.columns)
+            if text == entry[1]:
+                return
+            old_grams = trigrams(entry[1])
+            new_grams = trigrams(text)
+            key = id(row)
+            for gram in old_grams - new_grams:
+                self._discard(gram, key)
+            for gram in new_grams - old_grams:
+                self._postings.setdefault(gram, set()).add(key)
+            self._entries[key] = (entry[0], text, row)
+
+    def search(self, term):
+        """Возвращает строки, в одном из полей поиска которых есть term (без учёта регистра)."""
+        term = term.lower()
+        with self._lock:
+            if len(term) < NGRAM_SIZE:
+                # Словарь хранит строки в порядке добавления, сортировать не нужно.
+                return [row for _, text, row in self._entries.values() if term in text]
+
+            postings = []
+            for gram in trigrams(term):
+                keys = self._postings.get(gram)
+                if not keys:
+                    return []
+                postings.append(keys)
+            postings.sort(key=len)
+
+            candidates = set(postings[0])
+            for keys in postings[1:]:
+                candidates &= keys
+                if not candidates:
+                    return []
+
+            if len(candidates) * 4 > len(self._entries):
+                # Кандидатов много: дешевле пройти строки по порядку, чем сортировать.
+                return [row for key, (_, text, row) in self._entries.items()
+                        if key in candidates and term in text]
+            matches = [self._entries[key] for key in candidates]
+        matches = [entry for entry in matches if term in entry[1]]
+        matches.sort(key=_entry_order)
+        return [row for _, _, row in matches]
+
+    def _add(self, row):
+        key = id(row)
+        if key in self._entries:
+            self._remove(key)
+        text = row_text(row["values"], self.columns)
+        self._entries[key] = (next(self._order), text, row)
+        for gram in trigrams(text):
+            self._postings.setdefault(gram, set()).add(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for gram in trigrams(entry[1]):
+            self._discard(gram, key)
+
+    def _discard(self, gram, key):
+        keys = self._postings.get(gram)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._postings[gram]
+
+
+def _entry_order(entry):
+    return entry[0]
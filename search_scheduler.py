@@ -0,0 +1,106 @@
+"""Отложенный поиск в фоновом потоке с доставкой результата в главный цикл Tk."""
+
+import queue
+import threading
+
+
+class SearchScheduler:
+    """Планировщик поиска для поля ввода, привязанного к <KeyRelease>.
+
+    schedule откладывает запуск на delay_ms: если за это время пришёл новый
+    запрос, старый отбрасывается (debounce). Поиск выполняется в отдельном
+    рабочем потоке, результат возвращается в главный поток через root.after.
+    У каждого запроса есть номер поколения; запрос, который ещё не начался,
+    заменяется новым, а результат устаревшего запроса не отображается.
+    Функция поиска работает в рабочем потоке и не должна трогать виджеты,
+    функция отображения вызывается в главном потоке, как и on_error, которой
+    передаётся исключение функции поиска.
+    """
+
+    def __init__(self, root, delay_ms=200, poll_ms=20):
+        self.root = root
+        self.delay_ms = delay_ms
+        self.poll_ms = poll_ms
+        self._generation = 0
+        self._after_id = None
+        self._poll_id = None
+        self._awaiting = False
+        self._job = None
+        self._job_ready = threading.Condition()
+        self._results = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="school-search", daemon=True)
+        self._worker.start()
+
+    def schedule(self, search, render, *args, on_error=None):
+        """Запускает search(*args) после паузы в вводе и передаёт результат в render.
+
+        Если search упал, исключение получает on_error (без неё оно отбрасывается).
+        """
+        self._generation += 1
+        self._cancel_timer()
+        self._after_id = self.root.after(
+            self.delay_ms, self._submit, self._generation, search, render, on_error, args
+        )
+
+    def cancel(self):
+        """Отменяет отложенный запрос и не даёт отобразиться уже выполняющемуся."""
+        self._generation += 1
+        self._cancel_timer()
+        self._awaiting = False
+        with self._job_ready:
+            self._job = None
+
+    def is_current(self, generation):
+        """Актуален ли ещё запрос с этим номером (можно проверять из функции поиска)."""
+        return generation == self._generation
+
+    def _cancel_timer(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _submit(self, generation, search, render, on_error, args):
+        self._after_id = None
+        with self._job_ready:
+            # Не начатый запрос просто заменяется: считать его уже незачем.
+            self._job = (generation, search, render, on_error, args)
+            self._job_ready.notify()
+        self._awaiting = True
+        if self._poll_id is None:
+            self._poll_id = self.root.after(self.poll_ms, self._poll)
+
+    def _run(self):
+        while True:
+            with self._job_ready:
+                while self._job is None:
+                    self._job_ready.wait()
+                generation, search, render, on_error, args = self._job
+                self._job = None
+            if not self.is_current(generation):
+                continue
+            try:
+                result, error = search(*args), None
+            except Exception as e:
+                result, error = None, e
+            self._results.put((generation, render, on_error, result, error))
+
+    def _poll(self):
+        self._poll_id = None
+        latest = None
+        while True:
+            try:
+                item = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if self.is_current(item[0]):
+                latest = item
+
+        if latest is not None:
+            self._awaiting = False
+            _, render, on_error, result, error = latest
+            if error is None:
+                render(result)
+            elif on_error is not None:
+                on_error(error)
+        elif self._awaiting:
+            self._poll_id = self.root.after(self.poll_ms, self._poll)
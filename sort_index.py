@@ -0,0 +1,204 @@
+"""Типизированные ключи сортировки таблиц, посчитанные заранее по колонкам."""
+
+import datetime
+from collections import OrderedDict
+
+
+def parse_single_class(class_str):
+    """Класс "10А" -> (10, "А") для сортировки по номеру, затем по букве."""
+    if not class_str:
+        return 0, ''
+
+    class_str = str(class_str).strip().upper()
+
+    digits = ''
+    letters = ''
+
+    for char in class_str:
+        if char.isdigit():
+            digits += char
+        else:
+            letters += char
+
+    class_num = int(digits) if digits else 0
+
+    return class_num, letters
+
+
+def parse_teacher_classes(classes_str):
+    """Список классов учителя -> (младший класс, строка) для сортировки."""
+    if not classes_str:
+        return 0, classes_str
+
+    classes_str = str(classes_str).strip().upper()
+
+    numbers = []
+    current_number = ''
+
+    for char in classes_str:
+        if char.isdigit():
+            current_number += char
+        else:
+            if current_number:
+                numbers.append(int(current_number))
+                current_number = ''
+
+    if current_number:
+        numbers.append(int(current_number))
+
+    if numbers:
+        return min(numbers), classes_str
+    return 0, classes_str
+
+
+def date_key(value_str):
+    """Дата "дд.мм.гггг" -> (порядковый номер дня, ""); пустая и неверная дата идут первыми."""
+    if not value_str:
+        return 0, ""
+    try:
+        return datetime.datetime.strptime(value_str, "%d.%m.%Y").toordinal(), ""
+    except ValueError:
+        return 0, value_str.lower()
+
+
+def grade_key(value_str):
+    """Оценка -> (число, "")."""
+    try:
+        return int(value_str), ""
+    except (TypeError, ValueError):
+        return 0, value_str.lower()
+
+
+def text_key(value_str):
+    return value_str.lower()
+
+
+# Функция ключа для каждой колонки таблицы; ключи внутри колонки одного типа.
+COLUMN_KEYS = {
+    "teachers": (text_key, date_key, text_key, parse_teacher_classes),
+    "students": (text_key, date_key, parse_single_class),
+    "grades": (text_key, text_key, grade_key, parse_single_class),
+}
+
+
+def column_sort_key(table, column_index, value):
+    """Ключ сортировки одного значения колонки таблицы."""
+    value_str = "" if value is None else str(value).strip()
+    return COLUMN_KEYS[table][column_index](value_str)
+
+
+class SortIndex:
+    """Ключи сортировки строк таблицы, хранящиеся по колонкам.
+
+    columns[i][n] - ключ i-й колонки для n-й строки списка rows. Ключи считаются
+    при загрузке строк; преобразование одинаковых значений (даты, классы)
+    выполняется один раз благодаря кэшу по значению. Строки сопоставляются
+    с элементами Treeview по iid, которое возвращает функция row_iid.
+
+    Порядок сортировки задаётся спецификацией - кортежем пар (колонка, по убыванию),
+    первая пара главная. Для каждой спецификации запоминается перестановка всех
+    строк; хранится не больше max_orders последних перестановок (LRU), так что
+    возврат к недавнему порядку не требует сортировки.
+    """
+
+    def __init__(self, table, row_iid, max_orders=8):
+        self.table = table
+        self.row_iid = row_iid
+        self.max_orders = max_orders
+        self.key_funcs = COLUMN_KEYS[table]
+        self.rows = []
+        self.columns = [[] for _ in self.key_funcs]
+        self._value_keys = [{} for _ in self.key_funcs]
+        self._positions = None
+        self._iids = None
+        self._orders = OrderedDict()
+
+    def rebuild(self, rows):
+        """Пересчитывает ключи для нового списка строк."""
+        self.rows = rows
+        self.columns = [[] for _ in self.key_funcs]
+        self._reset_cache()
+        self._append(rows)
+
+    def extend(self, rows):
+        """Досчитывает ключи для строк, дописанных в конец списка."""
+        self._append(rows)
+        self._reset_cache()
+
+    def order(self, spec):
+        """Перестановка номеров всех строк для спецификации сортировки (с кэшем)."""
+        spec = tuple(spec)
+        permutation = self._orders.get(spec)
+        if permutation is not None:
+            self._orders.move_to_end(spec)
+            return permutation
+
+        permutation = list(range(len(self.rows)))
+        # Устойчивые сортировки от младшего ключа к старшему: при равных ключах
+        # сохраняется порядок по следующим колонкам, а затем исходный порядок строк.
+        for column_index, reverse in reversed(spec):
+            permutation.sort(key=self.columns[column_index].__getitem__, reverse=reverse)
+        self._orders[spec] = permutation
+        if len(self._orders) > self.max_orders:
+            self._orders.popitem(last=False)
+        return permutation
+
+    def sort_items(self, items, spec):
+        """Упорядочивает iid элементов Treeview по спецификации сортировки.
+
+        Возвращает None, если какой-то элемент не соответствует строке индекса.
+        """
+        spec = tuple(spec)
+        positions = self._item_positions(items)
+        if positions is None:
+            return None
+
+        if len(positions) * 8 < len(self.rows) and spec not in self._orders:
+            # Отфильтровано немного строк: дешевле отсортировать только их.
+            order = list(range(len(items)))
+            for column_index, reverse in reversed(spec):
+                column = self.columns[column_index]
+                order.sort(key=lambda i: column[positions[i]], reverse=reverse)
+            return [items[i] for i in order]
+
+        iids = self._iids
+        if len(positions) == len(self.rows):
+            return [iids[n] for n in self.order(spec)]
+        shown = set(positions)
+        return [iids[n] for n in self.order(spec) if n in shown]
+
+    def _reset_cache(self):
+        self._positions = None
+        self._iids = None
+        self._orders.clear()
+
+    def _append(self, rows):
+        for column_index, (column, key_func, cache) in enumerate(
+                zip(self.columns, self.key_funcs, self._value_keys)):
+            if key_func is text_key:
+                # Текст почти не повторяется, кэшировать его незачем.
+                column.extend(
+                    str(row["values"][column_index]).strip().lower() if column_index < len(row["values"]) else ""
+                    for row in rows
+                )
+                continue
+            for row in rows:
+                values = row["values"]
+                value = values[column_index] if column_index < len(values) else ""
+                key = cache.get(value)
+                if key is None:
+                    key = cache[value] = key_func("" if value is None else str(value).strip())
+                column.append(key)
+
+    def _item_positions(self, items):
+        # iid строк из файла появляется только при выводе в Treeview, поэтому
+        # при промахе соответствие строится заново один раз.
+        for attempt in range(2):
+            if self._positions is None or attempt:
+                self._iids = [self.row_iid(row) for row in self.rows]
+                self._positions = {iid: n for n, iid in enumerate(self._iids)}
+            try:
+                return [self._positions[item] for item in items]
+            except KeyError:
+                continue
+        return None
@@ -0,0 +1,169 @@
+"""Выполнение долгих операций в пуле потоков с доставкой результатов в главный цикл Tk."""
+
+import queue
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import ttk
+
+
+class OperationCancelled(Exception):
+    """Операция отменена пользователем."""
+
+
+class Task:
+    """Задача в пуле: через неё функция сообщает о прогрессе и узнаёт об отмене."""
+
+    def __init__(self, executor, name):
+        self.name = name
+        self.future = None
+        self._executor = executor
+        self._cancel_event = threading.Event()
+        self._on_progress = None
+        self._on_error = None
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """Просит задачу остановиться; ещё не начатая задача не запустится."""
+        self._cancel_event.set()
+        if self.future is not None and self.future.cancel():
+            # До рабочего потока задача не дошла: сообщаем об отмене сами.
+            self._executor.dispatch(
+                self._executor._finish, self, self._on_error,
+                OperationCancelled(f"Операция '{self.name}' отменена"), True
+            )
+
+    def check_cancelled(self):
+        """Вызывается из рабочего потока: прерывает задачу, если её отменили."""
+        if self._cancel_event.is_set():
+            raise OperationCancelled(f"Операция '{self.name}' отменена")
+
+    def progress(self, done, total=None, message=""):
+        """Сообщает о прогрессе (из рабочего потока) и проверяет отмену."""
+        self.check_cancelled()
+        if self._on_progress is not None:
+            self._executor.dispatch(self._on_progress, done, total, message)
+
+
+class TaskExecutor:
+    """Пул потоков для операций с БД и файлами, которые не должны подвешивать окно.
+
+    Функции выполняются в рабочих потоках и не должны трогать виджеты.
+    Обработчики результата, ошибки и прогресса ставятся в очередь и
+    вызываются в главном потоке: очередь разбирается через root.after.
+    """
+
+    def __init__(self, root, max_workers=4, poll_ms=30):
+        self.root = root
+        self.poll_ms = poll_ms
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="school-task")
+        self._dispatch = queue.Queue()
+        self._active = 0
+        self._poll_id = None
+
+    def submit(self, func, *args, name=None, on_done=None, on_error=None, on_progress=None,
+               pass_task=False, **kwargs):
+        """Запускает func(*args, **kwargs) в пуле и возвращает Task.
+
+        on_done(result) и on_error(exception) вызываются в главном потоке;
+        отмена приходит в on_error как OperationCancelled. С pass_task=True
+        функция получает Task первым аргументом и может сообщать прогресс,
+        который передаётся в on_progress(done, total, message).
+        """
+        task = Task(self, name or getattr(func, "__name__", "task"))
+        task._on_progress = on_progress
+        task._on_error = on_error
+        if pass_task:
+            args = (task,) + args
+
+        def run():
+            try:
+                task.check_cancelled()
+                result = func(*args, **kwargs)
+            except BaseException as exc:
+                self.dispatch(self._finish, task, on_error, exc, True)
+            else:
+                self.dispatch(self._finish, task, on_done, result, False)
+
+        self._active += 1
+        task.future = self._pool.submit(run)
+        self._schedule_poll()
+        return task
+
+    def dispatch(self, callback, *args):
+        """Ставит вызов callback(*args) в очередь главного потока (можно из любого потока)."""
+        self._dispatch.put((callback, args))
+
+    def shutdown(self):
+        """Отменяет ещё не начатые задачи и останавливает пул, не дожидаясь текущих."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _finish(self, task, callback, value, failed):
+        self._active -= 1
+        if failed and callback is None:
+            raise value
+        if callback is not None:
+            callback(value)
+
+    def _schedule_poll(self):
+        if self._poll_id is None:
+            self._poll_id = self.root.after(self.poll_ms, self._poll)
+
+    def _poll(self):
+        self._poll_id = None
+        try:
+            while True:
+                try:
+                    callback, args = self._dispatch.get_nowait()
+                except queue.Empty:
+                    break
+                callback(*args)
+        finally:
+            if self._active or not self._dispatch.empty():
+                self._schedule_poll()
+
+
+class ProgressDialog:
+    """Окно с полосой прогресса и кнопкой отмены для задачи TaskExecutor."""
+
+    def __init__(self, root, title, on_cancel=None):
+        self.window = tk.Toplevel(root)
+        self.window.title(title)
+        self.window.resizable(False, False)
+        self.window.transient(root)
+        self.message_var = tk.StringVar(value="Подготовка...")
+        ttk.Label(self.window, textvariable=self.message_var, width=50).pack(padx=15, pady=(15, 5))
+        self.bar = ttk.Progressbar(self.window, length=320, mode="indeterminate")
+        self.bar.pack(padx=15, pady=5)
+        self.bar.start(15)
+        self.cancel_button = ttk.Button(self.window, text="Отмена", command=self.cancel)
+        self.cancel_button.pack(pady=(5, 15))
+        self.window.protocol("WM_DELETE_WINDOW", self.cancel)
+        self.on_cancel = on_cancel
+
+    def update(self, done, total=None, message=""):
+        """Обновляет полосу; без total полоса остаётся бегущей."""
+        if not self.window.winfo_exists():
+            return
+        if total:
+            if str(self.bar.cget("mode")) != "determinate":
+                self.bar.stop()
+                self.bar.configure(mode="determinate")
+            self.bar.configure(maximum=total, value=done)
+        if message:
+            self.message_var.set(message)
+
+    def cancel(self):
+        """Просит задачу остановиться; окно закрывается, когда она завершится."""
+        self.cancel_button.configure(state="disabled")
+        self.message_var.set("Отмена...")
+        if self.on_cancel is not None:
+            self.on_cancel()
+
+    def close(self):
+        if self.window.winfo_exists():
+            self.bar.stop()
+            self.window.destroy()
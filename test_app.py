@@ -0,0 +1,64 @@
+"""Тесты SchoolApp без окна и базы данных: нужные атрибуты задаются вручную."""
+
+from main import SchoolApp, SchoolDataManager
+
+
+class SyncExecutor:
+    """Выполняет задачу сразу в текущем потоке, как TaskExecutor доставил бы результат."""
+
+    def submit(self, func, *args, name=None, on_done=None, on_error=None):
+        try:
+            result = func(*args)
+        except Exception as exc:
+            on_error(exc)
+        else:
+            on_done(result)
+
+
+class FailingDataManager:
+    def get_page(self, table, after, limit, sort_key=None, descending=False):
+        raise RuntimeError("соединение потеряно")
+
+
+def make_app():
+    app = SchoolApp.__new__(SchoolApp)
+    app.paged = True
+    app.current_table = "teachers"
+    app.data_source = {"teachers": "database"}
+    app.loaded_tables = set()
+    app.table_load_started = {}
+    app.page_state = {"teachers": {"cursor": None, "sort_key": "id", "descending": False, "search": None}}
+    app.refresh_generations = {"teachers": 0}
+    app.executor = SyncExecutor()
+    app.data_manager = FailingDataManager()
+    return app
+
+
+def test_failing_first_page_reaches_on_refresh_error():
+    app = make_app()
+    errors = []
+    app.on_task_error = lambda title, exc: errors.append((title, str(exc)))
+
+    app.refresh_data("teachers")
+
+    assert errors == [("Загрузка данных", "соединение потеряно")]
+    # Ленивая загрузка запросит таблицу снова при следующем показе.
+    assert "teachers" not in app.table_load_started
+    assert "teachers" not in app.loaded_tables
+
+
+def test_failing_full_read_reaches_on_refresh_error():
+    def lost_connection():
+        raise RuntimeError("соединение потеряно")
+
+    app = make_app()
+    app.paged = False
+    app.data_manager = SchoolDataManager.__new__(SchoolDataManager)
+    app.data_manager.iter_all_teachers = lost_connection
+    errors = []
+    app.on_task_error = lambda title, exc: errors.append((title, str(exc)))
+
+    app.refresh_data("teachers")
+
+    assert errors == [("Загрузка данных", "соединение потеряно")]
+    assert "teachers" not in app.table_load_started
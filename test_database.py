@@ -0,0 +1,113 @@
+"""Тесты запросов SchoolDatabase на настоящем PostgreSQL (см. conftest.py)."""
+
+import hashlib
+import uuid
+
+import pytest
+
+from database import HOT_QUERY_PLANS, build_page_query
+from school_io import rows_sha256
+
+
+def test_hot_queries_use_their_indexes(db):
+    results = db.explain_hot_queries()
+    expected = set(HOT_QUERY_PLANS)
+    if not db.has_trigram_search():
+        # Без pg_trgm триграммных индексов нет, миграция 3 их не создаёт.
+        expected = {name for name in expected if not name.startswith("search_")}
+    for name in sorted(expected):
+        index_used, plan = results[name]
+        assert index_used, f"{name} не использует {HOT_QUERY_PLANS[name][2]}:\n{plan}"
+
+
+def test_fio_page_continues_after_full_name():
+    query, params = build_page_query("students", "fio", after=(("Иванов", "Иван", ""), 7), limit=50)
+    assert "ORDER BY COALESCE(last_name, '') ASC, COALESCE(first_name, '') ASC, " \
+           "COALESCE(middle_name, '') ASC, id ASC" in query
+    assert params == ["Иванов", "Иванов", "Иван", "", 7, 50]
+
+
+def unique_hash():
+    return hashlib.sha256(uuid.uuid4().bytes).hexdigest()
+
+
+def test_import_job_resumes_from_checkpoint(db):
+    file_hash = unique_hash()
+    job_id, rows_done, imported, rejected = db.start_import_job("grades", "grades.csv", file_hash)
+    try:
+        assert (rows_done, imported, rejected) == (0, 0, 0)
+        with db.transaction():
+            db.checkpoint_import_job(job_id, 5000, 4990, 10)
+
+        # Незавершённое задание того же файла продолжается.
+        assert db.start_import_job("grades", "grades.csv", file_hash) == (job_id, 5000, 4990, 10)
+
+        db.finish_import_job(job_id)
+        new_job_id, rows_done, _, _ = db.start_import_job("grades", "grades.csv", file_hash)
+        assert new_job_id != job_id
+        assert rows_done == 0
+    finally:
+        with db.cursor() as cur:
+            cur.execute("DELETE FROM import_jobs WHERE file_hash = %s", (file_hash,))
+
+
+def test_checkpoint_rolls_back_with_its_chunk(db):
+    file_hash = unique_hash()
+    job_id, _, _, _ = db.start_import_job("grades", "grades.csv", file_hash)
+    try:
+        with pytest.raises(RuntimeError):
+            with db.transaction():
+                db.checkpoint_import_job(job_id, 5000, 5000, 0)
+                raise RuntimeError("обрыв посреди части")
+        assert db.start_import_job("grades", "grades.csv", file_hash) == (job_id, 0, 0, 0)
+    finally:
+        with db.cursor() as cur:
+            cur.execute("DELETE FROM import_jobs WHERE file_hash = %s", (file_hash,))
+
+
+def test_rerun_with_same_import_keys_is_noop(db):
+    key = unique_hash()
+    student = ("Тестов", "Тест", "", "2012-09-01", ["5А"])
+    student_ids = db.add_students_bulk([student], [f"{key}:student"])
+    try:
+        assert student_ids[0] is not None
+        assert db.add_students_bulk([student], [f"{key}:student"]) == [None]
+
+        grades = [(student_ids[0], "Математика", 5), (student_ids[0], "Математика", 5)]
+        grade_keys = [f"{key}:1", f"{key}:2"]
+        assert db.add_grades_bulk(grades, import_keys=grade_keys) == 2
+        assert db.add_grades_bulk(grades, import_keys=grade_keys) == 0
+        with db.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM grades WHERE student_id = %s", (student_ids[0],))
+            assert cur.fetchone()[0] == 2
+    finally:
+        db.delete_student(student_ids[0])
+
+
+def unique_last_name():
+    # Буквы вместо цифр: ФИО должно пройти проверку и не совпасть с уже имеющимися.
+    return "Тест" + "".join("абвгдежзиклмнопр"[int(digit, 16)] for digit in uuid.uuid4().hex[:8])
+
+
+def test_import_keys_are_scoped_to_source_file(data_manager):
+    db = data_manager.db
+    fio = f"{unique_last_name()} Тест"
+    student_ids = db.add_students_bulk([(*fio.split(), "", "2012-09-01", ["5А"])])
+    first_file = [(fio, "Математика", "5"), (fio, "Физика", "4")]
+    second_file = [(fio, "Математика", "5")]
+    try:
+        assert data_manager.import_loaded_rows("grades", first_file, "first.csv") == (2, [])
+        # Тот же файл ещё раз - ничего нового.
+        assert data_manager.import_loaded_rows("grades", first_file, "first.csv") == (0, [])
+        # Та же оценка в другой ведомости - отдельная запись.
+        assert data_manager.import_loaded_rows("grades", second_file, "second.csv") == (1, [])
+        with db.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM grades WHERE student_id = %s", (student_ids[0],))
+            assert cur.fetchone()[0] == 3
+    finally:
+        db.delete_student(student_ids[0])
+        with db.cursor() as cur:
+            cur.execute(
+                "DELETE FROM import_jobs WHERE file_hash IN (%s, %s)",
+                (rows_sha256(first_file), rows_sha256(second_file))
+            )
@@ -0,0 +1,622 @@
+"""Проверка данных учителей, учеников и оценок, в том числе параллельная для импорта."""
+
+import datetime
+import os
+import re
+from collections import deque
+from functools import lru_cache
+
+# Число процессов для проверки строк импорта; 0 или 1 - проверка в текущем процессе.
+VALIDATION_WORKERS = int(os.getenv("SCHOOL_VALIDATION_WORKERS", os.cpu_count() or 1))
+
+# Меньше строк выгоднее проверить в текущем процессе: передача в пул дороже самой
+# проверки. Порог ниже размера части импорта (SCHOOL_IMPORT_CHUNK_SIZE, 5000 строк),
+# чтобы каждая часть потокового импорта проверялась в пуле.
+PARALLEL_MIN_ROWS = int(os.getenv("SCHOOL_VALIDATION_PARALLEL_MIN_ROWS", 2000))
+
+# Наибольшее число строк в одной части, отправляемой в процесс проверки.
+VALIDATION_CHUNK_SIZE = int(os.getenv("SCHOOL_VALIDATION_CHUNK_SIZE", 2000))
+
+# Допустимая часть имени: буквы, между словами - пробел или дефис.
+NAME_PART_RE = re.compile(r"^[А-ЯЁа-яё]+([ -][А-ЯЁа-яё]+)*$")
+
+
+@lru_cache(maxsize=65536)
+def parse_date_cached(date_str):
+    """Разбирает дату ДД.ММ.ГГГГ; неверная строка -> None. Даты рождения часто
+    повторяются, поэтому результат запоминается по строке."""
+    try:
+        return datetime.datetime.strptime(date_str, "%d.%m.%Y").date()
+    except ValueError:
+        return None
+
+
+def _masked(check, items):
+    """Применяет check(item) -> (значение, ошибка) к списку и возвращает (mask, errors, values)."""
+    results = [check(item) for item in items]
+    errors = [error for _, error in results]
+    return [error is None for error in errors], errors, [value for value, _ in results]
+
+
+def _first_errors(*columns):
+    """Для каждой строки - первая ошибка из колонок ошибок (в порядке проверок) или None."""
+    return [next((error for error in row_errors if error is not None), None) for row_errors in zip(*columns)]
+
+
+class SchoolValidator:
+    """Проверки полей и строк импорта без обращения к базе.
+
+    Состояния у проверяющего нет, поэтому его можно создать в другом
+    процессе: на этом построена параллельная проверка validate_rows.
+    """
+
+    ALLOWED_SUBJECTS = [
+        "Начальные классы",
+        "Русский язык", "Русская литература", "Иностранный язык",
+        "Английский язык", "Немецкий язык", "История России",
+        "Всемирная история", "Математика", "Физика", "Химия",
+        "Биология", "География", "Информатика", "ОБЖ",
+        "Физкультура", "Музыка", "ИЗО", "Человек и мир",
+        "Обществознание", "Экономика"
+    ]
+
+    ALLOWED_SUBJECT_SET = frozenset(ALLOWED_SUBJECTS)
+
+    STUDENT_AGE_LIMITS = {
+        1: (6, 8),
+        2: (7, 9),
+        3: (8, 10),
+        4: (9, 11),
+        5: (10, 12),
+        6: (11, 13),
+        7: (12, 14),
+        8: (13, 15),
+        9: (14, 16),
+        10: (15, 17),
+        11: (16, 18)
+    }
+
+    CLASS_LETTERS = {
+        1: ["А", "Б", "В"],
+        2: ["А", "Б", "В"],
+        3: ["А", "Б", "В"],
+        4: ["А", "Б", "В"],
+        5: ["А", "Б"],
+        6: ["А", "Б"],
+        7: ["А", "Б"],
+        8: ["А", "Б"],
+        9: ["А", "Б"],
+        10: ["А", "Б"],
+        11: ["А", "Б"]
+    }
+
+    def split_classes(self, text):
+        """Разбивает строку с классами на список."""
+        return [cls.strip() for cls in text.split(",") if cls.strip()]
+
+    def format_fio(self, last_name, first_name, middle_name):
+        return " ".join(part for part in [last_name, first_name, middle_name] if part)
+
+    def parse_and_validate_fio(self, fio):
+        """Проверяет ФИО и возвращает отдельные части."""
+        fio = fio.strip()
+        if not fio:
+            raise ValueError("Поле ФИО не может быть пустым")
+        parts = fio.split()
+        if len(parts) < 2:
+            raise ValueError("Нужно указать минимум фамилию и имя")
+        last_name = parts[0]
+        first_name = parts[1]
+        middle_name = " ".join(parts[2:]) if len(parts) > 2 else ""
+        for chunk in [last_name, first_name] + ([middle_name] if middle_name else []):
+            if not self.is_valid_name_part(chunk):
+                raise ValueError("Имя и фамилия могут содержать только буквы, пробелы и дефис")
+        return last_name, first_name, middle_name
+
+    def is_valid_name_part(self, text):
+        """Проверяет имя/фамилию на допустимые символы."""
+        return NAME_PART_RE.match(text) is not None
+
+    def parse_birth_date(self, date_str):
+        """Преобразует строку ДД.ММ.ГГГГ в объект date."""
+        date_str = date_str.strip()
+        if not date_str:
+            raise ValueError("Укажите дату рождения в формате ДД.ММ.ГГГГ")
+        try:
+            value = datetime.datetime.strptime(date_str, "%d.%m.%Y").date()
+        except ValueError:
+            raise ValueError("Дата должна быть в формате ДД.ММ.ГГГГ")
+        if value > datetime.date.today():
+            raise ValueError("Дата рождения не может быть в будущем")
+        return value
+
+    def calculate_age(self, birth_date):
+        """Возвращает возраст на сегодняшний день."""
+        today = datetime.date.today()
+        age = today.year - birth_date.year
+        if (today.month, today.day) < (birth_date.month, birth_date.day):
+            age -= 1
+        return age
+
+    def validate_teacher_age(self, birth_date):
+        """Проверяет, подходит ли возраст для учителя."""
+        age = self.calculate_age(birth_date)
+        if age < 20:
+            raise ValueError("Учитель не может быть младше 20 лет")
+        if age > 86:
+            raise ValueError("Учитель не может быть старше 86 лет")
+
+    def validate_student_age(self, birth_date, class_name):
+        """Проверяет возраст ученика с учётом класса."""
+        age = self.calculate_age(birth_date)
+        grade = self.extract_grade(class_name)
+
+        if grade not in self.STUDENT_AGE_LIMITS:
+            raise ValueError(f"Некорректный номер класса: {grade}")
+
+        min_age, max_age = self.STUDENT_AGE_LIMITS[grade]
+        
+        if age < min_age:
+            raise ValueError(f"Для {class_name} минимальный возраст {min_age} лет")
+        if age > max_age:
+            raise ValueError(f"Для {class_name} максимальный возраст {max_age} лет")
+
+    def extract_grade(self, class_name):
+        """Возвращает номер класса из строки вида 5А."""
+        digits = "".join(ch for ch in class_name if ch.isdigit())
+        if not digits:
+            raise ValueError("Некорректный номер класса")
+        grade = int(digits)
+        if grade not in self.CLASS_LETTERS:
+            raise ValueError("Такого класса нет в школе")
+        return grade
+
+    def validate_subject(self, subject):
+        """Проверяет, что предмет входит в список допустимых."""
+        subject = subject.strip()
+        if subject not in self.ALLOWED_SUBJECT_SET:
+            raise ValueError("Выберите предмет из списка")
+        return subject
+
+    def validate_teacher_classes(self, classes_str):
+        """Проверяет набор классов у учителя."""
+        if not classes_str.strip():
+            raise ValueError("Укажите хотя бы один класс")
+        classes = self.split_classes(classes_str)
+        if not classes:
+            raise ValueError("Укажите хотя бы один класс")
+        for cls in classes:
+            self.validate_class_name(cls)
+        return classes
+
+    def validate_class_name(self, class_name):
+        """Проверяет запись класса вроде 5А."""
+        class_name = class_name.strip().upper()
+        grade = self.extract_grade(class_name)
+        letter = class_name[-1]
+        if letter not in self.CLASS_LETTERS[grade]:
+            raise ValueError(f"В {grade} классе нет литеры {letter}")
+        return f"{grade}{letter}"
+
+    def validate_teacher_import_row(self, row):
+        """Проверяет строку с учителем и возвращает поля для вставки в БД."""
+        if len(row) >= 4:
+            fio, birth, subject, classes_str = row[0], row[1], row[2], row[3]
+        elif len(row) == 3:
+            fio, subject, classes_str = row
+            birth = "01.01.1980"
+        else:
+            raise ValueError("В строке должно быть ФИО, предмет и классы")
+
+        last_name, first_name, middle_name = self.parse_and_validate_fio(fio)
+        subject = self.validate_subject(subject)
+        classes = self.validate_teacher_classes(classes_str)
+        birth_date = self.parse_birth_date(birth)
+        self.validate_teacher_age(birth_date)
+        return last_name, first_name, middle_name, birth_date.isoformat(), subject, classes
+
+    def validate_student_import_row(self, row):
+        """Проверяет строку с учеником и возвращает поля для вставки в БД."""
+        if len(row) >= 3:
+            fio, birth, class_str = row[0], row[1], row[2]
+        elif len(row) == 2:
+            fio, class_str = row
+            birth = "01.09.2012"
+        else:
+            raise ValueError("В строке должно быть ФИО и класс")
+
+        last_name, first_name, middle_name = self.parse_and_validate_fio(fio)
+        class_name = self.validate_class_name(class_str)
+        birth_date = self.parse_birth_date(birth)
+        self.validate_student_age(birth_date, class_name)
+        return last_name, first_name, middle_name, birth_date.isoformat(), [class_name]
+
+    def validate_grade_import_row(self, row, student_index):
+        """Проверяет строку с оценкой и возвращает (student_id, предмет, оценка)."""
+        if len(row) < 3:
+            raise ValueError("В строке должно быть ФИО, предмет и оценка")
+        fio, subject, grade_value = row[0], row[1], row[2]
+
+        last_name, first_name, middle_name = self.parse_and_validate_fio(fio)
+        subject = self.validate_subject(subject)
+        if subject == "Начальные классы":
+            raise ValueError("Нельзя выставлять оценки по предмету 'Начальные классы'")
+
+        try:
+            grade = int(str(grade_value).strip())
+        except ValueError:
+            raise ValueError("Оценка должна быть числом от 1 до 5")
+        if grade < 1 or grade > 5:
+            raise ValueError("Оценка должна быть от 1 до 5")
+
+        student_id = student_index.get(self.format_fio(last_name, first_name, middle_name))
+        if not student_id:
+            raise ValueError("Ученик с таким ФИО не найден")
+        return student_id, subject, grade
+
+    def validate_import_row(self, table, row, student_index=None):
+        """Проверяет строку импорта таблицы; для оценок нужен словарь ФИО -> id ученика."""
+        if table == "teachers":
+            return self.validate_teacher_import_row(row)
+        elif table == "students":
+            return self.validate_student_import_row(row)
+        else:
+            return self.validate_grade_import_row(row, student_index)
+
+    # Пакетные проверки: принимают колонку значений и возвращают (mask, errors, values),
+    # где mask[i] - прошло ли i-е значение проверку, errors[i] - текст ошибки или None,
+    # values[i] - то же, что вернула бы одиночная проверка, или None. Тексты ошибок
+    # совпадают с одиночными проверками; дата "сегодня" берётся одна на весь пакет.
+
+    def validate_many_fio(self, fios):
+        """Пакетная parse_and_validate_fio; values - кортежи (фамилия, имя, отчество).
+
+        ФИО повторяются (у ученика много оценок), поэтому каждое проверяется один раз.
+        """
+        match = NAME_PART_RE.match
+
+        def check(fio):
+            parts = fio.split()
+            if not parts:
+                return None, "Поле ФИО не может быть пустым"
+            if len(parts) < 2:
+                return None, "Нужно указать минимум фамилию и имя"
+            middle_name = " ".join(parts[2:])
+            if not (match(parts[0]) and match(parts[1]) and (not middle_name or match(middle_name))):
+                return None, "Имя и фамилия могут содержать только буквы, пробелы и дефис"
+            return (parts[0], parts[1], middle_name), None
+
+        return _masked(_cached(check), fios)
+
+    def validate_many_birth_dates(self, date_strs, today=None):
+        """Пакетная parse_birth_date; values - даты."""
+        today = today or datetime.date.today()
+
+        def check(date_str):
+            date_str = date_str.strip()
+            if not date_str:
+                return None, "Укажите дату рождения в формате ДД.ММ.ГГГГ"
+            value = parse_date_cached(date_str)
+            if value is None:
+                return None, "Дата должна быть в формате ДД.ММ.ГГГГ"
+            if value > today:
+                return None, "Дата рождения не может быть в будущем"
+            return value, None
+
+        return _masked(check, date_strs)
+
+    def validate_many_subjects(self, subjects):
+        """Пакетная validate_subject."""
+        allowed = self.ALLOWED_SUBJECT_SET
+
+        def check(subject):
+            subject = subject.strip()
+            if subject not in allowed:
+                return None, "Выберите предмет из списка"
+            return subject, None
+
+        return _masked(check, subjects)
+
+    def validate_many_class_names(self, class_names):
+        """Пакетная validate_class_name (каждое различное значение проверяется один раз)."""
+        return _masked(self._cached_check(self.validate_class_name), class_names)
+
+    def validate_many_teacher_classes(self, classes_strs):
+        """Пакетная validate_teacher_classes; values - списки классов."""
+        return _masked(self._cached_check(self.validate_teacher_classes), classes_strs)
+
+    def validate_many_teacher_ages(self, birth_dates, today=None):
+        """Пакетная validate_teacher_age; None вместо даты пропускается (values - возраст)."""
+        today = today or datetime.date.today()
+
+        def check(birth_date):
+            if birth_date is None:
+                return None, None
+            age = _age_on(birth_date, today)
+            if age < 20:
+                return age, "Учитель не может быть младше 20 лет"
+            if age > 86:
+                return age, "Учитель не может быть старше 86 лет"
+            return age, None
+
+        return _masked(check, birth_dates)
+
+    def validate_many_student_ages(self, birth_dates, class_names, today=None):
+        """Пакетная validate_student_age по уже проверенным датам и классам; пары с None пропускаются."""
+        today = today or datetime.date.today()
+        grades = {}
+
+        def check(item):
+            birth_date, class_name = item
+            if birth_date is None or class_name is None:
+                return None, None
+            age = _age_on(birth_date, today)
+            grade = grades.get(class_name)
+            if grade is None:
+                grade = grades[class_name] = self.extract_grade(class_name)
+            if grade not in self.STUDENT_AGE_LIMITS:
+                return age, f"Некорректный номер класса: {grade}"
+            min_age, max_age = self.STUDENT_AGE_LIMITS[grade]
+            if age < min_age:
+                return age, f"Для {class_name} минимальный возраст {min_age} лет"
+            if age > max_age:
+                return age, f"Для {class_name} максимальный возраст {max_age} лет"
+            return age, None
+
+        return _masked(check, zip(birth_dates, class_names))
+
+    def validate_many_teacher_rows(self, rows, today=None):
+        """Пакетная validate_teacher_import_row."""
+        shape_errors, (fios, births, subjects, classes_strs) = _split_columns(
+            rows, 4, lambda row: (row[0], "01.01.1980", row[1], row[2]) if len(row) == 3 else None,
+            "В строке должно быть ФИО, предмет и классы"
+        )
+        today = today or datetime.date.today()
+        _, fio_errors, names = self.validate_many_fio(fios)
+        _, subject_errors, subjects = self.validate_many_subjects(subjects)
+        _, classes_errors, classes = self.validate_many_teacher_classes(classes_strs)
+        _, birth_errors, birth_dates = self.validate_many_birth_dates(births, today)
+        _, age_errors, _ = self.validate_many_teacher_ages(birth_dates, today)
+
+        errors = _first_errors(shape_errors, fio_errors, subject_errors, classes_errors, birth_errors, age_errors)
+        values = [
+            None if error is not None else (*name, birth_date.isoformat(), subject, list(class_list))
+            for error, name, birth_date, subject, class_list in zip(errors, names, birth_dates, subjects, classes)
+        ]
+        return [error is None for error in errors], errors, values
+
+    def validate_many_student_rows(self, rows, today=None):
+        """Пакетная validate_student_import_row."""
+        shape_errors, (fios, births, class_strs) = _split_columns(
+            rows, 3, lambda row: (row[0], "01.09.2012", row[1]) if len(row) == 2 else None,
+            "В строке должно быть ФИО и класс"
+        )
+        today = today or datetime.date.today()
+        _, fio_errors, names = self.validate_many_fio(fios)
+        _, class_errors, class_names = self.validate_many_class_names(class_strs)
+        _, birth_errors, birth_dates = self.validate_many_birth_dates(births, today)
+        _, age_errors, _ = self.validate_many_student_ages(birth_dates, class_names, today)
+
+        errors = _first_errors(shape_errors, fio_errors, class_errors, birth_errors, age_errors)
+        values = [
+            None if error is not None else (*name, birth_date.isoformat(), [class_name])
+            for error, name, birth_date, class_name in zip(errors, names, birth_dates, class_names)
+        ]
+        return [error is None for error in errors], errors, values
+
+    def validate_many_grade_rows(self, rows, student_index):
+        """Пакетная validate_grade_import_row."""
+        shape_errors, (fios, subjects, grade_values) = _split_columns(
+            rows, 3, lambda row: None, "В строке должно быть ФИО, предмет и оценка"
+        )
+        _, fio_errors, names = self.validate_many_fio(fios)
+        _, subject_errors, subjects = self.validate_many_subjects(subjects)
+        _, grade_errors, grades = _masked(_cached(_check_grade_value), grade_values)
+
+        errors = []
+        values = []
+        for error, name, subject, grade_error, grade in zip(
+                _first_errors(shape_errors, fio_errors, subject_errors), names, subjects, grade_errors, grades):
+            if error is None and subject == "Начальные классы":
+                error = "Нельзя выставлять оценки по предмету 'Начальные классы'"
+            if error is None:
+                error = grade_error
+            student_id = None
+            if error is None:
+                student_id = student_index.get(self.format_fio(*name))
+                if not student_id:
+                    error = "Ученик с таким ФИО не найден"
+            errors.append(error)
+            values.append(None if error is not None else (student_id, subject, grade))
+        return [error is None for error in errors], errors, values
+
+    def validate_many_import_rows(self, table, rows, student_index=None):
+        """Пакетная validate_import_row: (mask, errors, values) по строкам таблицы."""
+        if table == "teachers":
+            return self.validate_many_teacher_rows(rows)
+        elif table == "students":
+            return self.validate_many_student_rows(rows)
+        else:
+            return self.validate_many_grade_rows(rows, student_index)
+
+    def _cached_check(self, validate):
+        """Оборачивает одиночную проверку в check для _masked с кэшем по значению."""
+        return _cached(lambda value: _as_check(validate, value))
+
+
+def _age_on(birth_date, today):
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+
+
+def _as_check(validate, value):
+    try:
+        return validate(value), None
+    except ValueError as exc:
+        return None, str(exc)
+
+
+def _check_grade_value(grade_value):
+    try:
+        grade = int(str(grade_value).strip())
+    except ValueError:
+        return None, "Оценка должна быть числом от 1 до 5"
+    if grade < 1 or grade > 5:
+        return None, "Оценка должна быть от 1 до 5"
+    return grade, None
+
+
+def _cached(check):
+    """check с кэшем по значению на время одного пакета (значения колонки часто повторяются)."""
+    results = {}
+
+    def cached_check(value):
+        result = results.get(value)
+        if result is None:
+            result = results[value] = check(value)
+        return result
+
+    return cached_check
+
+
+def _split_columns(rows, width, short_row, shape_error):
+    """Раскладывает строки на width колонок.
+
+    Строка короче width передаётся в short_row, которая возвращает полный
+    кортеж (подставив значения по умолчанию) или None - тогда строка
+    получает ошибку shape_error, а в колонки идут пустые строки.
+    """
+    shape_errors = []
+    columns = [[] for _ in range(width)]
+    empty = ("",) * width
+    for row in rows:
+        error = None
+        if len(row) < width:
+            row = short_row(row)
+            if row is None:
+                row, error = empty, shape_error
+        shape_errors.append(error)
+        for column, value in zip(columns, row):
+            column.append(value)
+    return shape_errors, columns
+
+
+# Проверяющий и словарь учеников в процессе пула (см. _init_worker).
+_worker_validator = None
+_worker_student_index = None
+
+
+def _init_worker(student_index):
+    global _worker_validator, _worker_student_index
+    _worker_validator = SchoolValidator()
+    _worker_student_index = student_index
+
+
+def _validate_chunk(table, first_row, rows):
+    """Проверяет часть строк в процессе пула.
+
+    Возвращает ([(номер строки, значения)], [(номер строки, причина)]) -
+    исходные строки обратно не передаются, они есть у вызывающего.
+    """
+    mask, reasons, values = _worker_validator.validate_many_import_rows(table, rows, _worker_student_index)
+    valid = []
+    errors = []
+    for row_number, ok, reason, row_values in zip(range(first_row, first_row + len(rows)), mask, reasons, values):
+        if ok:
+            valid.append((row_number, row_values))
+        else:
+            errors.append((row_number, reason))
+    return valid, errors
+
+
+def create_validation_pool(student_index=None, workers=None):
+    """Пул процессов для validate_rows или None, если проверять лучше в текущем процессе.
+
+    Пул создаётся один раз на импорт и передаётся в validate_rows для всех его
+    частей: процессы запускаются (и импортируют приложение) только один раз.
+    student_index передаётся процессам при запуске, поэтому пул годится только
+    для импорта с этим словарём. Закрывает пул вызывающий (shutdown).
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    if workers is None:
+        workers = VALIDATION_WORKERS
+    if workers <= 1:
+        return None
+    # spawn, а не fork: родительский процесс многопоточный (Tk, пул соединений).
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker, initargs=(student_index,)
+    )
+
+
+def validate_rows(validator, table, rows, first_row=1, student_index=None, progress=None,
+                  pool=None, workers=None, chunk_size=None):
+    """Проверяет строки импорта и возвращает (valid, errors) в порядке строк.
+
+    valid - список (номер строки, строка, значения для БД), errors - список
+    (номер строки, строка, причина). Номера начинаются с first_row.
+    Если передан pool (см. create_validation_pool) и строк не меньше
+    PARALLEL_MIN_ROWS, они делятся между workers процессами (по умолчанию
+    VALIDATION_WORKERS) частями не больше chunk_size, иначе проверяются
+    методами validator в текущем процессе. Строки проверяются пакетами
+    (validate_many_import_rows). progress(done) получает число проверенных
+    строк; исключение из него (отмена) прерывает проверку.
+    """
+    if pool is None or len(rows) < PARALLEL_MIN_ROWS:
+        return _validate_serial(validator, table, rows, first_row, student_index, progress)
+    if workers is None:
+        workers = VALIDATION_WORKERS
+    if chunk_size is None:
+        # Каждому процессу хотя бы одна часть, даже если строк немного больше порога.
+        chunk_size = min(VALIDATION_CHUNK_SIZE, -(-len(rows) // workers))
+    return _validate_parallel(pool, table, rows, first_row, progress, workers, chunk_size)
+
+
+def _validate_serial(validator, table, rows, first_row, student_index, progress):
+    valid = []
+    errors = []
+    for start in range(0, len(rows), VALIDATION_CHUNK_SIZE):
+        chunk = rows[start:start + VALIDATION_CHUNK_SIZE]
+        mask, reasons, values = validator.validate_many_import_rows(table, chunk, student_index)
+        for row_number, row, ok, reason, row_values in zip(
+                range(first_row + start, first_row + start + len(chunk)), chunk, mask, reasons, values):
+            if ok:
+                valid.append((row_number, row, row_values))
+            else:
+                errors.append((row_number, row, reason))
+        if progress is not None:
+            progress(start + len(chunk))
+    return valid, errors
+
+
+def _validate_parallel(pool, table, rows, first_row, progress, workers, chunk_size):
+    valid = []
+    errors = []
+    # В работе не больше двух частей на процесс, результаты забираются по порядку.
+    pending = deque()
+    try:
+        starts = iter(range(0, len(rows), chunk_size))
+        for start in starts:
+            pending.append((start, pool.submit(_validate_chunk, table, first_row + start,
+                                               rows[start:start + chunk_size])))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            start, future = pending.popleft()
+            chunk_valid, chunk_errors = future.result()
+            for row_number, values in chunk_valid:
+                valid.append((row_number, rows[row_number - first_row], values))
+            for row_number, reason in chunk_errors:
+                errors.append((row_number, rows[row_number - first_row], reason))
+            next_start = next(starts, None)
+            if next_start is not None:
+                pending.append((next_start, pool.submit(_validate_chunk, table, first_row + next_start,
+                                                        rows[next_start:next_start + chunk_size])))
+            if progress is not None:
+                progress(min(start + chunk_size, len(rows)))
+    finally:
+        # Пул общий для всего импорта: при отмене убираем только свои части.
+        for _, future in pending:
+            future.cancel()
+    return valid, errors
@@ -0,0 +1,237 @@
+"""Виртуальный Treeview: строки хранятся в списке, виджеты создаются только для видимого окна."""
+
+import itertools
+from tkinter import ttk
+
+
+class VirtualTreeview:
+    """Обёртка над ttk.Treeview с тем же интерфейсом, что нужен приложению.
+
+    Все строки лежат в Python-списке (ключ -> значения), а в самом Treeview
+    есть только фиксированный набор строк-"слотов" на видимое окно плюс запас.
+    При прокрутке слоты не пересоздаются, в них просто подставляются значения
+    других строк. Поиск, сортировка и выделение работают по списку, поэтому
+    get_children, selection, set и item возвращают данные всей таблицы.
+    """
+
+    def __init__(self, master, columns, buffer_rows=20, **kwargs):
+        self.tree = ttk.Treeview(master, columns=columns, **kwargs)
+        self.buffer_rows = buffer_rows
+        self.keys = []
+        self.values = {}
+        self.selected = set()
+        self.offset = 0
+        self.yscrollcommand = None
+        self._slots = []
+        self._slot_keys = []
+        self._auto_keys = itertools.count(1)
+        self._render_pending = False
+        self._click_replaces_selection = False
+
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda _: self._scroll_by(-3))
+        self.tree.bind("<Button-5>", lambda _: self._scroll_by(3))
+        self.tree.bind("<Prior>", lambda _: self._scroll_by(-self.visible_rows()))
+        self.tree.bind("<Next>", lambda _: self._scroll_by(self.visible_rows()))
+        self.tree.bind("<Configure>", lambda _: self.schedule_render())
+        self.tree.bind("<Button-1>", self._on_click, add="+")
+        self.tree.bind("<<TreeviewSelect>>", self._on_select, add="+")
+
+    def __getattr__(self, name):
+        # heading, column, pack, bind и прочее - напрямую в настоящий Treeview.
+        if name == "tree":
+            raise AttributeError(name)
+        return getattr(self.tree, name)
+
+    def __getitem__(self, option):
+        return self.tree[option]
+
+    def configure(self, **kwargs):
+        """Перехватывает yscrollcommand: положение прокрутки считается по списку строк."""
+        if "yscrollcommand" in kwargs:
+            self.yscrollcommand = kwargs.pop("yscrollcommand")
+            self.schedule_render()
+        if kwargs:
+            return self.tree.configure(**kwargs)
+
+    config = configure
+
+    def visible_rows(self):
+        """Сколько строк помещается в окне Treeview."""
+        height = self.tree.winfo_height()
+        if height <= 1:
+            return int(self.tree.cget("height"))
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        return max(1, (height - row_height) // row_height)
+
+    def schedule_render(self):
+        """Откладывает перерисовку до простоя, чтобы серия изменений рисовалась один раз."""
+        if not self._render_pending:
+            self._render_pending = True
+            self.tree.after_idle(self.render)
+
+    def render(self):
+        """Подставляет в слоты строки видимого окна и обновляет полосу прокрутки."""
+        self._render_pending = False
+        total = len(self.keys)
+        visible = self.visible_rows()
+        self.offset = max(0, min(self.offset, total - visible))
+        window = self.keys[self.offset:self.offset + visible + self.buffer_rows]
+
+        while len(self._slots) < len(window):
+            slot = f"slot{len(self._slots)}"
+            self.tree.insert("", "end", iid=slot)
+            self._slots.append(slot)
+        while len(self._slots) > len(window):
+            self.tree.delete(self._slots.pop())
+
+        selected_slots = []
+        for slot, key in zip(self._slots, window):
+            self.tree.item(slot, values=self.values[key])
+            if key in self.selected:
+                selected_slots.append(slot)
+        self._slot_keys = window
+        self.tree.selection_set(selected_slots)
+        self.tree.yview_moveto(0)
+
+        if self.yscrollcommand:
+            if total:
+                self.yscrollcommand(self.offset / total, min(1.0, (self.offset + visible) / total))
+            else:
+                self.yscrollcommand(0.0, 1.0)
+
+    def yview(self, *args):
+        """Команда для Scrollbar: moveto/scroll двигают окно по списку строк."""
+        total = len(self.keys)
+        visible = self.visible_rows()
+        if not args:
+            if not total:
+                return 0.0, 1.0
+            return self.offset / total, min(1.0, (self.offset + visible) / total)
+
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= visible
+            self.offset += step
+        self.render()
+
+    def _scroll_by(self, rows):
+        self.offset += rows
+        self.render()
+        return "break"
+
+    def _on_mousewheel(self, event):
+        return self._scroll_by(-3 if event.delta > 0 else 3)
+
+    def _on_click(self, event):
+        # Обычный щелчок заменяет выделение, с Shift/Ctrl - дополняет его.
+        self._click_replaces_selection = not (event.state & 0x0005)
+
+    def _on_select(self, _):
+        slot_keys = dict(zip(self._slots, self._slot_keys))
+        chosen = {slot_keys[slot] for slot in self.tree.selection() if slot in slot_keys}
+        if self._click_replaces_selection:
+            self.selected = chosen
+        else:
+            window = set(self._slot_keys)
+            self.selected = {key for key in self.selected if key not in window} | chosen
+        self._click_replaces_selection = False
+
+    def _column_index(self, column):
+        columns = self.tree["columns"]
+        if isinstance(column, int):
+            return column
+        if isinstance(column, str) and column.startswith("#"):
+            return int(column[1:]) - 1
+        return list(columns).index(column)
+
+    def get_children(self, item=""):
+        return tuple(self.keys)
+
+    def exists(self, item):
+        return item in self.values
+
+    def insert(self, parent, index, iid=None, values=(), **kwargs):
+        key = str(iid) if iid is not None else f"v{next(self._auto_keys)}"
+        if key in self.values:
+            self.values[key] = tuple(values)
+        else:
+            self.values[key] = tuple(values)
+            if index == "end":
+                self.keys.append(key)
+            else:
+                self.keys.insert(int(index), key)
+        self.schedule_render()
+        return key
+
+    def delete(self, *items):
+        removed = {item for item in items if item in self.values}
+        if not removed:
+            return
+        self.keys = [key for key in self.keys if key not in removed]
+        for key in removed:
+            del self.values[key]
+        self.selected -= removed
+        self.schedule_render()
+
+    def move(self, item, parent, index):
+        self.keys.remove(item)
+        if index == "end":
+            self.keys.append(item)
+        else:
+            self.keys.insert(int(index), item)
+        self.schedule_render()
+
+    def set_children(self, item, *newchildren):
+        """Задаёт новый порядок строк одной операцией."""
+        keep = set(newchildren)
+        for key in [key for key in self.keys if key not in keep]:
+            del self.values[key]
+        self.keys = list(newchildren)
+        self.selected &= keep
+        self.schedule_render()
+
+    def item(self, item, option=None, **kwargs):
+        if "values" in kwargs:
+            self.values[item] = tuple(kwargs.pop("values"))
+            if item in self._slot_keys:
+                self.tree.item(self._slots[self._slot_keys.index(item)], values=self.values[item])
+        if option == "values":
+            return self.values[item]
+        if option is None and not kwargs:
+            return {"values": self.values[item]}
+        return None
+
+    def set(self, item, column=None, value=None):
+        row = self.values[item]
+        if column is None:
+            return dict(zip(self.tree["columns"], row))
+        index = self._column_index(column)
+        if value is None:
+            return row[index] if index < len(row) else ""
+        updated = list(row)
+        updated[index] = value
+        self.item(item, values=updated)
+        return None
+
+    def selection(self):
+        if not self.selected:
+            return ()
+        return tuple(key for key in self.keys if key in self.selected)
+
+    def selection_set(self, items):
+        if isinstance(items, str):
+            items = (items,)
+        self.selected = {item for item in items if item in self.values}
+        self.schedule_render()
+
+    def see(self, item):
+        if item in self.values:
+            position = self.keys.index(item)
+            visible = self.visible_rows()
+            if position < self.offset or position >= self.offset + visible:
+                self.offset = position
+                self.render()